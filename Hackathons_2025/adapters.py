@@ -0,0 +1,39 @@
+import re
+
+# Corpus adapters map one source's raw JSON record to the common club
+# record the rest of the app works with:
+#   id, name, description, email, instagram, division, source
+# `division` is only set by sources that have one (club sports: Coed,
+# Mens, ...). Adapters return None for records that cannot be used.
+
+_NAME_SUFFIX = re.compile(r'\s+-\s+UCLA Community$')
+
+
+# HOTH XII Orgs.json: flat email list and instagram URL
+def adapt_org(item):
+    return {
+        'id': item.get('id'),
+        'name': item.get('name'),
+        'description': item.get('description'),
+        'email': item.get('email'),
+        'instagram': item.get('instagram'),
+        'division': None,
+        'source': 'orgs',
+    }
+
+
+# UCLA Club Sports.json: no id (the URL slug is used), contact and
+# social_media objects, and a division in `category`
+def adapt_sport(item):
+    url = item.get('url') or ''
+    contact = item.get('contact') or {}
+    social_media = item.get('social_media') or {}
+    return {
+        'id': url.rstrip('/').rsplit('/', 1)[-1] or None,
+        'name': _NAME_SUFFIX.sub('', item.get('name') or ''),
+        'description': item.get('description'),
+        'email': contact.get('email'),
+        'instagram': social_media.get('instagram'),
+        'division': item.get('category'),
+        'source': 'sports',
+    }
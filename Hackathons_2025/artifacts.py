@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+# An artifact is a directory of .npy arrays plus meta.json. Arrays are
+# opened with mmap_mode='r', so every gunicorn worker maps the same
+# read-only pages from the OS page cache instead of holding a private copy,
+# and opening an artifact costs a few syscalls rather than a parse.
+
+META_FILE = 'meta.json'
+
+
+class ArtifactError(Exception):
+    pass
+
+
+class StringTable:
+    # Read-only sequence of strings stored as one utf-8 buffer plus an
+    # offsets array (row i spans offsets[i]:offsets[i + 1]). Strings are
+    # only decoded when read, so a memory-mapped table costs no Python
+    # objects until it is used; sorted tables work with bisect.
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def to_arrays(self, prefix):
+        return {f"{prefix}_blob": self.blob, f"{prefix}_offsets": self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(arrays[f"{prefix}_blob"], arrays[f"{prefix}_offsets"])
+
+
+class StringTableBuilder:
+    # Builds a StringTable one string at a time, appending to a growing
+    # utf-8 buffer and offsets array, so a large table is never held as a
+    # list of Python strings first
+    def __init__(self):
+        self._blob = bytearray()
+        self._offsets = array('q', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def append(self, text):
+        self._blob += text.encode('utf-8')
+        self._offsets.append(len(self._blob))
+
+    # The table, sharing this builder's buffer (which can then no longer
+    # grow)
+    def build(self):
+        return StringTable(
+            np.frombuffer(self._blob, dtype=np.uint8), np.array(self._offsets, dtype=np.int64)
+        )
+
+
+# Stable 64-bit key of a string (Python's hash() differs per process)
+def string_key(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class KeyIndex:
+    # Hash lookup for a StringTable that can be stored next to it: the
+    # 64-bit keys of its strings, sorted, with the row of each. Finding a
+    # string is one hash, one binary search over integers and one string
+    # comparison, instead of a comparison per bisection step.
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+
+    @classmethod
+    def build(cls, table):
+        keys = np.array([string_key(s) for s in table], dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], order.astype(np.int32))
+
+    # Row of a string in table, or None
+    def find(self, table, text):
+        key = np.uint64(string_key(text))
+        i = int(np.searchsorted(self.keys, key))
+        while i < len(self.keys) and self.keys[i] == key:
+            row = int(self.rows[i])
+            if table[row] == text:
+                return row
+            i += 1
+        return None
+
+    def to_arrays(self, prefix):
+        return {f"{prefix}_keys": self.keys, f"{prefix}_rows": self.rows}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(arrays[f"{prefix}_keys"], arrays[f"{prefix}_rows"])
+
+
+# Write arrays and metadata to a directory, atomically: readers either see
+# the complete artifact or none at all
+def write_artifact(path, arrays, meta):
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, arrays=sorted(arrays)), f)
+        os.chmod(tmp_path, 0o755)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another worker finished the same artifact first
+            if not os.path.isdir(path):
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+# Memory-map every array of an artifact; returns (arrays, meta)
+def open_artifact(path):
+    try:
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Plain ndarray views of the mappings: indexing a np.memmap goes
+        # through Python-level hooks and is several times slower
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r').view(np.ndarray)
+            for name in meta['arrays']
+        }
+    except (OSError, ValueError, KeyError) as e:
+        raise ArtifactError(f"Could not open artifact {path}: {str(e)}") from e
+    return arrays, meta
+
+
+# Arrays of a CSR matrix, named with a prefix
+def csr_arrays(matrix, prefix):
+    return {
+        f"{prefix}_data": matrix.data,
+        f"{prefix}_indices": matrix.indices,
+        f"{prefix}_indptr": matrix.indptr,
+    }
+
+
+# CSR matrix over (possibly memory-mapped) arrays, without copying them
+def csr_from_arrays(arrays, prefix, shape):
+    return sparse.csr_matrix(
+        (arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"], arrays[f"{prefix}_indptr"]),
+        shape=shape, copy=False,
+    )
@@ -0,0 +1,240 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from catalog import Catalog, CatalogError, query_tokens
+from club_views import view_to_dict
+from corpora import SOURCES, get_source, merge_ranked
+from engines import MAX_TOP_K, get_engine
+from facets import allowed_rows
+from tagging import get_tagger
+
+# Queries sent to a worker at a time, and chunks in flight per worker;
+# together they bound how much of the input and output is held in memory
+CHUNK_SIZE = 500
+CHUNKS_PER_WORKER = 2
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5.0
+
+# Catalogs and ranking options of a worker process, set by _init_worker
+_catalogs = None
+_options = None
+
+
+# Input records as (id, query): a CSV file with a `query` column and an
+# optional `id` column, or JSON lines holding {"query": ..., "id": ...}
+# objects or bare strings. Records without an id are numbered from 1.
+def read_queries(path, fmt=None):
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            records = ((row.get('id'), row.get('query')) for row in csv.DictReader(f))
+        else:
+            records = (
+                _jsonl_record(path, number, line)
+                for number, line in enumerate(f, 1) if line.strip()
+            )
+        for number, (query_id, query) in enumerate(records, 1):
+            if not isinstance(query, str):
+                raise ValueError(f"{path}: record {number} has no query")
+            yield (query_id if query_id is not None else number), query
+
+
+def _jsonl_record(path, number, line):
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: line {number} is not valid JSON: {e.msg}") from None
+    if isinstance(record, str):
+        return None, record
+    if not isinstance(record, dict):
+        raise ValueError(f"{path}: line {number} is not a query object or string")
+    return record.get('id'), record.get('query')
+
+
+# Open the shared, memory-mapped catalog of every source once per worker;
+# the pages are shared with the other workers through the page cache
+def _init_worker(source_names, options):
+    global _catalogs, _options
+    _catalogs = [Catalog.load(get_source(name), build=False) for name in source_names]
+    _options = options
+
+
+# Rank a chunk of (id, query) records in a worker and return their JSON
+# lines. Each source ranks the whole chunk with one search_batch call.
+def _rank_chunk(records):
+    engine = get_engine(_options['engine'])
+    top_k = _options['top_k']
+    corrected = [query_tokens(_catalogs, query) for _, query in records]
+    per_source = []
+    for catalog in _catalogs:
+        term_counts = [catalog.index.count_terms(tokens) for tokens, _ in corrected]
+        batch_hits = engine.search_batch(
+            catalog, term_counts, top_k=top_k, min_score=_options['min_score'],
+            allowed=allowed_rows(catalog, _options['tags']),
+        )
+        per_source.append([
+            [(catalog.views[row], float(score)) for row, score in zip(hits.rows, hits.scores)]
+            for hits in batch_hits
+        ])
+    lines = []
+    for (query_id, query), (_, fixed), result_lists in zip(records, corrected, zip(*per_source)):
+        lines.append(json.dumps({
+            'id': query_id,
+            'query': query,
+            'corrections': fixed,
+            'clubs': [view_to_dict(view, score) for view, score in merge_ranked(result_lists, top_k)],
+        }, ensure_ascii=False))
+    return lines
+
+
+# Progress of a run, saved after every chunk so an interrupted run can
+# resume: the input file, the sources and ranking options, the input
+# records done and the output size they produced
+def _read_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Rank every query of input_path into output_path as JSON lines, in input
+# order. Chunks are ranked by a pool of workers, at most
+# CHUNKS_PER_WORKER per worker in flight, and written as soon as they are
+# next in order. With resume, a run restarts after the last chunk its
+# checkpoint recorded.
+def run(input_path, output_path, source_names, options, workers, chunk_size=CHUNK_SIZE,
+        fmt=None, resume=False):
+    checkpoint_path = f"{output_path}.checkpoint"
+    checkpoint = _read_checkpoint(checkpoint_path) if resume else None
+    if checkpoint is not None:
+        if checkpoint.get('input') != os.path.abspath(input_path):
+            raise ValueError(f"{checkpoint_path} belongs to another input file")
+        # Results already written must be ranked the same way as the rest
+        if checkpoint.get('sources') != list(source_names) or checkpoint.get('options') != options:
+            raise ValueError(f"{checkpoint_path} was written with other sources or ranking options")
+    done = checkpoint['done'] if checkpoint else 0
+
+    # Build any missing artifact once, before the workers open it
+    for name in source_names:
+        Catalog.load(get_source(name))
+
+    records = islice(read_queries(input_path, fmt), done, None)
+    started = time.perf_counter()
+    last_report = started
+    ranked = 0
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    with open(output_path, 'r+b' if checkpoint else 'wb') as out, context.Pool(
+        workers, initializer=_init_worker, initargs=(source_names, options)
+    ) as pool:
+        if checkpoint:
+            # Drop anything written after the last checkpoint
+            out.truncate(checkpoint['output_bytes'])
+            out.seek(checkpoint['output_bytes'])
+        pending = deque()
+        chunks = _chunks(records, chunk_size)
+        while True:
+            while len(pending) < workers * CHUNKS_PER_WORKER:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append((len(chunk), pool.apply_async(_rank_chunk, (chunk,))))
+            if not pending:
+                break
+            size, result = pending.popleft()
+            out.write(''.join(f"{line}\n" for line in result.get()).encode('utf-8'))
+            out.flush()
+            done += size
+            ranked += size
+            _write_checkpoint(checkpoint_path, {
+                'input': os.path.abspath(input_path), 'sources': list(source_names),
+                'options': options, 'done': done, 'output_bytes': out.tell(),
+            })
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                print(f"{done} queries done, {ranked / (now - started):.0f} queries/s")
+                last_report = now
+
+    elapsed = time.perf_counter() - started
+    rate = ranked / elapsed if elapsed else 0.0
+    print(f"Ranked {ranked} queries in {elapsed:.1f} s ({rate:.0f} queries/s, {workers} workers); "
+          f"{done} in {output_path}")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return ranked
+
+
+# argparse type for counts that must be at least 1 (and at most maximum)
+def _positive_int(maximum=None):
+    def parse(text):
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{text!r} is not an integer") from None
+        if value < 1 or (maximum is not None and value > maximum):
+            bounds = f"between 1 and {maximum}" if maximum is not None else "at least 1"
+            raise argparse.ArgumentTypeError(f"must be {bounds}, not {value}")
+        return value
+    return parse
+
+
+# python batch_recommend.py queries.csv results.jsonl [--resume] ...
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recommend clubs for a file of queries')
+    parser.add_argument('input', help='CSV file with a query column, or JSON lines')
+    parser.add_argument('output', help='JSON lines file to write, one result per query')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='input format (default: by extension)')
+    parser.add_argument('--sources', nargs='*', help='source names (default: all)')
+    parser.add_argument('--engine', help='retrieval engine (default: CLUB_SEARCH_ENGINE)')
+    parser.add_argument('--top-k', type=_positive_int(MAX_TOP_K), default=5)
+    parser.add_argument('--min-score', type=float, default=0.0)
+    parser.add_argument('--tag', action='append', default=[], help='required tag (repeatable)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=_positive_int(), default=CHUNK_SIZE)
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run')
+    args = parser.parse_args(argv)
+
+    try:
+        source_names = [get_source(name).name for name in args.sources or [s.name for s in SOURCES]]
+        for tag in args.tag:
+            get_tagger().label_mask(tag)
+        options = {
+            'engine': get_engine(args.engine).name,
+            'top_k': args.top_k,
+            'min_score': args.min_score,
+            'tags': args.tag,
+        }
+        run(args.input, args.output, source_names, options, max(1, args.workers),
+            args.chunk_size, args.format, args.resume)
+    except (OSError, ValueError, CatalogError) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# Benchmarks for the ranking path and the app: python -m benchmarks
+#
+# Each corpus size runs in its own process (benchmarks.measure) against a
+# synthetic corpus (benchmarks.corpus) and a replayed query mix
+# (benchmarks.queries); the driver (benchmarks.__main__) prints the
+# results and compares them with a saved baseline.
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.measure import DEFAULT_ENGINES
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(APP_DIR, 'benchmarks', 'baseline.json')
+
+DEFAULT_SIZES = '1000,10000'
+
+# Relative change beyond which a metric counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+
+# Run one size in a fresh interpreter, so its peak RSS and caches are its own
+def measure(n_clubs, n_queries, engines, seed):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run(
+            [
+                sys.executable, '-m', 'benchmarks.measure', '--clubs', str(n_clubs),
+                '--queries', str(n_queries), '--engines', ','.join(engines),
+                '--seed', str(seed), '--output', output,
+            ],
+            cwd=APP_DIR, check=True,
+        )
+        with open(output, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+# (name, value, higher_is_better) of every compared metric of a result
+def metrics(result):
+    yield 'build_ms', result['build_ms'], False
+    yield 'startup_ms', result['startup_ms'], False
+    yield 'peak_rss_mb', result['peak_rss_mb'], False
+    stages = [(f"scoring.{engine}", summary) for engine, summary in result['scoring'].items()]
+    stages += [('submit', result['submit']), ('api', result['api'])]
+    for stage, summary in stages:
+        for name in ('p50_ms', 'p95_ms', 'p99_ms'):
+            yield f"{stage}.{name}", summary[name], False
+        yield f"{stage}.qps", summary['qps'], True
+
+
+def report(result):
+    print(f"\n{result['clubs']} clubs, {result['queries']} queries")
+    print(f"  corpus {result['corpus_ms']:.0f} ms, build {result['build_ms']:.0f} ms, "
+          f"startup {result['startup_ms']:.0f} ms, peak RSS {result['peak_rss_mb']:.0f} MB")
+    stages = [(f"scoring/{engine}", summary) for engine, summary in result['scoring'].items()]
+    stages += [('POST /submit', result['submit']), ('POST /api/recommend', result['api'])]
+    for stage, s in stages:
+        print(f"  {stage:<20} p50 {s['p50_ms']:8.3f} ms  p95 {s['p95_ms']:8.3f} ms  "
+              f"p99 {s['p99_ms']:8.3f} ms  {s['qps']:9.1f} q/s")
+
+
+# Metrics of result that are worse than the baseline's by more than
+# tolerance, as printable lines
+def regressions(result, baseline, tolerance):
+    found = []
+    base_metrics = {name: value for name, value, _ in metrics(baseline)}
+    for name, value, higher_is_better in metrics(result):
+        base = base_metrics.get(name)
+        if not base or value is None:
+            continue
+        change = (value - base) / base
+        if (-change if higher_is_better else change) > tolerance:
+            found.append(f"  {result['clubs']} clubs {name}: {base} -> {value} ({change:+.0%})")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark indexing and ranking on synthetic corpora')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"comma-separated corpus sizes in clubs (default {DEFAULT_SIZES}; "
+                             f"up to 500000)")
+    parser.add_argument('--queries', type=int, default=1000, help='queries replayed per size')
+    parser.add_argument('--engines', default=','.join(DEFAULT_ENGINES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(',')
+    results = {}
+    for size in args.sizes.split(','):
+        result = measure(int(size), args.queries, engines, args.seed)
+        results[str(result['clubs'])] = result
+        report(result)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'machine': platform.platform(), 'results': results}, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('machine') != platform.platform():
+        print(f"\nWarning: baseline was recorded on {baseline.get('machine')}")
+    found = []
+    for size, result in results.items():
+        if size in baseline['results']:
+            found.extend(regressions(result, baseline['results'][size], args.tolerance))
+    if found:
+        print(f"\nRegressions beyond {args.tolerance:.0%} of the baseline:")
+        print('\n'.join(found))
+        return 1
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
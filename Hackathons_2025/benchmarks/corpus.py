@@ -0,0 +1,124 @@
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from club_data import BASE_DIR
+
+ORGS_FILE = 'HOTH XII Orgs.json'
+SPORTS_FILE = 'UCLA Club Sports.json'
+
+# Clubs generated per batch, bounding the sampled word arrays
+CHUNK_SIZE = 10000
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z'&-]*")
+
+_NAME_SUFFIXES = ['Club', 'Society', 'Association', 'at UCLA', 'Collective', 'Council', 'Network']
+
+
+def _read(file_name):
+    with open(os.path.join(BASE_DIR, file_name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class CorpusModel:
+    # Word and field statistics of the shipped club files, from which
+    # synthetic clubs are sampled: description words by their frequency
+    # (so term frequencies keep their long tail), description lengths,
+    # name words, the share of clubs with an email or Instagram, and the
+    # sports divisions.
+    def __init__(self, orgs, sports):
+        descriptions = [item.get('description') or '' for item in orgs + sports]
+        counts = Counter(word for text in descriptions for word in _WORD.findall(text))
+        self.words = np.array(list(counts), dtype=object)
+        self.word_p = np.array(list(counts.values()), dtype=np.float64)
+        self.word_p /= self.word_p.sum()
+        self.org_lengths = np.array([len(_WORD.findall(item.get('description') or '')) for item in orgs])
+        self.sport_lengths = np.array(
+            [len(_WORD.findall(item.get('description') or '')) for item in sports]
+        )
+        self.name_words = np.array(
+            sorted({word for item in orgs for word in _WORD.findall(item.get('name') or '')}),
+            dtype=object,
+        )
+        self.sport_names = sorted({item['name'].split(' - ')[0] for item in sports})
+        self.divisions = [item.get('category') for item in sports]
+        self.org_email_rate = np.mean([bool(item.get('email')) for item in orgs])
+        self.org_instagram_rate = np.mean([bool(item.get('instagram')) for item in orgs])
+        self.sport_contact_rate = np.mean([bool(item.get('contact')) for item in sports])
+        self.sport_instagram_rate = np.mean(
+            [bool((item.get('social_media') or {}).get('instagram')) for item in sports]
+        )
+        self.sports_share = len(sports) / (len(orgs) + len(sports))
+
+    @classmethod
+    def from_files(cls):
+        return cls(_read(ORGS_FILE), _read(SPORTS_FILE))
+
+    # Descriptions with lengths drawn from the given real lengths
+    def _descriptions(self, rng, n, lengths):
+        sizes = np.maximum(rng.choice(lengths, n), 1)
+        words = self.words[rng.choice(len(self.words), sizes.sum(), p=self.word_p)]
+        ends = np.cumsum(sizes)
+        return [' '.join(words[end - size:end]) + '.' for size, end in zip(sizes, ends)]
+
+    # Raw records shaped like HOTH XII Orgs.json
+    def orgs(self, n, seed=0):
+        rng = np.random.default_rng(seed)
+        records = []
+        for start in range(0, n, CHUNK_SIZE):
+            count = min(CHUNK_SIZE, n - start)
+            descriptions = self._descriptions(rng, count, self.org_lengths)
+            name_sizes = rng.integers(1, 4, count)
+            for i, description in enumerate(descriptions):
+                club_id = start + i + 1
+                words = list(self.name_words[rng.choice(len(self.name_words), name_sizes[i])])
+                name = ' '.join(words + [_NAME_SUFFIXES[club_id % len(_NAME_SUFFIXES)]])
+                handle = f"club{club_id}"
+                record = {
+                    'id': club_id,
+                    'name': name,
+                    'url': f"https://community.ucla.edu/studentorg/{club_id}",
+                    'description': description,
+                }
+                if rng.random() < self.org_instagram_rate:
+                    record['instagram'] = f"https://www.instagram.com/{handle}/"
+                if rng.random() < self.org_email_rate:
+                    record['email'] = [f"{handle}@gmail.com"]
+                records.append(record)
+        return records
+
+    # Raw records shaped like UCLA Club Sports.json
+    def sports(self, n, seed=0):
+        rng = np.random.default_rng(seed + 1)
+        descriptions = self._descriptions(rng, n, self.sport_lengths)
+        records = []
+        for i, description in enumerate(descriptions):
+            sport = self.sport_names[i % len(self.sport_names)]
+            slug = f"{re.sub(r'[^a-z0-9]+', '-', sport.lower())}-{i}"
+            record = {
+                'name': f"{sport} {i} - UCLA Community",
+                'url': f"https://community.ucla.edu/clubsport/{slug}",
+                'category': self.divisions[rng.integers(len(self.divisions))],
+                'description': description,
+            }
+            if rng.random() < self.sport_contact_rate:
+                record['contact'] = {'email': f"{slug}@gmail.com"}
+                social_media = {}
+                if rng.random() < self.sport_instagram_rate:
+                    social_media['instagram'] = f"https://www.instagram.com/{slug}/"
+                record['social_media'] = social_media
+            records.append(record)
+        return records
+
+    # Write a corpus of n clubs, split between the two sources like the
+    # shipped files, into directory under the shipped file names
+    def write(self, directory, n, seed=0):
+        n_sports = max(1, round(n * self.sports_share))
+        corpora = {ORGS_FILE: self.orgs(n - n_sports, seed), SPORTS_FILE: self.sports(n_sports, seed)}
+        for file_name, records in corpora.items():
+            with open(os.path.join(directory, file_name), 'w', encoding='utf-8') as f:
+                json.dump(records, f)
+        return corpora
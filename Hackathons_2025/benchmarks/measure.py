@@ -0,0 +1,128 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+DEFAULT_ENGINES = ('tfidf', 'bm25', 'semantic', 'hybrid')
+
+
+def _summary(latencies_ms, elapsed_s):
+    import numpy as np
+
+    latencies = np.array(latencies_ms)
+    return {
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'qps': round(len(latencies) / elapsed_s, 1) if elapsed_s else None,
+    }
+
+
+# Time each call of fn over the queries: (latencies in ms, total seconds)
+def _replay(fn, queries, before_each=None):
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        if before_each is not None:
+            before_each()
+        t = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - t) * 1000)
+    return latencies, time.perf_counter() - started
+
+
+# Benchmark one corpus size in this process: generate the corpus, build
+# and load its index through the app's own load path, replay the query
+# mix against the ranking functions (result cache cleared before every
+# query, so each one is scored) and against the Flask app (cache on, as
+# served), and record peak memory
+def run(n_clubs, n_queries, engines=DEFAULT_ENGINES, seed=0):
+    workdir = tempfile.mkdtemp(prefix='club-bench-')
+    # Must be set before the app modules are imported
+    os.environ['CLUB_DATA_DIR'] = workdir
+    os.environ['CLUB_INDEX_DIR'] = os.path.join(workdir, 'index_cache')
+    os.environ['CLUB_RELOAD_INTERVAL'] = '0'
+    try:
+        from benchmarks.corpus import CorpusModel
+        from benchmarks.queries import query_mix
+
+        result = {'clubs': n_clubs, 'queries': n_queries}
+        started = time.perf_counter()
+        model = CorpusModel.from_files()
+        corpora = model.write(workdir, n_clubs, seed)
+        result['corpus_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            from catalog import Catalog
+            from corpora import SOURCES
+
+            started = time.perf_counter()
+            for source in SOURCES:
+                Catalog.build(source).save()
+            result['build_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+            started = time.perf_counter()
+            import recommend
+            result['startup_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        from fusion import LatencyBudget
+        from query_cache import invalidate
+
+        names = [item['name'] for records in corpora.values() for item in records]
+        queries = query_mix(model, names, n_queries, seed)
+        catalogs = recommend.corpora.catalogs()
+        client = recommend.app.test_client()
+
+        result['scoring'] = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for engine in engines:
+                result['scoring'][engine] = _summary(*_replay(
+                    lambda query: recommend.recommend(
+                        catalogs, query, engine=engine, budget=LatencyBudget()
+                    ),
+                    queries,
+                    before_each=invalidate,
+                ))
+
+            invalidate()
+            result['submit'] = _summary(*_replay(
+                lambda query: client.post('/submit', data={'query': query}).get_data(), queries
+            ))
+            invalidate()
+            result['api'] = _summary(*_replay(
+                lambda query: client.post('/api/recommend', json={'query': query}).get_data(),
+                queries,
+            ))
+
+        # ru_maxrss is in kilobytes on Linux
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# python -m benchmarks.measure --clubs N --queries Q --output result.json
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark one synthetic corpus size')
+    parser.add_argument('--clubs', type=int, required=True)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--engines', default=','.join(DEFAULT_ENGINES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the result here instead of stdout')
+    args = parser.parse_args(argv)
+
+    result = run(args.clubs, args.queries, args.engines.split(','), args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+
+# Queries typed on the home page: short statements of interest
+INTEREST_QUERIES = [
+    "I love coding and machine learning",
+    "dance music art",
+    "robotics hackathon team competition",
+    "volunteer service health",
+    "pre-med research opportunities",
+    "startup entrepreneurship networking",
+    "photography and film",
+    "intramural soccer",
+    "mentorship for first generation students",
+    "environmental sustainability activism",
+    "debate and public speaking",
+    "video games esports",
+    "cultural community and food",
+    "women in engineering",
+    "mental health awareness",
+    "investing finance consulting",
+    "theater acting improv",
+    "outdoor hiking climbing",
+    "data science analytics projects",
+    "writing journalism magazine",
+]
+
+# Share of each kind of query in the replayed mix
+QUERY_MIX = {
+    'interest': 0.4,
+    'words': 0.3,
+    'name': 0.15,
+    'typo': 0.1,
+    'no_match': 0.05,
+}
+
+# Distinct queries per replayed query; repeats follow a Zipf law, so the
+# result cache sees a realistic hit rate
+DISTINCT_SHARE = 0.3
+ZIPF_EXPONENT = 1.1
+
+_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+# One random edit (drop, swap, replace or insert a letter) in a word
+def _typo(rng, word):
+    if len(word) < 4:
+        return word
+    i = int(rng.integers(1, len(word) - 1))
+    kind = rng.integers(4)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+    letter = _LETTERS[rng.integers(len(_LETTERS))]
+    if kind == 2:
+        return word[:i] + letter + word[i + 1:]
+    return word[:i] + letter + word[i:]
+
+
+# n queries to replay against a corpus: a pool of distinct queries of
+# every kind in QUERY_MIX, drawn with Zipf-distributed popularity. Words
+# are sampled from the corpus's own vocabulary (model: CorpusModel) and
+# names from its clubs.
+def query_mix(model, names, n, seed=0):
+    rng = np.random.default_rng(seed + 2)
+    # Mid-frequency words: neither stop words nor one-off words
+    order = np.argsort(-model.word_p)
+    words = model.words[order[len(order) // 100:len(order) // 5]]
+
+    def words_query():
+        return ' '.join(str(w).lower() for w in words[rng.integers(len(words), size=rng.integers(1, 6))])
+
+    makers = {
+        'interest': lambda: INTEREST_QUERIES[rng.integers(len(INTEREST_QUERIES))],
+        'words': words_query,
+        'name': lambda: names[rng.integers(len(names))],
+        'typo': lambda: ' '.join(_typo(rng, word) for word in words_query().split()),
+        'no_match': lambda: 'zzzz qqqq',
+    }
+    kinds = list(QUERY_MIX)
+    n_distinct = max(1, int(n * DISTINCT_SHARE))
+    pool = [
+        makers[kind]()
+        for kind in rng.choice(kinds, n_distinct, p=[QUERY_MIX[kind] for kind in kinds])
+    ]
+    popularity = 1.0 / np.arange(1, n_distinct + 1) ** ZIPF_EXPONENT
+    picks = rng.choice(n_distinct, n, p=popularity / popularity.sum())
+    return [pool[i] for i in picks]
@@ -0,0 +1,183 @@
+import numpy as np
+from scipy import sparse
+
+from artifacts import csr_arrays, csr_from_arrays
+from scoring import Hits, select_top_k
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_NO_ROWS = np.empty(0, dtype=np.int32)
+_NO_SCORES = np.empty(0, dtype=np.float64)
+
+
+# Largest value of each row of a CSR matrix (0 for empty rows)
+def _row_max(matrix):
+    maxima = np.zeros(matrix.shape[0], dtype=np.float64)
+    nonempty = np.diff(matrix.indptr) > 0
+    if nonempty.any():
+        maxima[nonempty] = np.maximum.reduceat(matrix.data, matrix.indptr[:-1][nonempty])
+    return maxima
+
+
+class BM25Index:
+    # Inverted index scored with Okapi BM25, over the same n-gram vocabulary
+    # as the TF-IDF index. Each posting holds the club's whole BM25
+    # contribution for its term (its impact), so scoring is a sum of
+    # impacts, and each term keeps the largest impact in its list as an
+    # upper bound. search() uses those bounds to skip clubs that cannot
+    # reach the requested page (MaxScore early termination).
+    def __init__(self, idf, avg_length, impacts, postings=None, max_impacts=None):
+        self.idf = idf
+        self.avg_length = avg_length
+        # Club-major impacts, reordered by incremental updates
+        self.impacts = impacts
+        if postings is None:
+            # Term-major lists with club rows in ascending order, so single
+            # clubs can be looked up in a list with a binary search
+            postings = impacts.T.tocsr()
+            postings.sort_indices()
+        self.postings = postings
+        self.max_impacts = max_impacts if max_impacts is not None else _row_max(postings)
+
+    def __len__(self):
+        return self.impacts.shape[0]
+
+    # Build from an n_clubs x n_terms matrix of raw term counts
+    @classmethod
+    def build(cls, counts):
+        n_clubs, n_terms = counts.shape
+        doc_freq = np.bincount(counts.indices, minlength=n_terms)
+        # Lucene's variant of the BM25 IDF, which is never negative
+        idf = np.log1p((n_clubs - doc_freq + 0.5) / (doc_freq + 0.5))
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        avg_length = float(lengths.mean()) if n_clubs and lengths.any() else 1.0
+        index = cls(idf, avg_length, sparse.csr_matrix(counts.shape))
+        return index.with_impacts(index.impact_rows(counts))
+
+    # BM25 impacts of raw count rows, using this index's IDF weights and
+    # average length (used for clubs added to an existing index)
+    def impact_rows(self, counts):
+        counts = sparse.csr_matrix(counts)
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        row_lengths = np.repeat(lengths, np.diff(counts.indptr))
+        tf = counts.data
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * row_lengths / self.avg_length)
+        data = self.idf[counts.indices] * tf * (BM25_K1 + 1) / (tf + norm)
+        return sparse.csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+
+    # Copy of this index over different impact rows, sharing the IDF
+    # weights and average length
+    def with_impacts(self, impacts):
+        return BM25Index(self.idf, self.avg_length, sparse.csr_matrix(impacts))
+
+    def to_arrays(self, prefix='bm25'):
+        arrays = dict(
+            csr_arrays(self.impacts, f"{prefix}_impacts"),
+            **csr_arrays(self.postings, f"{prefix}_postings"),
+        )
+        arrays[f"{prefix}_idf"] = self.idf
+        arrays[f"{prefix}_max_impacts"] = self.max_impacts
+        meta = {f"{prefix}_avg_length": self.avg_length}
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta, shape, prefix='bm25'):
+        n_clubs, n_terms = shape
+        return cls(
+            arrays[f"{prefix}_idf"],
+            meta[f"{prefix}_avg_length"],
+            csr_from_arrays(arrays, f"{prefix}_impacts", (n_clubs, n_terms)),
+            postings=csr_from_arrays(arrays, f"{prefix}_postings", (n_terms, n_clubs)),
+            max_impacts=arrays[f"{prefix}_max_impacts"],
+        )
+
+    # Posting list (club rows, impacts) of a term
+    def _postings(self, col):
+        start, end = self.postings.indptr[col], self.postings.indptr[col + 1]
+        return self.postings.indices[start:end], self.postings.data[start:end]
+
+    # Add each list's weighted impact for the given rows to scores, looking
+    # the rows up by binary search instead of reading the whole lists
+    @staticmethod
+    def _add_lookups(scores, rows, lists):
+        for list_rows, list_impacts, weight in lists:
+            if not len(list_rows):
+                continue
+            pos = np.minimum(np.searchsorted(list_rows, rows), len(list_rows) - 1)
+            found = list_rows[pos] == rows
+            scores[found] += list_impacts[pos[found]] * weight
+
+    # Exact BM25 scores of the given club rows for a query
+    def score_rows(self, term_counts, rows):
+        scores = np.zeros(len(rows), dtype=np.float64)
+        lists = [self._postings(col) + (float(count),) for col, count in term_counts]
+        self._add_lookups(scores, np.asarray(rows), lists)
+        return scores
+
+    # One page of hits for a query given as term_counts() pairs; a term
+    # repeated in the query counts that many times.
+    #
+    # MaxScore: a lower bound on the score of the last club of the page is
+    # taken from the strongest term's best clubs. Terms are ordered by
+    # their upper bound; the weakest terms whose bounds sum below that
+    # threshold cannot lift a club onto the page alone, so candidates are
+    # only drawn from the other ("essential") lists, and the weak lists are
+    # probed for those candidates only, dropping any candidate whose
+    # remaining bound can no longer reach the threshold. Pruned clubs are
+    # never scored, so once a list was skipped the number of matching clubs
+    # is unknown and `total` is None; callers that need the matching clubs
+    # find them on their own (facets.matching_rows).
+    def search(self, term_counts, top_k=5, min_score=0.0, offset=0, allowed=None):
+        if not term_counts:
+            return Hits(_NO_ROWS, _NO_SCORES, 0)
+        cols = np.array([col for col, _ in term_counts], dtype=np.int64)
+        weights = np.array([count for _, count in term_counts], dtype=np.float64)
+        bounds = self.max_impacts[cols] * weights
+        order = np.argsort(bounds, kind='stable')
+        lists = [self._postings(cols[i]) + (weights[i],) for i in order]
+        bounds = bounds[order]
+
+        # Threshold from the page-size best clubs of the strongest list
+        page_end = offset + top_k
+        threshold = -np.inf
+        seed_rows, seed_impacts, _ = lists[-1]
+        if allowed is not None:
+            keep = allowed[seed_rows]
+            seed_rows, seed_impacts = seed_rows[keep], seed_impacts[keep]
+        if len(seed_rows) >= page_end:
+            seed = seed_rows[np.argpartition(-seed_impacts, page_end - 1)[:page_end]]
+            seed_scores = np.zeros(len(seed), dtype=np.float64)
+            self._add_lookups(seed_scores, seed, lists)
+            threshold = seed_scores.min()
+
+        # Leading (weakest) lists that cannot reach the threshold, or even
+        # exceed min_score, on their own
+        prefix_bounds = np.cumsum(bounds)
+        n_weak = int(np.searchsorted(prefix_bounds, threshold, side='left'))
+        n_weak = max(n_weak, int(np.searchsorted(prefix_bounds, min_score, side='right')))
+        n_weak = min(n_weak, len(lists) - 1)
+
+        essential = lists[n_weak:]
+        rows = np.concatenate([list_rows for list_rows, _, _ in essential])
+        contributions = np.concatenate([
+            list_impacts * weight for _, list_impacts, weight in essential
+        ])
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions, minlength=len(candidates))
+        if allowed is not None:
+            keep = allowed[candidates]
+            candidates, scores = candidates[keep], scores[keep]
+
+        # Probe the weak lists from strongest to weakest
+        for i in range(n_weak - 1, -1, -1):
+            alive = scores + prefix_bounds[i] >= threshold
+            candidates, scores = candidates[alive], scores[alive]
+            self._add_lookups(scores, candidates, [lists[i]])
+
+        hits = select_top_k(
+            candidates, scores, top_k=top_k, min_score=min_score, offset=offset
+        )
+        # Without weak lists every club with a posting was scored exactly
+        return hits if n_weak == 0 else hits._replace(total=None)
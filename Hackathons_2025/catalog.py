@@ -0,0 +1,359 @@
+import json
+import os
+import shutil
+from functools import cached_property
+
+import numpy as np
+from scipy import sparse
+
+from artifacts import ArtifactError, open_artifact, write_artifact
+from bm25 import BM25Index
+from club_data import collect_clubs, data_path, load_clubs, tag_clubs
+from club_index import (
+    HASH_FEATURES, INDEXED_FIELDS, INDEX_FORMAT_VERSION, ClubIndex, artifact_path, file_hash,
+    quarantine_path,
+)
+from club_store import ClubTable
+from club_views import ViewTable
+from facets import FacetColumns
+from hashing import HashingIndex
+from neighbors import NeighborGraph
+from scoring import search
+from semantic import SemanticIndex
+from spelling import SPELL_CORRECTION, SpellingIndex, correct_tokens
+from suggest import SuggestIndex
+
+
+class CatalogError(Exception):
+    pass
+
+
+# Rejected records reported per load; the rest are only in the
+# quarantine file
+REJECTED_SHOWN = 5
+
+
+class Catalog:
+    # Everything a request reads about one club source: its club records
+    # (a columnar ClubTable), tag bitmasks, category indexes, facet
+    # columns, the search indexes (TF-IDF, BM25 and latent semantic) and
+    # the similar-clubs graph, all row-aligned, plus the spelling and
+    # autocomplete indexes over the vocabulary and club names. Loaded
+    # catalogs are memory-mapped from an artifact that every worker shares;
+    # display views are built lazily per row. A catalog is never modified;
+    # reloads build a new one and swap the reference, so a request that
+    # grabbed a catalog sees one consistent version throughout.
+    def __init__(self, source, clubs, tag_bits, categories, facets, index, bm25, semantic,
+                 neighbors, speller, suggester):
+        self.source = source
+        self.clubs = clubs
+        self.tag_bits = tag_bits
+        self.categories = categories
+        self.facets = facets
+        self.index = index
+        self.bm25 = bm25
+        self.semantic = semantic
+        self.neighbors = neighbors
+        self.speller = speller
+        self.suggester = suggester
+        self.views = ViewTable(clubs, tag_bits, categories)
+
+    def __len__(self):
+        return len(self.clubs)
+
+    @property
+    def name(self):
+        return self.source.name
+
+    @property
+    def version(self):
+        return self.index.version
+
+    # Row of each club id, built on first use (by validate)
+    @cached_property
+    def rows_by_id(self):
+        return {club_id: row for row, club_id in enumerate(self.clubs.club_ids())}
+
+    # Open the shared artifact for the current source file, building and
+    # saving it first if no worker has done so yet. With build=False a
+    # missing artifact is an error, so the serving process never imports
+    # scikit-learn or parses the JSON file.
+    @classmethod
+    def load(cls, source, build=True):
+        try:
+            version = source_version(source)
+        except OSError as e:
+            raise CatalogError(f"Could not read {source.file_path}: {str(e)}") from e
+        path = artifact_path(source.name, version)
+        if os.path.isdir(path):
+            try:
+                catalog = cls.open(source, path)
+                print(f"Successfully loaded {len(catalog)} clubs from {path}")
+                return catalog
+            except CatalogError as e:
+                print(f"Rebuilding unusable artifact: {str(e)}")
+                shutil.rmtree(path, ignore_errors=True)
+        if not build:
+            raise CatalogError(
+                f"No prebuilt index for {source.file_path}; run python club_index.py {source.name}"
+            )
+
+        catalog = cls.build(source, version)
+        try:
+            catalog.save(path)
+            # Serve from the mapped copy so this worker shares its pages too
+            catalog = cls.open(source, path)
+        except (OSError, CatalogError) as e:
+            print(f"Error saving artifact, serving from memory: {str(e)}")
+        print(f"Successfully loaded {len(catalog)} clubs")
+        return catalog
+
+    # Read, tag and index a source from its JSON file. Terms are counted by
+    # `workers` processes, once per text: a hashed index counts every field
+    # and shares its description counts with BM25; with a fitted
+    # vocabulary, that is the BM25 counting.
+    @classmethod
+    def build(cls, source, version=None, workers=1):
+        try:
+            version = version or source_version(source)
+            clubs = read_source(source, version)
+            # The artifact is keyed by this hash, so it must describe
+            # exactly the data that was read
+            if source_version(source) != version:
+                raise ValueError("file changed while it was being read")
+        except (OSError, ValueError) as e:
+            raise CatalogError(f"Could not read {source.file_path}: {str(e)}") from e
+        if not len(clubs):
+            raise CatalogError(f"No usable clubs in {source.file_path}")
+        tag_bits, categories = tag_clubs(clubs)
+        descriptions = clubs.texts['description']
+        fields = field_texts(clubs)
+        if HASH_FEATURES:
+            index, counts = HashingIndex.build(descriptions, version, fields, HASH_FEATURES, workers)
+            corpus_words = ()
+        else:
+            index = ClubIndex.build(descriptions, version, fields)
+            counts = index.count_texts(descriptions, workers)
+            corpus_words = {
+                word for texts in [descriptions, *fields.values()] for text in texts
+                for word in index.tokens(text)
+            }
+        catalog = cls(
+            source,
+            clubs,
+            tag_bits,
+            categories,
+            FacetColumns.build(clubs),
+            index,
+            BM25Index.build(counts),
+            SemanticIndex.build(index.matrix),
+            NeighborGraph.build(index.matrix),
+            SpellingIndex.build(index, corpus_words),
+            SuggestIndex.build(fields['name'], index),
+        )
+        catalog.validate()
+        return catalog
+
+    # Arrays and metadata stored in this catalog's artifact
+    def to_arrays(self):
+        index_arrays, index_meta = self.index.to_arrays()
+        bm25_arrays, bm25_meta = self.bm25.to_arrays()
+        arrays = dict(
+            index_arrays,
+            **bm25_arrays,
+            **self.facets.to_arrays(),
+            **self.semantic.to_arrays(),
+            **self.neighbors.to_arrays(),
+            **self.speller.to_arrays(),
+            **self.suggester.to_arrays(),
+            **self.clubs.to_arrays(),
+            tag_bits=self.tag_bits,
+            categories=self.categories,
+        )
+        meta = dict(index_meta, **bm25_meta, source=self.name, format_version=INDEX_FORMAT_VERSION)
+        return arrays, meta
+
+    def save(self, path=None):
+        path = path or artifact_path(self.name, self.version)
+        write_artifact(path, *self.to_arrays())
+        return path
+
+    @classmethod
+    def open(cls, source, path):
+        try:
+            arrays, meta = open_artifact(path)
+            if meta.get('format_version') != INDEX_FORMAT_VERSION or meta.get('source') != source.name:
+                raise CatalogError(f"Artifact {path} was built for another format or source")
+            catalog = cls(
+                source,
+                ClubTable.from_arrays(arrays),
+                arrays['tag_bits'],
+                arrays['categories'],
+                FacetColumns.from_arrays(arrays),
+                (HashingIndex if 'hash_features' in meta else ClubIndex).from_arrays(arrays, meta),
+                BM25Index.from_arrays(arrays, meta, meta['shape']),
+                SemanticIndex.from_arrays(arrays),
+                NeighborGraph.from_arrays(arrays),
+                SpellingIndex.from_arrays(arrays),
+                SuggestIndex.from_arrays(arrays),
+            )
+        except (ArtifactError, KeyError, ValueError) as e:
+            raise CatalogError(f"Could not open artifact {path}: {str(e)}") from e
+        catalog.validate()
+        return catalog
+
+    # Fault in every mapped page and run one query end to end, so the
+    # first request does not pay for page faults or first-call setup
+    def warm(self):
+        arrays, _ = self.to_arrays()
+        for array in arrays.values():
+            np.asarray(array).view(np.uint8).sum()
+        view = self.views[0]
+        search(self.index, self.index.transform(view.name), top_k=1)
+
+    # Refuse to serve a catalog whose parts disagree or whose index is
+    # unusable
+    def validate(self):
+        n = len(self.clubs)
+        if not n:
+            raise CatalogError("Catalog has no clubs")
+        sizes = (
+            len(self.tag_bits), len(self.categories), len(self.facets),
+            len(self.index), len(self.bm25), len(self.semantic), len(self.neighbors),
+        )
+        if any(size != n for size in sizes):
+            raise CatalogError(f"Catalog parts are misaligned: {n} clubs vs {sizes}")
+        if len(self.rows_by_id) != n:
+            raise CatalogError("Club ids are not unique")
+        if not np.all(np.isfinite(self.index.matrix.data)):
+            raise CatalogError("Index contains non-finite weights")
+
+    # New catalog with clubs added, replaced or removed. Only the changed
+    # clubs are tokenized and tagged: their vectors use this index's
+    # vocabulary and IDF weights, and every other row is reused as is.
+    # Terms that are new to the corpus are picked up by the next full build.
+    # The result lives in this worker's memory until the next full load.
+    def apply_changes(self, upserts, removed_ids, version):
+        new_clubs, rejected = collect_clubs((j, None, item) for j, item in enumerate(upserts, 1))
+        report_rejected(self.source, rejected)
+        tag_bits, categories = tag_clubs(new_clubs)
+        # Upserts that fail validation drop the club, as a full load would
+        removed = set(removed_ids) | (
+            {item.get('id') for item in upserts if isinstance(item, dict)} - set(new_clubs.club_ids())
+        )
+        replaced = {club_id: j for j, club_id in enumerate(new_clubs.club_ids())}
+
+        # Rows index into old rows followed by the newly processed ones
+        n_old = len(self)
+        order = []
+        for club_id, row in self.rows_by_id.items():
+            if club_id in replaced:
+                order.append(n_old + replaced.pop(club_id))
+            elif club_id not in removed:
+                order.append(row)
+        order.extend(n_old + j for j in sorted(replaced.values()))
+        order = np.array(order, dtype=np.int64)
+
+        descriptions = new_clubs.texts['description']
+        term_counts = [self.index.term_counts(description) for description in descriptions]
+        new_rows = self.index.vectorize(term_counts)
+        matrix = sparse.vstack([self.index.matrix, new_rows], format='csr')[order]
+        new_fields = field_texts(new_clubs)
+        fields = {
+            name: sparse.vstack(
+                [field, self.index.transform_many(new_fields[name])], format='csr'
+            )[order]
+            for name, field in self.index.fields.items()
+        }
+        impacts = sparse.vstack(
+            [self.bm25.impacts, self.bm25.impact_rows(self.index.count_matrix(term_counts))],
+            format='csr',
+        )[order]
+        index = self.index.with_matrix(matrix, version, fields)
+        clubs = ClubTable.from_records(
+            self.clubs[row] if row < n_old else new_clubs[row - n_old] for row in order
+        )
+        catalog = Catalog(
+            self.source,
+            clubs,
+            np.concatenate([self.tag_bits, tag_bits])[order],
+            np.concatenate([self.categories, categories])[order],
+            FacetColumns.build(clubs),
+            index,
+            self.bm25.with_impacts(impacts),
+            self.semantic.with_vectors(
+                np.vstack([self.semantic.vectors, self.semantic.project(new_rows)])[order]
+            ),
+            self.neighbors.with_changes(matrix, np.where(order < n_old, order, -1)),
+            self.speller,
+            SuggestIndex.build(clubs.texts['name'], index),
+        )
+        catalog.validate()
+        return catalog
+
+
+# Text of each indexed field, aligned with the club rows
+def field_texts(clubs):
+    return {field: clubs.column(field) for field in INDEXED_FIELDS}
+
+
+# Club records that differ between the current catalog and a fresh read
+# of its source: (upserted records, removed ids)
+def diff_clubs(catalog, clubs):
+    upserts = []
+    club_ids = clubs.club_ids()
+    for new_row, club_id in enumerate(club_ids):
+        row = catalog.rows_by_id.get(club_id)
+        club = clubs[new_row]
+        if row is None or catalog.clubs[row] != club:
+            upserts.append(club)
+    new_ids = set(club_ids)
+    removed = [club_id for club_id in catalog.rows_by_id if club_id not in new_ids]
+    return upserts, removed
+
+
+# Print the records a load set aside and, with a version, write them to
+# the source's quarantine file (one JSON line each) for inspection
+def report_rejected(source, rejected, version=None):
+    if not rejected:
+        return
+    for item in rejected[:REJECTED_SHOWN]:
+        where = f"record {item.record}" + (f" (line {item.line})" if item.line else '')
+        print(f"Rejected {source.file_path} {where}: {item.error}")
+    if version is None:
+        print(f"Rejected {len(rejected)} records of {source.file_path}")
+        return
+    path = quarantine_path(source.name, version)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for item in rejected:
+                f.write(json.dumps(item._asdict(), ensure_ascii=False) + '\n')
+        print(f"Rejected {len(rejected)} records of {source.file_path}; quarantined in {path}")
+    except OSError as e:
+        print(f"Rejected {len(rejected)} records of {source.file_path}; could not write {path}: {str(e)}")
+
+
+# Clubs of a source that pass validation, stored column-wise; records
+# that do not are reported and quarantined
+def read_source(source, version=None):
+    clubs, rejected = load_clubs(source.file_path, source.adapter)
+    report_rejected(source, rejected, version)
+    return clubs
+
+
+# Tokens of a query searched across catalogs, after spelling correction,
+# and the corrections made ({typo: fix}). Corrections are decided once for
+# all the catalogs (see spelling.correct_tokens), so a word one source
+# knows is never rewritten for another. Every index shares one analyzer.
+def query_tokens(catalogs, text):
+    if not catalogs:
+        return [], {}
+    tokens = catalogs[0].index.tokens(text)
+    if not SPELL_CORRECTION:
+        return tokens, {}
+    return correct_tokens(tokens, [(catalog.speller, catalog.index) for catalog in catalogs])
+
+
+def source_version(source):
+    return file_hash(data_path(source.file_path))
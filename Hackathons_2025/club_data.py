@@ -0,0 +1,210 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+from club_store import ClubTableBuilder
+from tagging import compute_tags
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Directory holding the club JSON files (this directory by default)
+DATA_DIR = os.environ.get('CLUB_DATA_DIR', BASE_DIR)
+
+# Characters read from a data file at a time
+READ_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DECODER = json.JSONDecoder()
+
+# A record left out of a load: its number in the file (from 1), the line
+# it starts on (None for records that did not come from a file), why it
+# was rejected, and the record as read
+Rejected = namedtuple('Rejected', ['record', 'line', 'error', 'raw'])
+
+
+# Resolve a data file relative to DATA_DIR
+def data_path(file_path):
+    return os.path.join(DATA_DIR, file_path)
+
+
+class _ArrayReader:
+    # Decodes the elements of a top-level JSON array one at a time from a
+    # window of the file's text, so only the current record is ever parsed
+    # into Python objects. Tracks the line and column of the window start
+    # to report where a syntax error is.
+    def __init__(self, f):
+        self.f = f
+        self.text = ''
+        self.pos = 0
+        self.line = 1
+        self.column = 1
+        self.eof = False
+
+    # Drop the consumed text and append the next chunk; False at the end
+    def _read(self, size=READ_SIZE):
+        chunk = '' if self.eof else self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        consumed = self.text[:self.pos]
+        newlines = consumed.count('\n')
+        if newlines:
+            self.line += newlines
+            self.column = len(consumed) - consumed.rfind('\n')
+        else:
+            self.column += len(consumed)
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    # (line, column) of an offset into the window
+    def position(self, offset):
+        newlines = self.text.count('\n', 0, offset)
+        if not newlines:
+            return self.line, self.column + offset
+        return self.line + newlines, offset - self.text.rfind('\n', 0, offset)
+
+    def error(self, message, offset=None):
+        line, column = self.position(self.pos if offset is None else offset)
+        return ValueError(f"{message}: line {line} column {column}")
+
+    # Next non-whitespace character, without consuming it; None at the end
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._read():
+                return None
+
+    # Decode the value at the current position. A value that runs past the
+    # window (or may, like a number at its very end) is retried with at
+    # least as much text again, so the window grows to the largest single
+    # record in a number of reads logarithmic in its size.
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                if self._read(max(READ_SIZE, len(self.text) - self.pos)):
+                    continue
+                raise self.error(e.msg, e.pos) from None
+            if end == len(self.text) and self._read(max(READ_SIZE, len(self.text) - self.pos)):
+                continue
+            self.pos = end
+            return value
+
+
+# Raw records of a JSON file holding a list of clubs, as (record number,
+# line, record), parsed one at a time so the whole file is never held as
+# one parse tree. Malformed JSON raises ValueError with its line and column.
+def iter_records(file_path):
+    with open(data_path(file_path), 'r', encoding='utf-8') as f:
+        reader = _ArrayReader(f)
+        if reader.peek() != '[':
+            raise reader.error("Expecting a JSON list of clubs")
+        reader.pos += 1
+        if reader.peek() == ']':
+            reader.pos += 1
+        else:
+            number = 0
+            while True:
+                number += 1
+                reader.peek()
+                line, _ = reader.position(reader.pos)
+                yield number, line, reader.value()
+                char = reader.peek()
+                if char is None:
+                    raise reader.error("Unexpected end of file")
+                reader.pos += 1
+                if char == ']':
+                    break
+                if char != ',':
+                    raise reader.error("Expecting ',' delimiter", reader.pos - 1)
+        if reader.peek() is not None:
+            raise reader.error("Extra data")
+
+
+def _text(value, field, required=False):
+    if value is None:
+        value = ''
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string, not {type(value).__name__}")
+    value = value.strip()
+    if required and not value:
+        raise ValueError(f"{field} is missing or empty")
+    return value or None
+
+
+# Validated, normalized copy of a common club record: the id must be an
+# integer or a non-empty string, name and description non-empty strings,
+# and email (a string, or a list whose first string is kept), instagram,
+# division and source strings or missing. Text is stripped, and empty
+# optional fields become None. Raises ValueError naming the problem.
+def normalize_club(item):
+    if not isinstance(item, dict):
+        raise ValueError("record is not an object")
+    club_id = item.get('id')
+    if isinstance(club_id, str):
+        club_id = club_id.strip()
+    elif club_id is None:
+        raise ValueError("id is missing")
+    elif not isinstance(club_id, int) or isinstance(club_id, bool) or not -2**63 <= club_id < 2**63:
+        raise ValueError(f"id must be an integer or a string, not {club_id!r}")
+    if club_id == '':
+        raise ValueError("id is empty")
+    email = item.get('email')
+    if isinstance(email, list):
+        if not all(isinstance(address, str) for address in email):
+            raise ValueError("email must be a string or a list of strings")
+        email = email[0] if email else None
+    return {
+        'id': club_id,
+        'name': _text(item.get('name'), 'name', required=True),
+        'description': _text(item.get('description'), 'description', required=True),
+        'email': _text(email, 'email'),
+        'instagram': _text(item.get('instagram'), 'instagram'),
+        'division': _text(item.get('division'), 'division'),
+        'source': _text(item.get('source'), 'source'),
+    }
+
+
+# Map raw records (record number, line, record) to common club records
+# with a corpus adapter (None if they already are), normalize them and
+# store them column-wise. Records that cannot be used are set aside
+# rather than failing the load. Returns (ClubTable, [Rejected]).
+def collect_clubs(records, adapter=None):
+    builder = ClubTableBuilder()
+    rejected = []
+    for number, line, raw in records:
+        try:
+            if adapter is not None:
+                if not isinstance(raw, dict):
+                    raise ValueError("record is not an object")
+                try:
+                    item = adapter(raw)
+                except (AttributeError, TypeError) as e:
+                    raise ValueError(f"record does not fit the source format: {str(e)}") from e
+                if item is None:
+                    raise ValueError("record does not fit the source format")
+            else:
+                item = raw
+            builder.append(normalize_club(item))
+        except ValueError as e:
+            rejected.append(Rejected(number, line, str(e), raw))
+    return builder.build(), rejected
+
+
+# Stream, validate and store the clubs of a JSON file; errors reading the
+# file propagate
+def load_clubs(file_path, adapter=None):
+    print(f"Loading clubs from: {data_path(file_path)}")
+    return collect_clubs(iter_records(file_path), adapter)
+
+
+# Tag bitmasks and category indexes of stored clubs. Tags and category
+# never change for a given club, so they are derived once, at load.
+def tag_clubs(clubs):
+    return compute_tags(clubs.texts['name'], clubs.texts['description'])
@@ -0,0 +1,355 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import re
+from collections import Counter, deque
+
+import numpy as np
+from scipy import sparse
+
+from artifacts import KeyIndex, StringTable, csr_arrays, csr_from_arrays
+from club_data import BASE_DIR
+from fusion import parse_settings
+
+# Bump whenever the artifact layout or VECTORIZER_PARAMS change so stale
+# artifacts are rebuilt instead of being loaded with the wrong meaning
+INDEX_FORMAT_VERSION = 12
+INDEX_DIR = os.environ.get('CLUB_INDEX_DIR', os.path.join(BASE_DIR, 'index_cache'))
+
+VECTORIZER_PARAMS = {
+    'stop_words': 'english',
+    'max_df': 0.7,
+    'ngram_range': (1, 2),
+}
+
+# Index over this many hashed feature columns instead of a fitted
+# vocabulary (see hashing.py), e.g. 262144; 0 fits a vocabulary
+HASH_FEATURES = int(os.environ.get('CLUB_HASH_FEATURES', '0'))
+
+# Texts sent to a worker at a time by count_texts
+COUNT_CHUNK_SIZE = 2000
+
+# Record fields indexed next to the description, and the weight of each
+# field's similarity in a club's score ("field:boost,...")
+INDEXED_FIELDS = ('name', 'division')
+FIELD_BOOSTS = parse_settings(
+    os.environ.get('CLUB_FIELD_BOOSTS', 'description:1,name:0.5,division:0.5'), float
+)
+
+# Same tokenizer as scikit-learn's default token_pattern
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+# Content hash of a source file, used to key its index artifact
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+# Artifact directory for one version of a source. Hashed indexes are
+# kept apart, so switching modes does not throw the other artifact away.
+def artifact_path(name, version):
+    mode = f"-h{HASH_FEATURES}" if HASH_FEATURES else ''
+    return os.path.join(INDEX_DIR, f"{name}-v{INDEX_FORMAT_VERSION}-{version}{mode}")
+
+
+# JSON lines file of the records a load of one version of a source rejected
+def quarantine_path(name, version):
+    return os.path.join(INDEX_DIR, 'quarantine', f"{name}-{version}.jsonl")
+
+
+# Add the terms of other fields (e.g. club names) that the descriptions
+# never use to a fitted vocabulary, keeping it sorted. Description weights
+# are unchanged; a new term's IDF uses the same smoothed formula, counting
+# the clubs whose description or fields contain it. Returns (terms, idf,
+# description matrix with remapped columns).
+def _extend_vocabulary(analyzer, terms, idf, matrix, descriptions, fields):
+    known = set(terms)
+    field_grams = [set() for _ in descriptions]
+    for texts in fields.values():
+        for grams, text in zip(field_grams, texts):
+            grams.update(analyzer(text or ''))
+    extra = set().union(*field_grams) - known
+    if not extra:
+        return terms, idf, matrix
+
+    doc_freq = Counter()
+    for description, grams in zip(descriptions, field_grams):
+        doc_freq.update((grams | set(analyzer(description))) & extra)
+    all_terms = sorted(known | extra)
+    position = {term: col for col, term in enumerate(all_terms)}
+    remap = np.array([position[term] for term in terms], dtype=np.int32)
+    n_clubs = len(descriptions)
+    all_idf = np.empty(len(all_terms), dtype=np.float64)
+    all_idf[remap] = idf
+    for term in extra:
+        all_idf[position[term]] = np.log((1 + n_clubs) / (1 + doc_freq[term])) + 1
+    matrix = sparse.csr_matrix(
+        (matrix.data, remap[matrix.indices], matrix.indptr), shape=(n_clubs, len(all_terms))
+    )
+    matrix.sort_indices()
+    return all_terms, all_idf, matrix
+
+
+class ClubIndex:
+    # Prebuilt TF-IDF index: vocabulary, IDF weights and the L2-normalized
+    # description matrix, plus one matrix per extra indexed field (club
+    # name, sports division) over the same vocabulary. Only build() needs
+    # scikit-learn; queries are vectorized here with the same analyzer so
+    # nothing is refit per request, and one query vector is scored against
+    # every field. The vocabulary is kept sorted (column i is the i-th
+    # term), so it can stay a memory-mapped StringTable, found through a
+    # memory-mapped KeyIndex instead of a per-process dict.
+    def __init__(self, terms, idf, matrix, stop_words, version, postings=None, fields=None,
+                 field_postings=None, term_keys=None):
+        self.terms = terms
+        if term_keys is None and terms is not None:
+            term_keys = KeyIndex.build(terms)
+        self.term_keys = term_keys
+        self.idf = idf
+        self.matrix = matrix
+        # Term-major copy of the matrix (one row of postings per term) so
+        # scoring only touches the terms that occur in the query
+        self.postings = postings if postings is not None else matrix.T.tocsr()
+        self.fields = fields or {}
+        self.field_postings = field_postings or {
+            name: field.T.tocsr() for name, field in self.fields.items()
+        }
+        self.stop_words = frozenset(stop_words)
+        self.version = version
+        self.min_n, self.max_n = VECTORIZER_PARAMS['ngram_range']
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    # Copy of this index over different description and field matrices,
+    # sharing the vocabulary and IDF weights (used for incremental updates)
+    def with_matrix(self, matrix, version, fields=None):
+        return ClubIndex(
+            self.terms, self.idf, matrix, self.stop_words, version,
+            fields=fields if fields is not None else self.fields, term_keys=self.term_keys,
+        )
+
+    # Copy without the club matrices: enough to count the terms of texts,
+    # and cheap to send to worker processes
+    def counter(self):
+        return self.with_matrix(sparse.csr_matrix((0, len(self.idf))), self.version, fields={})
+
+    # (matrix, postings, boost) of every searched field, description first.
+    # Fields boosted to 0 are left out.
+    def weighted_fields(self):
+        fields = [(self.matrix, self.postings, FIELD_BOOSTS.get('description', 1.0))]
+        fields.extend(
+            (field, self.field_postings[name], FIELD_BOOSTS.get(name, 0.0))
+            for name, field in self.fields.items()
+        )
+        return [field for field in fields if field[2]]
+
+    # Fit the vocabulary and IDF weights on the descriptions, then index
+    # the other fields (name -> texts aligned with descriptions) with them
+    @classmethod
+    def build(cls, descriptions, version, fields=None):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        matrix = vectorizer.fit_transform(descriptions).tocsr()
+        # Feature names come out sorted, matching their column order
+        terms = vectorizer.get_feature_names_out().tolist()
+        idf = vectorizer.idf_
+        stop_words = vectorizer.get_stop_words() or ()
+        fields = {name: texts for name, texts in (fields or {}).items() if any(texts)}
+        if fields:
+            terms, idf, matrix = _extend_vocabulary(
+                vectorizer.build_analyzer(), terms, idf, matrix, descriptions, fields
+            )
+        index = cls(StringTable.from_strings(terms), idf, matrix, stop_words, version)
+        print(f"Built index {version}: {matrix.shape[0]} clubs, {len(terms)} terms")
+        return index.with_matrix(
+            matrix, version, {name: index.transform_many(texts) for name, texts in fields.items()}
+        )
+
+    # Arrays and metadata to store this index in an artifact
+    def to_arrays(self):
+        arrays = dict(
+            self.terms.to_arrays('terms'),
+            **self.term_keys.to_arrays('term_keys'),
+            idf=self.idf,
+            **csr_arrays(self.matrix, 'matrix'),
+            **csr_arrays(self.postings, 'postings'),
+        )
+        for name, field in self.fields.items():
+            arrays.update(csr_arrays(field, f"field_{name}_matrix"))
+            arrays.update(csr_arrays(self.field_postings[name], f"field_{name}_postings"))
+        meta = {
+            'version': self.version,
+            'shape': list(self.matrix.shape),
+            'stop_words': sorted(self.stop_words),
+            'fields': list(self.fields),
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        n_clubs, n_terms = meta['shape']
+        return cls(
+            StringTable.from_arrays(arrays, 'terms'),
+            arrays['idf'],
+            csr_from_arrays(arrays, 'matrix', (n_clubs, n_terms)),
+            meta['stop_words'],
+            meta['version'],
+            postings=csr_from_arrays(arrays, 'postings', (n_terms, n_clubs)),
+            fields={
+                name: csr_from_arrays(arrays, f"field_{name}_matrix", (n_clubs, n_terms))
+                for name in meta['fields']
+            },
+            field_postings={
+                name: csr_from_arrays(arrays, f"field_{name}_postings", (n_terms, n_clubs))
+                for name in meta['fields']
+            },
+            term_keys=KeyIndex.from_arrays(arrays, 'term_keys'),
+        )
+
+    # Column of a term, or None if it is not in the vocabulary
+    def lookup(self, term):
+        return self.term_keys.find(self.terms, term)
+
+    # Lowercased tokens of a text, without stop words
+    def tokens(self, text):
+        return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in self.stop_words]
+
+    # Mirrors TfidfVectorizer's word analyzer: lowercase, tokenize, drop
+    # stop words, then emit n-grams over the remaining tokens
+    def analyze(self, text):
+        return self.grams(self.tokens(text))
+
+    def grams(self, tokens):
+        grams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), min(self.max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                grams.append(' '.join(tokens[i:i + n]))
+        return grams
+
+    # Sorted (column, count) pairs of the in-vocabulary n-grams of a query.
+    # Two queries with equal term counts vectorize identically, whatever
+    # their case, spacing, stop words or unknown words.
+    def term_counts(self, text):
+        return self.count_terms(self.tokens(text))
+
+    # term_counts() of already tokenized text
+    def count_terms(self, tokens):
+        counts = {}
+        for gram in self.grams(tokens):
+            col = self.lookup(gram)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        return tuple(sorted(counts.items()))
+
+    # Build an n_queries x n_terms matrix of L2-normalized TF-IDF rows from
+    # term_counts() results
+    def vectorize(self, term_counts_list):
+        indptr = np.zeros(len(term_counts_list) + 1, dtype=np.int32)
+        indptr[1:] = np.cumsum([len(counts) for counts in term_counts_list])
+        cols = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1], dtype=np.float64)
+        for row, counts in enumerate(term_counts_list):
+            if not counts:
+                continue
+            start, end = indptr[row], indptr[row + 1]
+            row_cols, row_counts = zip(*counts)
+            cols[start:end] = row_cols
+            weights = np.array(row_counts, dtype=np.float64) * self.idf[cols[start:end]]
+            data[start:end] = weights / np.linalg.norm(weights)
+        return sparse.csr_matrix((data, cols, indptr), shape=(len(term_counts_list), len(self.idf)))
+
+    # Build an n_texts x n_terms matrix of raw counts from term_counts()
+    # results
+    def count_matrix(self, term_counts_list):
+        indptr = np.zeros(len(term_counts_list) + 1, dtype=np.int32)
+        indptr[1:] = np.cumsum([len(counts) for counts in term_counts_list])
+        cols = np.array(
+            [col for counts in term_counts_list for col, _ in counts], dtype=np.int32
+        )
+        data = np.array(
+            [count for counts in term_counts_list for _, count in counts], dtype=np.float64
+        )
+        return sparse.csr_matrix((data, cols, indptr), shape=(len(term_counts_list), len(self.idf)))
+
+    # n_texts x n_terms matrix of raw term counts of a sequence of texts,
+    # counted in chunks by a pool of `workers` processes (in this process
+    # when workers is 1), stacked in order
+    def count_texts(self, texts, workers=1):
+        chunks = (
+            [texts[row] for row in range(start, min(start + COUNT_CHUNK_SIZE, len(texts)))]
+            for start in range(0, len(texts), COUNT_CHUNK_SIZE)
+        )
+        counter = self.counter()
+        if workers <= 1 or len(texts) <= COUNT_CHUNK_SIZE:
+            parts = [_count_chunk(chunk, counter) for chunk in chunks]
+        else:
+            parts = []
+            context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+            with context.Pool(workers, initializer=_init_counter, initargs=(counter,)) as pool:
+                # At most two chunks per worker in flight bounds memory
+                pending = deque()
+                for chunk in chunks:
+                    if len(pending) >= workers * 2:
+                        parts.append(pending.popleft().get())
+                    pending.append(pool.apply_async(_count_chunk, (chunk,)))
+                parts.extend(result.get() for result in pending)
+        if not parts:
+            return sparse.csr_matrix((0, len(self.idf)))
+        return sparse.vstack(parts, format='csr')
+
+    # Vectorize a query into a 1 x n_terms L2-normalized TF-IDF row
+    def transform(self, text):
+        return self.vectorize([self.term_counts(text)])
+
+    # Vectorize several queries, or club descriptions being added to an
+    # existing index, into one n_texts x n_terms matrix
+    def transform_many(self, texts):
+        return self.vectorize([self.term_counts(text) for text in texts])
+
+
+# Index of a count_texts worker process, set by _init_counter
+_counter = None
+
+
+def _init_counter(counter):
+    global _counter
+    _counter = counter
+
+
+def _count_chunk(texts, counter=None):
+    if counter is None:
+        counter = _counter
+    return counter.count_matrix([counter.term_counts(text) for text in texts])
+
+
+# Offline build: python club_index.py [orgs sports ...] [--workers N]
+def main(argv=None):
+    # Deferred: these modules import this one
+    from catalog import Catalog
+    from corpora import SOURCES, get_source
+
+    parser = argparse.ArgumentParser(description='Build club search index artifacts')
+    parser.add_argument('sources', nargs='*', help='source names (default: all)')
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='processes counting terms (default: one per CPU)',
+    )
+    args = parser.parse_args(argv)
+
+    for name in args.sources or [source.name for source in SOURCES]:
+        try:
+            source = get_source(name)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Wrote {Catalog.build(source, workers=max(1, args.workers)).save()}")
+
+
+if __name__ == '__main__':
+    main()
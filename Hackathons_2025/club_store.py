@@ -0,0 +1,148 @@
+from array import array
+
+import numpy as np
+
+from artifacts import StringTable, StringTableBuilder
+
+# Fields of the common club record (see adapters), by how they are stored:
+# free text in a StringTable per field ('' for none), and fields with few
+# distinct values interned as codes into a table of those values
+TEXT_FIELDS = ('name', 'description', 'email', 'instagram')
+INTERNED_FIELDS = ('division', 'source')
+
+ID_DTYPE = np.int64
+CODE_DTYPE = np.int16
+
+
+class ClubTable:
+    # Common club records stored column-wise rather than as one dict (or
+    # JSON string) per club: ids as one int64 array (or a StringTable for
+    # sources whose ids are strings), each text field as a StringTable, and
+    # division and source as int16 codes into a sorted table of their
+    # distinct values (-1 for none). A memory-mapped table costs no Python
+    # objects; a record dict is only rebuilt when a row is read.
+    def __init__(self, ids, texts, codes, values):
+        self.ids = ids
+        self.texts = texts
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.ids)
+
+    # The common club record of a row
+    def __getitem__(self, row):
+        record = {'id': self.club_id(row)}
+        for field in TEXT_FIELDS:
+            record[field] = self.texts[field][row] or None
+        for field in INTERNED_FIELDS:
+            code = int(self.codes[field][row])
+            record[field] = self.values[field][code] if code >= 0 else None
+        return record
+
+    def club_id(self, row):
+        club_id = self.ids[row]
+        return club_id if isinstance(club_id, str) else int(club_id)
+
+    # Every club id, in row order
+    def club_ids(self):
+        return list(self.ids) if isinstance(self.ids, StringTable) else self.ids.tolist()
+
+    # Values of one field in row order, '' for none
+    def column(self, field):
+        if field in TEXT_FIELDS:
+            return self.texts[field]
+        values = list(self.values[field]) + ['']
+        return [values[code] for code in self.codes[field]]
+
+    @classmethod
+    def from_records(cls, records):
+        builder = ClubTableBuilder()
+        for record in records:
+            builder.append(record)
+        return builder.build()
+
+    def to_arrays(self, prefix='club'):
+        if isinstance(self.ids, StringTable):
+            arrays = self.ids.to_arrays(f"{prefix}_ids")
+        else:
+            arrays = {f"{prefix}_ids": self.ids}
+        for field in TEXT_FIELDS:
+            arrays.update(self.texts[field].to_arrays(f"{prefix}_{field}"))
+        for field in INTERNED_FIELDS:
+            arrays[f"{prefix}_{field}_codes"] = self.codes[field]
+            arrays.update(self.values[field].to_arrays(f"{prefix}_{field}_values"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='club'):
+        if f"{prefix}_ids" in arrays:
+            ids = arrays[f"{prefix}_ids"]
+        else:
+            ids = StringTable.from_arrays(arrays, f"{prefix}_ids")
+        return cls(
+            ids,
+            {field: StringTable.from_arrays(arrays, f"{prefix}_{field}") for field in TEXT_FIELDS},
+            {field: arrays[f"{prefix}_{field}_codes"] for field in INTERNED_FIELDS},
+            {
+                field: StringTable.from_arrays(arrays, f"{prefix}_{field}_values")
+                for field in INTERNED_FIELDS
+            },
+        )
+
+
+class ClubTableBuilder:
+    # Builds a ClubTable one normalized record at a time (see
+    # club_data.normalize_club). Every id must be unique, and all integers
+    # or all strings.
+    def __init__(self):
+        self._int_ids = array('q')
+        self._str_ids = StringTableBuilder()
+        self._seen = set()
+        self._texts = {field: StringTableBuilder() for field in TEXT_FIELDS}
+        self._codes = {field: array('h') for field in INTERNED_FIELDS}
+        self._interned = {field: {} for field in INTERNED_FIELDS}
+
+    def __len__(self):
+        return len(self._seen)
+
+    def append(self, record):
+        club_id = record['id']
+        ids = self._str_ids if isinstance(club_id, str) else self._int_ids
+        if len(ids) != len(self):
+            raise ValueError(f"id {club_id!r} is not of the same type as the other ids")
+        if club_id in self._seen:
+            raise ValueError(f"duplicate id {club_id!r}")
+        for field in INTERNED_FIELDS:
+            value = record.get(field)
+            interned = self._interned[field]
+            if value is not None and value not in interned:
+                if len(interned) > np.iinfo(CODE_DTYPE).max:
+                    raise ValueError(f"too many distinct {field} values")
+                interned[value] = len(interned)
+        self._seen.add(club_id)
+        ids.append(club_id)
+        for field in TEXT_FIELDS:
+            self._texts[field].append(record.get(field) or '')
+        for field in INTERNED_FIELDS:
+            value = record.get(field)
+            self._codes[field].append(self._interned[field][value] if value is not None else -1)
+
+    def build(self):
+        if len(self._str_ids):
+            ids = self._str_ids.build()
+        else:
+            ids = np.array(self._int_ids, dtype=ID_DTYPE)
+        codes = {}
+        values = {}
+        for field in INTERNED_FIELDS:
+            # Sorted values, so equal data gives equal codes
+            interned = sorted(self._interned[field])
+            position = {value: code for code, value in enumerate(interned)}
+            remap = np.array(
+                [position[value] for value in self._interned[field]] + [-1], dtype=CODE_DTYPE
+            )
+            codes[field] = remap[np.array(self._codes[field], dtype=np.int64)]
+            values[field] = StringTable.from_strings(interned)
+        texts = {field: builder.build() for field, builder in self._texts.items()}
+        return ClubTable(ids, texts, codes, values)
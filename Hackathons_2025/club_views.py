@@ -0,0 +1,115 @@
+import html
+import re
+from collections import namedtuple
+
+from lru import LRUCache
+from tagging import decode_tags, get_tagger
+
+# Display-ready record of one club, built by ViewTable the first time the
+# club is shown and then reused, so rendering a result is a lookup.
+# Namedtuples are immutable and carry no per-instance dict.
+ClubView = namedtuple('ClubView', [
+    'source',
+    'id',
+    'name',
+    'name_html',
+    'description',
+    'description_html',
+    'email',
+    'instagram_handle',
+    'instagram_link',
+    'category',
+    'division',
+    'icon',
+    'image',
+    'activities',
+    'skills',
+])
+
+_INSTAGRAM_HANDLE = re.compile(r'instagram\.com/([A-Za-z0-9._]+)', re.IGNORECASE)
+_EMAIL = re.compile(r'^[^@\s<>"\']+@[^@\s<>"\']+$')
+
+
+# Handle and profile link from an Instagram URL, or ('N/A', '#')
+def clean_instagram(url):
+    match = _INSTAGRAM_HANDLE.search(url or '')
+    if not match:
+        return 'N/A', '#'
+    handle = match.group(1)
+    return f"@{handle}", f"https://www.instagram.com/{handle}"
+
+
+# First usable address from a string or list of strings, or 'N/A'
+def clean_email(email):
+    if isinstance(email, list):
+        email = email[0] if email else None
+    if not isinstance(email, str):
+        return 'N/A'
+    email = email.strip('[]<> ')
+    return email if _EMAIL.match(email) else 'N/A'
+
+
+def build_club_view(item, tag_mask, category_index):
+    name = item['name']
+    description = item['description']
+    instagram_handle, instagram_link = clean_instagram(item.get('instagram'))
+    category = get_tagger().category_info(int(category_index))
+    activities, skills = decode_tags(int(tag_mask))
+    return ClubView(
+        source=item.get('source'),
+        id=item.get('id'),
+        name=name,
+        name_html=html.escape(name),
+        description=description,
+        description_html=html.escape(description),
+        email=clean_email(item.get('email')),
+        instagram_handle=instagram_handle,
+        instagram_link=instagram_link,
+        category=category['name'],
+        division=item.get('division'),
+        icon=category['icon'],
+        image=category['image'],
+        activities=activities,
+        skills=skills,
+    )
+
+
+# JSON-ready dict for API responses; missing contact fields become None
+def view_to_dict(view, score=None):
+    result = {
+        'source': view.source,
+        'id': view.id,
+        'name': view.name,
+        'category': view.category,
+        'division': view.division,
+        'activities': list(view.activities),
+        'skills': list(view.skills),
+        'email': None if view.email == 'N/A' else view.email,
+        'instagram': None if view.instagram_link == '#' else view.instagram_link,
+    }
+    if score is not None:
+        result['score'] = round(score, 6)
+    return result
+
+
+class ViewTable:
+    # Read-only sequence of views over club records (e.g. a memory-mapped
+    # ClubTable). A view is only built when a row is first shown, and a
+    # bounded number are kept, so a worker holds Python objects for the
+    # clubs it actually serves rather than for the whole catalog.
+    def __init__(self, clubs, tag_bits, categories, cache_size=2048):
+        self.clubs = clubs
+        self.tag_bits = tag_bits
+        self.categories = categories
+        self._cache = LRUCache(maxsize=cache_size)
+
+    def __len__(self):
+        return len(self.clubs)
+
+    def __getitem__(self, row):
+        row = int(row)
+        view = self._cache.get(row)
+        if view is None:
+            view = build_club_view(self.clubs[row], self.tag_bits[row], self.categories[row])
+            self._cache.put(row, view)
+        return view
@@ -0,0 +1,97 @@
+import heapq
+import os
+import threading
+import time
+from collections import namedtuple
+from itertools import islice
+
+from adapters import adapt_org, adapt_sport
+from reloader import ClubReloader
+
+# A club data file and the adapter that maps its records to the common
+# club record
+CorpusSource = namedtuple('CorpusSource', ['name', 'file_path', 'adapter'])
+
+SOURCES = [
+    CorpusSource('orgs', 'HOTH XII Orgs.json', adapt_org),
+    CorpusSource('sports', 'UCLA Club Sports.json', adapt_sport),
+]
+
+
+# Load sources in a background thread so a new worker accepts requests
+# (and answers health checks) immediately instead of after the load
+BACKGROUND_LOAD = os.environ.get('CLUB_BACKGROUND_LOAD', '0') == '1'
+
+
+def get_source(name):
+    for source in SOURCES:
+        if source.name == name:
+            return source
+    raise ValueError(f"Unknown source: {name}")
+
+
+class Corpora:
+    # One reloader (and so one catalog and index) per source, so each
+    # source is loaded, reloaded and rebuilt independently
+    def __init__(self, sources=SOURCES):
+        self.reloaders = {source.name: ClubReloader(source) for source in sources}
+        # Set once the startup load has finished, whatever its outcome
+        self.loaded = threading.Event()
+
+    # Load every source; True if at least one could be loaded
+    def load(self):
+        started = time.perf_counter()
+        try:
+            ok = any([reloader.load() for reloader in self.reloaders.values()])
+        finally:
+            self.loaded.set()
+        if not ok:
+            print("Warning: No clubs were loaded. Please check the file path and contents.")
+        print(f"Loaded club sources in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return ok
+
+    def load_in_background(self):
+        thread = threading.Thread(target=self.load, name='club-loader', daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        for reloader in self.reloaders.values():
+            reloader.start()
+
+    # Loaded catalogs to search, optionally restricted to some sources
+    def catalogs(self, sources=None):
+        names = sources or list(self.reloaders)
+        for name in names:
+            if name not in self.reloaders:
+                raise ValueError(f"Unknown source: {name}")
+        catalogs = [self.reloaders[name].current for name in names]
+        return [catalog for catalog in catalogs if catalog is not None]
+
+    # Ready to serve once the startup load is done and at least one
+    # source's catalog is resident and warmed
+    @property
+    def ready(self):
+        return self.loaded.is_set() and bool(self.catalogs())
+
+    # Readiness and per-source load details for health checks
+    def status(self):
+        sources = {}
+        for name, reloader in self.reloaders.items():
+            catalog = reloader.current
+            sources[name] = {
+                'loaded': catalog is not None,
+                'version': catalog.version if catalog is not None else None,
+                'clubs': len(catalog) if catalog is not None else 0,
+                'load_ms': reloader.load_ms,
+                'warm_ms': reloader.warm_ms,
+            }
+        return {'ready': self.ready, 'sources': sources}
+
+
+# Merge per-source (view, score) lists, each already sorted by descending
+# score, into one global page. Every list must hold at least its source's
+# leading offset + top_k hits for the page to be exact.
+def merge_ranked(result_lists, top_k, offset=0):
+    merged = heapq.merge(*result_lists, key=lambda result: -result[1])
+    return tuple(islice(merged, offset, offset + top_k))
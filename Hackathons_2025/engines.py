@@ -0,0 +1,138 @@
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from fusion import FUSION_DEPTHS, FUSION_METHOD, FUSION_WEIGHTS, fuse
+from metrics import observe_stage
+from scoring import Hits, score_rows, search, search_batch, select_top_k
+
+# A retrieval engine ranks a catalog for queries given as term counts
+# (ClubIndex.term_counts) and returns scoring.Hits: `search` takes one
+# query, `search_batch` a list of them. Both take top_k, min_score, offset
+# and allowed like scoring.search, plus an optional fusion.LatencyBudget.
+# `score_rows` gives a query's exact scores for some club rows, so ranked
+# lists from several engines can be re-scored on their union.
+Engine = namedtuple('Engine', ['name', 'search', 'search_batch', 'score_rows'])
+
+_NO_ROWS = np.empty(0, dtype=np.int32)
+_NO_SCORES = np.empty(0, dtype=np.float64)
+
+
+# TF-IDF rows of queries given as term counts, timed as a stage
+def _vectorize(catalog, term_counts_list):
+    started = time.perf_counter()
+    rows = catalog.index.vectorize(term_counts_list)
+    observe_stage('vectorize', started)
+    return rows
+
+
+# Cosine similarity of L2-normalized TF-IDF vectors, summed over the
+# boosted fields
+def _tfidf_search(catalog, term_counts, budget=None, **options):
+    return search(catalog.index, _vectorize(catalog, [term_counts]), **options)
+
+
+def _tfidf_search_batch(catalog, term_counts_list, budget=None, **options):
+    return search_batch(catalog.index, _vectorize(catalog, term_counts_list), **options)
+
+
+def _tfidf_score_rows(catalog, term_counts, rows):
+    return score_rows(catalog.index, _vectorize(catalog, [term_counts]), rows)
+
+
+# Okapi BM25 over the inverted index, with MaxScore early termination
+def _bm25_search(catalog, term_counts, budget=None, **options):
+    return catalog.bm25.search(term_counts, **options)
+
+
+def _bm25_search_batch(catalog, term_counts_list, budget=None, **options):
+    return [catalog.bm25.search(term_counts, **options) for term_counts in term_counts_list]
+
+
+def _bm25_score_rows(catalog, term_counts, rows):
+    return catalog.bm25.score_rows(term_counts, rows)
+
+
+# Cosine similarity in latent semantic space, via the inverted-file ANN
+# index; finds clubs that share no word with the query
+def _semantic_search(catalog, term_counts, budget=None, **options):
+    return catalog.semantic.search(_vectorize(catalog, [term_counts]), **options)
+
+
+def _semantic_search_batch(catalog, term_counts_list, budget=None, **options):
+    rows = _vectorize(catalog, term_counts_list)
+    return [catalog.semantic.search(rows[row], **options) for row in range(rows.shape[0])]
+
+
+def _semantic_score_rows(catalog, term_counts, rows):
+    return catalog.semantic.score_rows(_vectorize(catalog, [term_counts]), rows)
+
+
+# Hybrid ranking: each engine of FUSION_DEPTHS contributes its leading
+# candidates, the union is re-scored exactly by every engine that ran, and
+# the scores are fused (fusion.fuse). Only the union is scored, never the
+# whole catalog. The first engine always runs; later ones are skipped,
+# and recorded in the budget, once the request's latency budget is spent.
+def _hybrid_search(catalog, term_counts, top_k=5, min_score=0.0, offset=0, allowed=None,
+                   budget=None):
+    page_end = offset + top_k
+    ran = []
+    rows = []
+    for name, depth in FUSION_DEPTHS.items():
+        if ran and budget is not None and budget.expired():
+            budget.skip(name)
+            continue
+        hits = ENGINES[name].search(catalog, term_counts, top_k=max(depth, page_end), allowed=allowed)
+        ran.append(name)
+        rows.append(hits.rows)
+
+    candidates = np.unique(np.concatenate(rows))
+    if not len(candidates):
+        return Hits(_NO_ROWS, _NO_SCORES, 0)
+    columns = np.column_stack([
+        ENGINES[name].score_rows(catalog, term_counts, candidates) for name in ran
+    ])
+    weights = [FUSION_WEIGHTS.get(name, 1.0) for name in ran]
+    fused = fuse(candidates, columns, FUSION_METHOD, weights)
+    return select_top_k(candidates, fused, top_k=top_k, min_score=min_score, offset=offset)
+
+
+def _hybrid_search_batch(catalog, term_counts_list, budget=None, **options):
+    return [
+        _hybrid_search(catalog, term_counts, budget=budget, **options)
+        for term_counts in term_counts_list
+    ]
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in [
+        Engine('tfidf', _tfidf_search, _tfidf_search_batch, _tfidf_score_rows),
+        Engine('bm25', _bm25_search, _bm25_search_batch, _bm25_score_rows),
+        Engine('semantic', _semantic_search, _semantic_search_batch, _semantic_score_rows),
+        Engine('hybrid', _hybrid_search, _hybrid_search_batch, None),
+    ]
+}
+
+# Largest page of results a request may ask for
+MAX_TOP_K = 100
+
+# Engine used when a request does not name one
+DEFAULT_ENGINE = os.environ.get('CLUB_SEARCH_ENGINE', 'tfidf')
+if DEFAULT_ENGINE not in ENGINES:
+    raise ValueError(
+        f"CLUB_SEARCH_ENGINE must be one of {', '.join(ENGINES)}, not {DEFAULT_ENGINE!r}"
+    )
+if not FUSION_DEPTHS or not all(
+    name in ENGINES and ENGINES[name].score_rows is not None for name in FUSION_DEPTHS
+):
+    raise ValueError("CLUB_FUSION_DEPTHS must list engines among tfidf, bm25 and semantic")
+
+
+def get_engine(name=None):
+    engine = ENGINES.get(name or DEFAULT_ENGINE)
+    if engine is None:
+        raise ValueError(f"Unknown engine: {name}")
+    return engine
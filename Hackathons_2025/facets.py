@@ -0,0 +1,189 @@
+import numpy as np
+
+from club_views import clean_email, clean_instagram
+from scoring import score_fields
+from tagging import TAG_DTYPE, get_tagger, require_tags
+
+# Contact details a club may have, one bit each in its flags
+FLAGS = ('email', 'instagram')
+FLAG_DTYPE = np.uint8
+
+# Facets a filter can test
+FACETS = ('category', 'tag', 'has', 'division', 'source')
+
+MAX_FILTER_DEPTH = 8
+
+
+class FacetColumns:
+    # Per-club facet columns that the catalog does not already keep: a
+    # bitmask of the contact details a club has. Tags and categories are
+    # the catalog's tag bits and category indexes, and divisions are read
+    # from the club table's interned codes, so no facet is stored twice.
+    def __init__(self, flags):
+        self.flags = flags
+
+    def __len__(self):
+        return len(self.flags)
+
+    # Columns of the clubs of a ClubTable
+    @classmethod
+    def build(cls, clubs):
+        flags = np.zeros(len(clubs), dtype=FLAG_DTYPE)
+        flags |= np.array(
+            [clean_email(email) != 'N/A' for email in clubs.column('email')], dtype=FLAG_DTYPE
+        )
+        flags |= np.array(
+            [clean_instagram(url)[1] != '#' for url in clubs.column('instagram')], dtype=FLAG_DTYPE
+        ) << 1
+        return cls(flags)
+
+    def to_arrays(self, prefix='facet'):
+        return {f"{prefix}_flags": self.flags}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='facet'):
+        return cls(arrays[f"{prefix}_flags"])
+
+
+# Check a filter expression before it is run: a facet test such as
+# {"category": "engineering"}, {"tag": ["Hackathons", "Research"]} (any of
+# the values), {"has": "instagram"}, {"division": "Coed"} or
+# {"source": "sports"}, or {"and": [...]}, {"or": [...]} or {"not": {...}}
+# over other expressions
+def validate_filter(expr, depth=0):
+    if depth > MAX_FILTER_DEPTH:
+        raise ValueError(f"filter is nested more than {MAX_FILTER_DEPTH} levels deep")
+    if not isinstance(expr, dict) or len(expr) != 1:
+        raise ValueError("each filter must be an object with a single key")
+    (key, value), = expr.items()
+    if key in ('and', 'or'):
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"'{key}' takes a non-empty list of filters")
+        for item in value:
+            validate_filter(item, depth + 1)
+    elif key == 'not':
+        validate_filter(value, depth + 1)
+    elif key in FACETS:
+        values = value if isinstance(value, list) else [value]
+        if not values or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"'{key}' takes a string or a list of strings")
+        tagger = get_tagger()
+        for v in values:
+            if key == 'tag':
+                tagger.label_mask(v)
+            elif key == 'category' and v.lower() not in _category_codes(tagger):
+                raise ValueError(f"Unknown category: {v}")
+            elif key == 'has' and v not in FLAGS:
+                raise ValueError(f"'has' takes one of {', '.join(FLAGS)}")
+    else:
+        raise ValueError(f"Unknown filter: {key}")
+
+
+def _category_codes(tagger):
+    codes = {category['name'].lower(): i for i, category in enumerate(tagger.categories)}
+    codes[tagger.default_category['name'].lower()] = -1
+    return codes
+
+
+# Boolean row mask of a catalog's clubs matching a validated filter
+# expression, computed column-wise
+def filter_mask(catalog, expr):
+    (key, value), = expr.items()
+    n = len(catalog)
+    if key == 'and':
+        mask = np.ones(n, dtype=bool)
+        for item in value:
+            mask &= filter_mask(catalog, item)
+        return mask
+    if key == 'or':
+        mask = np.zeros(n, dtype=bool)
+        for item in value:
+            mask |= filter_mask(catalog, item)
+        return mask
+    if key == 'not':
+        return ~filter_mask(catalog, value)
+
+    values = value if isinstance(value, list) else [value]
+    tagger = get_tagger()
+    facets = catalog.facets
+    if key == 'source':
+        return np.full(n, catalog.name in values)
+    if key == 'tag':
+        bits = 0
+        for v in values:
+            bits |= tagger.label_mask(v)
+        return (catalog.tag_bits & TAG_DTYPE(bits)) != 0
+    if key == 'category':
+        codes = _category_codes(tagger)
+        return np.isin(catalog.categories, [codes[v.lower()] for v in values])
+    if key == 'has':
+        bits = 0
+        for v in values:
+            bits |= 1 << FLAGS.index(v)
+        return (facets.flags & FLAG_DTYPE(bits)) != 0
+    divisions = catalog.clubs.values['division']
+    codes = [code for code, division in enumerate(divisions) if division in values]
+    return np.isin(catalog.clubs.codes['division'], codes)
+
+
+# Boolean row mask of the clubs carrying every required tag and passing
+# the filter expression, or None when nothing is excluded
+def allowed_rows(catalog, required_tags=(), filters=None):
+    allowed = require_tags(catalog.tag_bits, required_tags) if required_tags else None
+    if filters:
+        mask = filter_mask(catalog, filters)
+        allowed = mask if allowed is None else allowed & mask
+    return allowed
+
+
+# Rows of every club a query matches: the filtered clubs with a posting
+# for one of its terms in any indexed field, and a field-weighted TF-IDF
+# score above min_score. The set does not depend on the ranking engine or
+# on the page size, so neither do the facet counts taken from it.
+def matching_rows(catalog, term_counts, min_score=0.0, allowed=None):
+    index = catalog.index
+    candidates, scores = score_fields(index, index.vectorize([term_counts]))
+    rows = candidates[scores > min_score]
+    if allowed is not None:
+        rows = rows[allowed[rows]]
+    return rows
+
+
+# Add the facet values of some clubs to counts, a dict of
+# {facet: {value: clubs}} shared across sources. Every count is one
+# vectorized reduction over the rows' columns.
+def add_facet_counts(counts, catalog, rows):
+    tagger = get_tagger()
+    facets = catalog.facets
+
+    def add(facet, value, count):
+        if count:
+            values = counts.setdefault(facet, {})
+            values[value] = values.get(value, 0) + int(count)
+
+    add('source', catalog.name, len(rows))
+    categories = np.bincount(catalog.categories[rows] + 1, minlength=len(tagger.categories) + 1)
+    add('category', tagger.default_category['name'], categories[0])
+    for i, category in enumerate(tagger.categories):
+        add('category', category['name'], categories[i + 1])
+    tag_bits = catalog.tag_bits[rows]
+    for label in dict.fromkeys(label for _, label in tagger.tags):
+        add('tag', label, np.count_nonzero(tag_bits & TAG_DTYPE(tagger.label_mask(label))))
+    flags = facets.flags[rows]
+    for bit, flag in enumerate(FLAGS):
+        add('has', flag, np.count_nonzero(flags & FLAG_DTYPE(1 << bit)))
+    division_values = catalog.clubs.values['division']
+    divisions = np.bincount(
+        catalog.clubs.codes['division'][rows] + 1, minlength=len(division_values) + 1
+    )
+    for i, division in enumerate(division_values):
+        add('division', division, divisions[i + 1])
+
+
+# Add the facet counts of one source (from add_facet_counts) to counts
+# shared across sources
+def merge_facet_counts(counts, source_counts):
+    for facet, values in source_counts.items():
+        merged = counts.setdefault(facet, {})
+        for value, count in values.items():
+            merged[value] = merged.get(value, 0) + count
@@ -0,0 +1,86 @@
+import os
+import time
+
+import numpy as np
+
+# Reciprocal rank fusion constant: a club ranked r-th by an engine gets
+# weight / (RRF_K + r)
+RRF_K = 60
+
+FUSION_METHODS = ('rrf', 'weighted')
+
+
+# Parse "name:value,name:value" settings
+def parse_settings(value, convert):
+    settings = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, setting = item.partition(':')
+        settings[name.strip()] = convert(setting)
+    return settings
+
+
+# How the hybrid engine combines the others: the fusion method, the
+# engines it draws candidates from with the number of candidates each
+# contributes (in the order they run), and per-engine weights (default 1)
+FUSION_METHOD = os.environ.get('CLUB_FUSION_METHOD', 'rrf')
+FUSION_DEPTHS = parse_settings(os.environ.get('CLUB_FUSION_DEPTHS', 'bm25:50,semantic:50'), int)
+FUSION_WEIGHTS = parse_settings(os.environ.get('CLUB_FUSION_WEIGHTS', ''), float)
+
+# Milliseconds a ranking request may take (per query for batches)
+LATENCY_BUDGET_MS = float(os.environ.get('CLUB_LATENCY_BUDGET_MS', '50'))
+
+if FUSION_METHOD not in FUSION_METHODS:
+    raise ValueError(f"CLUB_FUSION_METHOD must be one of {', '.join(FUSION_METHODS)}")
+
+
+class LatencyBudget:
+    # Time allowance of one request, started when it is created. Stages
+    # check expired() before optional work and record what they skipped.
+    # `clock` returns seconds (time.perf_counter unless a test steps it).
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS, clock=time.perf_counter):
+        self.budget_ms = budget_ms
+        self.clock = clock
+        self.started = clock()
+        self.skipped = []
+
+    def elapsed_ms(self):
+        return (self.clock() - self.started) * 1000
+
+    def expired(self):
+        return self.elapsed_ms() >= self.budget_ms
+
+    def skip(self, stage):
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def report(self):
+        elapsed = self.elapsed_ms()
+        return {
+            'budget_ms': self.budget_ms,
+            'elapsed_ms': round(elapsed, 3),
+            'within_budget': elapsed <= self.budget_ms,
+            'skipped': list(self.skipped),
+        }
+
+
+# Fuse per-engine scores of the same candidates (one column per engine)
+# into one score per candidate. 'rrf' sums weight / (RRF_K + rank) over
+# the engines that scored a candidate above zero, ranking by descending
+# score with ties broken by row; 'weighted' sums each engine's scores
+# scaled to its best candidate, so engines with different score ranges
+# blend evenly.
+def fuse(candidates, columns, method=FUSION_METHOD, weights=None):
+    n_engines = columns.shape[1]
+    weights = np.ones(n_engines) if weights is None else np.asarray(weights, dtype=np.float64)
+    fused = np.zeros(len(candidates), dtype=np.float64)
+    for j in range(n_engines):
+        scores = columns[:, j]
+        if method == 'rrf':
+            ranks = np.empty(len(candidates), dtype=np.float64)
+            ranks[np.lexsort((candidates, -scores))] = np.arange(1, len(candidates) + 1)
+            fused += np.where(scores > 0, weights[j] / (RRF_K + ranks), 0.0)
+        else:
+            top = scores.max() if len(scores) else 0.0
+            if top > 0:
+                fused += weights[j] * np.maximum(scores, 0) / top
+    return fused
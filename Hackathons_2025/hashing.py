@@ -0,0 +1,132 @@
+import numpy as np
+from scipy import sparse
+
+from artifacts import csr_arrays, csr_from_arrays, string_key
+from club_index import HASH_FEATURES, VECTORIZER_PARAMS, ClubIndex
+
+
+# L2-normalized TF-IDF rows of a raw count matrix; columns weighted 0 are
+# dropped. The counts are left as they are (eliminate_zeros() works in
+# place, so the rows get their own index arrays).
+def _tfidf(counts, idf):
+    weighted = sparse.csr_matrix(
+        (counts.data * idf[counts.indices], counts.indices.copy(), counts.indptr.copy()),
+        shape=counts.shape,
+    )
+    weighted.eliminate_zeros()
+    norms = np.sqrt(np.bincount(
+        np.repeat(np.arange(weighted.shape[0]), np.diff(weighted.indptr)),
+        weights=weighted.data ** 2, minlength=weighted.shape[0],
+    ))
+    norms[norms == 0] = 1
+    weighted.data /= np.repeat(norms, np.diff(weighted.indptr))
+    return weighted
+
+
+class HashingIndex(ClubIndex):
+    # TF-IDF index over a fixed number of hashed feature columns instead of
+    # a fitted vocabulary: an n-gram's column is its 64-bit string key
+    # modulo n_features, so no vocabulary is built, stored or looked up,
+    # and the per-column arrays (IDF weights, posting offsets, the latent
+    # projection) have a size set by configuration rather than by the
+    # corpus. IDF weights are per column (n-grams that share a column share
+    # it), with the same smoothed formula and max_df cut-off as the fitted
+    # vocabulary: a column used by too many descriptions weighs 0 and is
+    # ignored, like a dropped term. There are no vocabulary words to
+    # correct queries to or suggest, so spelling correction and term
+    # suggestions are off for a hashed index.
+    def __init__(self, n_features, idf, matrix, stop_words, version, postings=None, fields=None,
+                 field_postings=None):
+        self.n_features = n_features
+        super().__init__(
+            None, idf, matrix, stop_words, version, postings=postings, fields=fields,
+            field_postings=field_postings,
+        )
+
+    def with_matrix(self, matrix, version, fields=None):
+        return HashingIndex(
+            self.n_features, self.idf, matrix, self.stop_words, version,
+            fields=fields if fields is not None else self.fields,
+        )
+
+    # Count the descriptions and other fields (name -> texts aligned with
+    # descriptions) into hashed columns with a pool of `workers` processes,
+    # then weight them with IDF computed over the columns. A column no
+    # description uses gets its IDF from the clubs whose fields use it.
+    # Returns (index, raw description counts), so the counts can be reused
+    # (for BM25) instead of counting every description again.
+    @classmethod
+    def build(cls, descriptions, version, fields=None, n_features=HASH_FEATURES, workers=1):
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+        # Every column counts until the IDF weights are known
+        counter = cls(
+            n_features, np.ones(n_features), sparse.csr_matrix((0, n_features)), ENGLISH_STOP_WORDS,
+            version,
+        )
+        counts = counter.count_texts(descriptions, workers)
+        fields = {name: texts for name, texts in (fields or {}).items() if any(texts)}
+        field_counts = {name: counter.count_texts(texts, workers) for name, texts in fields.items()}
+
+        n_clubs = counts.shape[0]
+        doc_freq = np.bincount(counts.indices, minlength=n_features)
+        field_freq = np.zeros(n_features, dtype=np.int64)
+        if field_counts:
+            field_freq = np.bincount(sum(field_counts.values()).indices, minlength=n_features)
+        df = np.where(doc_freq > 0, doc_freq, field_freq)
+        idf = np.log((1 + n_clubs) / (1 + df)) + 1
+        idf[doc_freq > VECTORIZER_PARAMS['max_df'] * n_clubs] = 0
+
+        index = cls(
+            n_features, idf, _tfidf(counts, idf), ENGLISH_STOP_WORDS, version,
+            fields={name: _tfidf(field, idf) for name, field in field_counts.items()},
+        )
+        # Drop the columns weighted 0, as counting with the index would
+        counts.data[idf[counts.indices] == 0] = 0
+        counts.eliminate_zeros()
+        print(f"Built hashed index {version}: {n_clubs} clubs, {n_features} columns, "
+              f"{np.count_nonzero(doc_freq)} used")
+        return index, counts
+
+    def to_arrays(self):
+        arrays = dict(
+            idf=self.idf,
+            **csr_arrays(self.matrix, 'matrix'),
+            **csr_arrays(self.postings, 'postings'),
+        )
+        for name, field in self.fields.items():
+            arrays.update(csr_arrays(field, f"field_{name}_matrix"))
+            arrays.update(csr_arrays(self.field_postings[name], f"field_{name}_postings"))
+        meta = {
+            'version': self.version,
+            'shape': list(self.matrix.shape),
+            'stop_words': sorted(self.stop_words),
+            'fields': list(self.fields),
+            'hash_features': self.n_features,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        n_clubs, n_features = meta['shape']
+        return cls(
+            n_features,
+            arrays['idf'],
+            csr_from_arrays(arrays, 'matrix', (n_clubs, n_features)),
+            meta['stop_words'],
+            meta['version'],
+            postings=csr_from_arrays(arrays, 'postings', (n_features, n_clubs)),
+            fields={
+                name: csr_from_arrays(arrays, f"field_{name}_matrix", (n_clubs, n_features))
+                for name in meta['fields']
+            },
+            field_postings={
+                name: csr_from_arrays(arrays, f"field_{name}_postings", (n_features, n_clubs))
+                for name in meta['fields']
+            },
+        )
+
+    # Column of an n-gram, or None if its column is weighted 0
+    def lookup(self, term):
+        col = string_key(term) % self.n_features
+        return col if self.idf[col] else None
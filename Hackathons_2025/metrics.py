@@ -0,0 +1,172 @@
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# Share of requests run under cProfile (0 disables profiling), and the
+# duration above which a profiled request's profile is printed
+PROFILE_SAMPLE = float(os.environ.get('CLUB_PROFILE_SAMPLE', '0'))
+PROFILE_SLOW_MS = float(os.environ.get('CLUB_PROFILE_SLOW_MS', '100'))
+PROFILE_LINES = 25
+
+
+class Histogram:
+    # Latency histogram with one label, in the Prometheus text format.
+    # Observing is a bisection and two additions under a lock; buckets are
+    # only made cumulative when the metrics are rendered.
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        # label value -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                series = self._series[value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((value, list(counts), total) for value, (counts, total) in self._series.items())
+        for value, counts, total in series:
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+# Time spent per hot-path stage of a ranking request. `search` is a whole
+# engine call, so it includes the `vectorize` and `select` stages it runs.
+STAGE_SECONDS = Histogram(
+    'club_stage_seconds', 'Time spent in each stage of a ranking request.', 'stage'
+)
+
+REQUEST_SECONDS = Histogram(
+    'club_request_seconds', 'Time to answer a request, including streaming the body.', 'endpoint'
+)
+
+
+# Record a stage that started at `started` (a time.perf_counter() value)
+def observe_stage(stage, started):
+    STAGE_SECONDS.observe(stage, time.perf_counter() - started)
+
+
+# Yield from a generator, recording the time spent producing its items
+# (not the time the consumer spends between them) as a stage
+def timed_iter(stage, items):
+    spent = 0.0
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            spent += time.perf_counter() - started
+        yield item
+    STAGE_SECONDS.observe(stage, spent)
+
+
+# A cProfile profiler for a sampled request, or None
+def start_profile():
+    if PROFILE_SAMPLE <= 0 or random.random() >= PROFILE_SAMPLE:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this process
+        return None
+    return profiler
+
+
+# Stop a request's profiler and print its profile if the request was slow
+def finish_profile(profiler, elapsed_ms, description):
+    profiler.disable()
+    if elapsed_ms < PROFILE_SLOW_MS:
+        return
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    print(f"Slow request ({elapsed_ms:.1f} ms): {description}\n{out.getvalue()}")
+
+
+def _metric(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+
+# Every metric in the Prometheus text exposition format: stage and
+# request histograms, cache counters (caches: name -> LRUCache), and the
+# size and reload counters of each source (corpora: Corpora)
+def render_metrics(corpora, caches):
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    for key, kind, help_text in (
+        ('hits', 'counter', 'Cache lookups that found an entry.'),
+        ('misses', 'counter', 'Cache lookups that found no entry.'),
+        ('evictions', 'counter', 'Entries evicted to stay within the cache size.'),
+        ('expirations', 'counter', 'Entries dropped after their time to live.'),
+        ('size', 'gauge', 'Entries in the cache.'),
+    ):
+        name = f"club_cache_{key}_total" if kind == 'counter' else f"club_cache_{key}"
+        _metric(lines, name, kind, help_text, [
+            ({'cache': cache}, cache_stats[key]) for cache, cache_stats in stats.items()
+        ])
+
+    reloaders = corpora.reloaders.items()
+    catalogs = [(name, reloader.current) for name, reloader in reloaders]
+    loaded = [(name, catalog) for name, catalog in catalogs if catalog is not None]
+    _metric(lines, 'club_index_clubs', 'gauge', 'Clubs in the served catalog.', [
+        ({'source': name}, len(catalog)) for name, catalog in loaded
+    ])
+    _metric(lines, 'club_index_terms', 'gauge', 'Terms in the served vocabulary.', [
+        ({'source': name}, len(catalog.index.terms)) for name, catalog in loaded
+        if catalog.index.terms is not None
+    ])
+    _metric(lines, 'club_index_columns', 'gauge', 'Feature columns of the served index.', [
+        ({'source': name}, len(catalog.index.idf)) for name, catalog in loaded
+    ])
+    _metric(lines, 'club_index_info', 'gauge', 'Data version of the served catalog.', [
+        ({'source': name, 'version': catalog.version}, 1) for name, catalog in loaded
+    ])
+    _metric(lines, 'club_reloads_total', 'counter', 'Catalogs swapped in (loads and reloads).', [
+        ({'source': name}, reloader.reloads) for name, reloader in reloaders
+    ])
+    _metric(lines, 'club_failed_reloads_total', 'counter', 'Loads and reloads that failed.', [
+        ({'source': name}, reloader.failed_reloads) for name, reloader in reloaders
+    ])
+    _metric(lines, 'club_load_seconds', 'gauge', 'Duration of the last load.', [
+        ({'source': name}, reloader.load_ms / 1000) for name, reloader in reloaders
+        if reloader.load_ms is not None
+    ])
+    _metric(lines, 'club_warm_seconds', 'gauge', 'Duration of the last warm-up.', [
+        ({'source': name}, reloader.warm_ms / 1000) for name, reloader in reloaders
+        if reloader.warm_ms is not None
+    ])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,133 @@
+import numpy as np
+
+# Neighbors kept per club
+SIMILAR_K = 20
+
+# Dense scores held per block while building: each sparse product scores
+# as many clubs against the whole catalog as fit in this many scores
+SIMILAR_BLOCK_SCORES = 1 << 22
+
+NEIGHBOR_DTYPE = np.int32
+SCORE_DTYPE = np.float32
+
+
+# Leading k (neighbor, score) pairs of each row of a dense score block, by
+# descending score with ties broken by neighbor; slots without a positive
+# score hold neighbor -1. Only the k leading columns of each row (found by
+# argpartition) are sorted. Scores are ranked at their stored precision,
+# so a list updated from stored scores ranks like a rebuilt one.
+def _top_k(neighbors, scores, k):
+    scores = scores.astype(SCORE_DTYPE, copy=False)
+    if scores.shape[1] > k:
+        leading = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        # argpartition keeps any of the clubs tied at the k-th score; rows
+        # where it left some out take the lowest neighbors among them, so
+        # the result does not depend on the candidates' order
+        last = np.take_along_axis(scores, leading, axis=1).min(axis=1)
+        kept = (np.take_along_axis(scores, leading, axis=1) == last[:, None]).sum(axis=1)
+        tied = (scores == last[:, None]).sum(axis=1)
+        for row in np.flatnonzero((tied > kept) & (last > 0)):
+            above = np.flatnonzero(scores[row] > last[row])
+            ties = np.flatnonzero(scores[row] == last[row])
+            ties = ties[np.argsort(neighbors[row, ties], kind='stable')]
+            leading[row] = np.concatenate([above, ties[:k - len(above)]])
+        neighbors = np.take_along_axis(neighbors, leading, axis=1)
+        scores = np.take_along_axis(scores, leading, axis=1)
+    order = np.lexsort((neighbors, -scores), axis=-1)
+    top_neighbors = np.take_along_axis(neighbors, order, axis=1)
+    top_scores = np.take_along_axis(scores, order, axis=1)
+    empty = top_scores <= 0
+    top_neighbors[empty] = -1
+    top_scores[empty] = 0
+    width = top_neighbors.shape[1]
+    if width < k:
+        top_neighbors = np.pad(top_neighbors, ((0, 0), (0, k - width)), constant_values=-1)
+        top_scores = np.pad(top_scores, ((0, 0), (0, k - width)))
+    return top_neighbors.astype(NEIGHBOR_DTYPE), top_scores
+
+
+# Neighbor lists of the given rows of a normalized TF-IDF matrix, scored
+# against every row in blocks of sparse products
+def _neighbors_of(matrix, rows, k):
+    neighbors = np.empty((len(rows), k), dtype=NEIGHBOR_DTYPE)
+    scores = np.empty((len(rows), k), dtype=SCORE_DTYPE)
+    all_rows = np.arange(matrix.shape[0])
+    block_rows = max(1, SIMILAR_BLOCK_SCORES // max(1, matrix.shape[0]))
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        block_scores = (matrix[block] @ matrix.T).toarray()
+        # A club is not its own neighbor
+        block_scores[np.arange(len(block)), block] = 0
+        candidates = np.broadcast_to(all_rows, block_scores.shape)
+        neighbors[start:start + len(block)], scores[start:start + len(block)] = _top_k(
+            candidates, block_scores, k
+        )
+    return neighbors, scores
+
+
+class NeighborGraph:
+    # k-nearest-neighbor graph of a catalog's clubs by cosine similarity of
+    # their TF-IDF rows, as fixed-width n_clubs x k arrays of neighbor rows
+    # and scores (best first, padded with -1). Built once with the index,
+    # so a "similar clubs" lookup reads one row and scores nothing.
+    def __init__(self, neighbors, scores):
+        self.neighbors = neighbors
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    @classmethod
+    def build(cls, matrix, k=SIMILAR_K):
+        rows = np.arange(matrix.shape[0])
+        return cls(*_neighbors_of(matrix, rows, k))
+
+    # Graph of a changed catalog. order maps each new row to its old row,
+    # or to -1 for clubs that were added or replaced; matrix is the new
+    # TF-IDF matrix, whose unchanged rows are identical to the old ones.
+    # Changed clubs, and clubs that had a changed or removed club among
+    # their neighbors, get their lists recomputed; every other list keeps
+    # its neighbors (renumbered) and only competes with the changed clubs,
+    # which is exact because unchanged clubs still score the same.
+    def with_changes(self, matrix, order):
+        k = self.neighbors.shape[1]
+        n = matrix.shape[0]
+        new_row = np.full(len(self.neighbors) + 1, -1, dtype=np.int64)
+        kept = np.flatnonzero(order >= 0)
+        new_row[order[kept]] = kept
+        # Old neighbor lists renumbered; -1 padding maps to the last slot,
+        # which stays -1
+        old_lists = self.neighbors[order[kept]]
+        renumbered = new_row[old_lists]
+        lost = ((old_lists >= 0) & (renumbered < 0)).any(axis=1)
+
+        changed = np.flatnonzero(order < 0)
+        dirty = np.concatenate([changed, kept[lost]])
+        clean = kept[~lost]
+        neighbors = np.empty((n, k), dtype=NEIGHBOR_DTYPE)
+        scores = np.empty((n, k), dtype=SCORE_DTYPE)
+        neighbors[dirty], scores[dirty] = _neighbors_of(matrix, dirty, k)
+
+        old_scores = self.scores[order[clean]]
+        if len(changed):
+            changed_scores = (matrix[clean] @ matrix[changed].T).toarray()
+            candidates = np.hstack([renumbered[~lost], np.broadcast_to(changed, changed_scores.shape)])
+            candidate_scores = np.hstack([old_scores, changed_scores])
+            neighbors[clean], scores[clean] = _top_k(candidates, candidate_scores, k)
+        else:
+            neighbors[clean], scores[clean] = renumbered[~lost], old_scores
+        return NeighborGraph(neighbors, scores)
+
+    def to_arrays(self, prefix='knn'):
+        return {f"{prefix}_neighbors": self.neighbors, f"{prefix}_scores": self.scores}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='knn'):
+        return cls(arrays[f"{prefix}_neighbors"], arrays[f"{prefix}_scores"])
+
+    # Up to top_k (row, score) pairs of the clubs most similar to a row
+    def similar(self, row, top_k=SIMILAR_K):
+        neighbors = self.neighbors[row, :top_k]
+        scores = self.scores[row, :top_k]
+        found = neighbors >= 0
+        return [(int(n), float(s)) for n, s in zip(neighbors[found], scores[found])]
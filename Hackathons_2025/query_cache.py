@@ -0,0 +1,28 @@
+import json
+
+from lru import LRUCache
+
+RESULT_CACHE_SIZE = 4096
+RESULT_CACHE_TTL = 15 * 60
+
+# Ranked results (and facet counts) per normalized query, shared by
+# /submit and the JSON API
+result_cache = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+
+# Cache key for a ranking request. The query is reduced to its
+# in-vocabulary term counts, so "Coding", " coding " and "coding the"
+# share an entry; the index version keeps entries from outliving the data
+# they were ranked against, and each engine's rankings are kept apart.
+# Filter expressions are keyed by their canonical JSON. Faceted rankings
+# also hold their facet counts, so they are kept apart from plain ones.
+def result_key(index, engine_name, term_counts, top_k, offset, min_score, required_tags,
+               filters=None, facets=False):
+    tags = tuple(sorted({tag.lower() for tag in required_tags}))
+    filters = json.dumps(filters, sort_keys=True) if filters else None
+    return (index.version, engine_name, term_counts, top_k, offset, min_score, tags, filters, facets)
+
+
+# Drop every cached result, e.g. after the club data is reloaded
+def invalidate():
+    result_cache.clear()
@@ -1,878 +1,471 @@
-from flask import Flask, request, jsonify
+import re
+import time
+
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import json
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import os
+
+from catalog import query_tokens
+from club_views import view_to_dict
+from corpora import BACKGROUND_LOAD, Corpora, merge_ranked
+from engines import MAX_TOP_K, get_engine
+from facets import (
+    add_facet_counts, allowed_rows, matching_rows, merge_facet_counts, validate_filter
+)
+from fusion import LatencyBudget
+from metrics import (
+    REQUEST_SECONDS, finish_profile, observe_stage, render_metrics, start_profile, timed_iter
+)
+from neighbors import SIMILAR_K
+from query_cache import result_cache, result_key
+from rendering import STATIC_MAX_AGE, card_cache, render_home, render_message, stream_results
+from suggest import (
+    MAX_SUGGEST_LIMIT, SUGGEST_LIMIT, SUGGEST_MAX_AGE, normalize, suggest_cache
+)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+
+MAX_BATCH_QUERIES = 5000
+
+print(f"Imported app modules in {(time.perf_counter() - _import_started) * 1000:.0f} ms")
+
+# Time every request until its body has been sent, and run a sample of
+# requests under the profiler (CLUB_PROFILE_SAMPLE), printing the profile
+# of those slower than CLUB_PROFILE_SLOW_MS
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profiler = start_profile()
+
+@app.after_request
+def finish_request_timer(response):
+    started = g.request_started
+    profiler = g.profiler
+    endpoint = request.endpoint or 'unknown'
+    description = f"{request.method} {request.path}"
+
+    def finish():
+        elapsed = time.perf_counter() - started
+        REQUEST_SECONDS.observe(endpoint, elapsed)
+        if profiler is not None:
+            finish_profile(profiler, elapsed * 1000, description)
+
+    response.call_on_close(finish)
+    return response
 
 # Add a test route
 @app.route('/', methods=['GET'])
 def home():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Sleuth - Find Your Future</title>
-        <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-        <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-        <style>
-            * { 
-                margin: 0; 
-                padding: 0; 
-                box-sizing: border-box; 
-                font-family: 'Inter', sans-serif;
-                scroll-behavior: smooth;
-            }
-            
-            body { 
-                min-height: 100vh;
-                background: linear-gradient(135deg, #2774AE 0%, #FFD100 100%);
-            }
-            
-            section {
-                min-height: 100vh;
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: center;
-                padding: 40px 20px;
-                position: relative;
-            }
-            
-            .hero {
-                text-align: center;
-                position: relative;
-            }
-            
-            .scroll-indicator {
-                position: absolute;
-                bottom: 40px;
-                left: 50%;
-                transform: translateX(-50%);
-                color: white;
-                font-size: 2em;
-                animation: bounce 2s infinite;
-                cursor: pointer;
-                text-decoration: none;
-            }
-            
-            @keyframes bounce {
-                0%, 20%, 50%, 80%, 100% {
-                    transform: translateY(0) translateX(-50%);
-                }
-                40% {
-                    transform: translateY(-30px) translateX(-50%);
-                }
-                60% {
-                    transform: translateY(-15px) translateX(-50%);
-                }
-            }
-            
-            .container {
-                background: rgba(255, 255, 255, 0.95);
-                padding: 40px;
-                border-radius: 20px;
-                box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-                width: 90%;
-                max-width: 600px;
-                text-align: center;
-                backdrop-filter: blur(10px);
-                border: 2px solid rgba(255, 255, 255, 0.1);
-            }
-            
-            .features {
-                background: rgba(39, 116, 174, 0.1);
-                backdrop-filter: blur(10px);
-            }
-            
-            .features-container {
-                max-width: 1200px;
-                width: 100%;
-                display: grid;
-                grid-template-columns: repeat(3, 1fr);
-                gap: 30px;
-                padding: 0 20px;
-            }
-            
-            .feature-card {
-                background: rgba(255, 255, 255, 0.95);
-                padding: 30px;
-                border-radius: 20px;
-                text-align: center;
-                transition: transform 0.3s ease;
-            }
-            
-            .feature-card:hover {
-                transform: translateY(-10px);
-            }
-            
-            .feature-icon {
-                font-size: 3em;
-                color: #2774AE;
-                margin-bottom: 20px;
-            }
-            
-            .feature-title {
-                color: #2774AE;
-                font-size: 1.5em;
-                margin-bottom: 15px;
-                font-weight: 600;
-            }
-            
-            .feature-description {
-                color: #4a5568;
-                line-height: 1.6;
-            }
-            
-            h1 { 
-                color: #2774AE;
-                font-size: 3.5em;
-                margin-bottom: 10px;
-                font-weight: 700;
-            }
-            
-            .motto {
-                color: #2774AE;
-                font-size: 1.8em;
-                margin-bottom: 30px;
-                font-weight: 500;
-            }
-            
-            .form-container { 
-                margin-bottom: 20px;
-            }
-            
-            input[type="text"] { 
-                width: 100%;
-                padding: 15px 20px;
-                margin-bottom: 20px;
-                border: 2px solid #e2e8f0;
-                border-radius: 10px;
-                font-size: 1em;
-                transition: all 0.3s ease;
-                font-family: 'Inter', sans-serif;
-            }
-            
-            input[type="text"]:focus {
-                outline: none;
-                border-color: #2774AE;
-                box-shadow: 0 0 0 3px rgba(39, 116, 174, 0.1);
-            }
-            
-            input[type="submit"] { 
-                background: linear-gradient(135deg, #2774AE 0%, #1e5b8c 100%);
-                color: white;
-                border: none;
-                padding: 15px 30px;
-                border-radius: 10px;
-                font-size: 1.1em;
-                cursor: pointer;
-                transition: all 0.3s ease;
-                font-weight: 600;
-                width: 100%;
-            }
-            
-            input[type="submit"]:hover { 
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(39, 116, 174, 0.4);
-            }
-            
-            .description {
-                color: #4a5568;
-                margin-bottom: 30px;
-                font-size: 1.1em;
-                line-height: 1.6;
-            }
-            
-            .tagline {
-                color: white;
-                font-size: 2em;
-                font-weight: 600;
-                text-align: center;
-                margin: 40px 0;
-                text-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            
-            @media (max-width: 768px) {
-                .features-container {
-                    grid-template-columns: 1fr;
-                }
-                
-                .feature-card {
-                    margin-bottom: 20px;
-                }
-                
-                h1 {
-                    font-size: 2.5em;
-                }
-                
-                .motto {
-                    font-size: 1.4em;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <section class="hero">
-            <div class="container">
-                <h1>Sleuth</h1>
-                <p class="motto">Find Your Future</p>
-                <p class="description">
-                    Discover clubs that match your interests and passions. Tell us what you're looking for, 
-                    and we'll help you find the perfect UCLA clubs to join!
-                </p>
-                <div class="form-container">
-                    <form action="/submit" method="post">
-                        <input type="text" 
-                               name="query" 
-                               placeholder="Tell us a bit about your interests. Keep it short and sweet, and we'll help you focus on what matters most-- achieving your goals."
-                               required>
-                        <input type="submit" value="Find My Clubs">
-                    </form>
-                </div>
-            </div>
-            <a href="#features" class="scroll-indicator">
-                <i class="fas fa-chevron-down"></i>
-            </a>
-        </section>
-        
-        <section id="features" class="features">
-            <h2 class="tagline">Sleuth: Built for Students</h2>
-            <div class="features-container">
-                <div class="feature-card">
-                    <i class="fas fa-compass feature-icon"></i>
-                    <h3 class="feature-title">Smart Discovery</h3>
-                    <p class="feature-description">
-                        Our AI-powered system understands your interests and matches you with the perfect clubs.
-                    </p>
-                </div>
-                <div class="feature-card">
-                    <i class="fas fa-users feature-icon"></i>
-                    <h3 class="feature-title">Community Focus</h3>
-                    <p class="feature-description">
-                        Connect with like-minded peers and find your place in UCLA's vibrant community.
-                    </p>
-                </div>
-                <div class="feature-card">
-                    <i class="fas fa-rocket feature-icon"></i>
-                    <h3 class="feature-title">Future Ready</h3>
-                    <p class="feature-description">
-                        Develop skills, gain experience, and prepare for your future career through club involvement.
-                    </p>
-                </div>
-            </div>
-        </section>
-    </body>
-    </html>
-    '''
-
-# Load and process clubs
-def load_and_process_clubs(file_path):
-    try:
-        # Get absolute path
-        abs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_path)
-        print(f"Loading clubs from: {abs_path}")
-        
-        with open(abs_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        descriptions = []
-        valid_items = []
-        for item in data:
-            if "description" in item and item["description"]:
-                descriptions.append(item["description"].lower())
-                valid_items.append(item)
-        print(f"Successfully loaded {len(valid_items)} clubs")
-        return descriptions, valid_items
-    except Exception as e:
-        print(f"Error loading clubs: {str(e)}")
-        return [], []
-
-# Get recommendations for clubs
-def get_recommendations(descriptions, valid_items, user_query, top_k=5):
-    vectorizer = TfidfVectorizer(
-        stop_words='english',
-        max_df=0.7,
-        ngram_range=(1, 2)
+    return render_home()
+
+# Cache entry of one ranking: its (view, score) results and, for faceted
+# requests, the facet counts of every filtered club the query matches
+# (facets.matching_rows), whatever the engine pruned or the page size.
+def _ranking(catalog, hits, term_counts, min_score, allowed, faceted):
+    results = tuple((catalog.views[idx], float(score)) for idx, score in zip(hits.rows, hits.scores))
+    counts = None
+    if faceted:
+        started = time.perf_counter()
+        counts = {}
+        add_facet_counts(counts, catalog, matching_rows(catalog, term_counts, min_score, allowed))
+        observe_stage('facets', started)
+    return results, counts
+
+# Get recommendations for clubs from a query's (spell-corrected) tokens,
+# ranked by the named retrieval engine (or the configured default).
+# Rankings cut short by the latency budget are returned but not cached.
+# Facet counts of the clubs the query matches are added to the optional
+# facet_counts dict.
+def get_recommendations(catalog, tokens, top_k=5, min_score=0.0, offset=0, required_tags=(),
+                        engine=None, budget=None, filters=None, facet_counts=None):
+    engine = get_engine(engine)
+    index = catalog.index
+    faceted = facet_counts is not None
+    term_counts = index.count_terms(tokens)
+    key = result_key(
+        index, engine.name, term_counts, top_k, offset, min_score, required_tags, filters, faceted
     )
-    vectors = vectorizer.fit_transform(descriptions)
-    user_vector = vectorizer.transform([user_query.lower()])
-    
-    similarities = cosine_similarity(user_vector, vectors).flatten()
-    top_indices = np.argsort(similarities)[::-1]
-    
-    results = []
-    for idx in top_indices[0:top_k]:
-        if similarities[idx] > 0:
-            # Extract relevant activities and skills
-            desc = valid_items[idx]['description'].lower()
-            activities = []
-            skills = set()
-            
-            # Look for activities in description
-            if 'workshop' in desc:
-                activities.append('Workshops')
-            if 'project' in desc:
-                activities.append('Project Work')
-            if 'competition' in desc:
-                activities.append('Competitions')
-            if 'hackathon' in desc:
-                activities.append('Hackathons')
-            if 'research' in desc:
-                activities.append('Research')
-            if 'mentor' in desc:
-                activities.append('Mentorship')
-            if 'network' in desc:
-                activities.append('Networking')
-            
-            # Look for skills
-            if any(term in desc for term in ['program', 'coding', 'software']):
-                skills.add('Programming')
-            if 'data' in desc:
-                skills.add('Data Analysis')
-            if any(term in desc for term in ['ai', 'machine learning', 'artificial intelligence']):
-                skills.add('AI/ML')
-            if 'design' in desc:
-                skills.add('Design')
-            if 'leadership' in desc:
-                skills.add('Leadership')
-            if any(term in desc for term in ['team', 'collaboration']):
-                skills.add('Teamwork')
-            if 'research' in desc:
-                skills.add('Research')
-            if any(term in desc for term in ['pitch', 'present']):
-                skills.add('Presentation')
-            
-            results.append((valid_items[idx], float(similarities[idx]), activities, list(skills)))
+    ranking = result_cache.get(key)
+    if ranking is None:
+        # Restrict to clubs carrying all requested tags and passing the
+        # filter before ranking
+        started = time.perf_counter()
+        allowed = allowed_rows(catalog, required_tags, filters)
+        observe_stage('tagging', started)
+        started = time.perf_counter()
+        hits = engine.search(
+            catalog, term_counts, top_k=top_k, min_score=min_score, offset=offset, allowed=allowed,
+            budget=budget
+        )
+        observe_stage('search', started)
+        ranking = _ranking(catalog, hits, term_counts, min_score, allowed, faceted)
+        if budget is None or not budget.skipped:
+            result_cache.put(key, ranking)
+
+    results, counts = ranking
+    if faceted:
+        merge_facet_counts(facet_counts, counts)
     return results
 
-# Load clubs
-club_descriptions, clubs = load_and_process_clubs("HOTH XII Orgs.json")
-if not clubs:
-    print("Warning: No clubs were loaded. Please check the file path and contents.")
+# Get recommendations for many queries, given as token lists, at once.
+# Cached queries are answered directly; the rest are scored together as
+# one sparse product. facet_counts, if given, holds one dict per query.
+def get_batch_recommendations(catalog, query_tokens_list, top_k=5, min_score=0.0, offset=0,
+                              required_tags=(), engine=None, budget=None, filters=None,
+                              facet_counts=None):
+    engine = get_engine(engine)
+    index = catalog.index
+    faceted = facet_counts is not None
+    started = time.perf_counter()
+    allowed = allowed_rows(catalog, required_tags, filters)
+    observe_stage('tagging', started)
+    keys = []
+    pending = {}
+    rankings = []
+    for tokens in query_tokens_list:
+        term_counts = index.count_terms(tokens)
+        key = result_key(
+            index, engine.name, term_counts, top_k, offset, min_score, required_tags, filters,
+            faceted
+        )
+        ranking = result_cache.get(key) if key not in pending else None
+        if ranking is None and key not in pending:
+            pending[key] = term_counts
+        keys.append(key)
+        rankings.append(ranking)
+
+    if pending:
+        started = time.perf_counter()
+        batch_hits = engine.search_batch(
+            catalog, list(pending.values()),
+            top_k=top_k, min_score=min_score, offset=offset, allowed=allowed, budget=budget
+        )
+        observe_stage('search', started)
+        for (key, term_counts), hits in zip(pending.items(), batch_hits):
+            ranking = _ranking(catalog, hits, term_counts, min_score, allowed, faceted)
+            if budget is None or not budget.skipped:
+                result_cache.put(key, ranking)
+            pending[key] = ranking
+
+    batch_results = []
+    for i, (key, ranking) in enumerate(zip(keys, rankings)):
+        results, counts = ranking if ranking is not None else pending[key]
+        if faceted:
+            merge_facet_counts(facet_counts[i], counts)
+        batch_results.append(results)
+    return batch_results
+
+# Search several sources and merge them into one global ranking. Each
+# source is ranked (and cached) on its own for its leading offset + top_k
+# hits, which is all the merge needs for an exact page. Misspelled query
+# words are corrected once against every searched source and recorded in
+# the optional corrections dict ({typo: fix}).
+def recommend(catalogs, user_query, top_k=5, min_score=0.0, offset=0, required_tags=(),
+              engine=None, budget=None, corrections=None, filters=None, facet_counts=None):
+    started = time.perf_counter()
+    tokens, fixed = query_tokens(catalogs, user_query)
+    observe_stage('normalize', started)
+    if corrections is not None:
+        corrections.update(fixed)
+    per_source = [
+        get_recommendations(
+            catalog, tokens, top_k=offset + top_k, min_score=min_score,
+            required_tags=required_tags, engine=engine, budget=budget, filters=filters,
+            facet_counts=facet_counts
+        )
+        for catalog in catalogs
+    ]
+    return merge_ranked(per_source, top_k, offset)
+
+def recommend_batch(catalogs, user_queries, top_k=5, min_score=0.0, offset=0, required_tags=(),
+                    engine=None, budget=None, corrections=None, filters=None, facet_counts=None):
+    query_tokens_list = []
+    for i, user_query in enumerate(user_queries):
+        started = time.perf_counter()
+        tokens, fixed = query_tokens(catalogs, user_query)
+        observe_stage('normalize', started)
+        if corrections is not None:
+            corrections[i].update(fixed)
+        query_tokens_list.append(tokens)
+    per_source = [
+        get_batch_recommendations(
+            catalog, query_tokens_list, top_k=offset + top_k, min_score=min_score,
+            required_tags=required_tags, engine=engine, budget=budget, filters=filters,
+            facet_counts=facet_counts
+        )
+        for catalog in catalogs
+    ]
+    return [merge_ranked(result_lists, top_k, offset) for result_lists in zip(*per_source)]
+
+# Validate ranking options shared by the API endpoints
+def parse_recommend_options(payload):
+    top_k = payload.get('top_k', 5)
+    offset = payload.get('offset', 0)
+    min_score = payload.get('min_score', 0.0)
+    tags = payload.get('tags', [])
+    sources = payload.get('sources')
+    engine = payload.get('engine')
+    filters = payload.get('filter')
+    if not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be an integer between 1 and {MAX_TOP_K}")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("offset must be a non-negative integer")
+    if not isinstance(min_score, (int, float)):
+        raise ValueError("min_score must be a number")
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags must be a list of strings")
+    if sources is not None and (
+        not isinstance(sources, list) or not all(isinstance(source, str) for source in sources)
+    ):
+        raise ValueError("sources must be a list of strings")
+    if engine is not None and not isinstance(engine, str):
+        raise ValueError("engine must be a string")
+    if filters is not None:
+        validate_filter(filters)
+    options = {
+        'top_k': top_k,
+        'offset': offset,
+        'min_score': float(min_score),
+        'required_tags': tags,
+        'engine': get_engine(engine).name,
+        'filters': filters,
+    }
+    return options, sources
+
+# Load clubs from every source; reloaders keep them current while the app runs
+corpora = Corpora()
+if BACKGROUND_LOAD:
+    corpora.load_in_background()
+else:
+    corpora.load()
+corpora.start()
+print(f"App started in {(time.perf_counter() - _import_started) * 1000:.0f} ms")
 
 # Endpoint to handle form submissions
 @app.route('/submit', methods=['POST'])
 def submit():
     try:
+        budget = LatencyBudget()
         user_query = request.form.get('query', '')
-        print('Received query:', user_query)
-
-        if not clubs:
-            return '''
-            <html>
-                <head>
-                    <title>Error</title>
-                    <style>
-                        body { 
-                            font-family: 'Inter', sans-serif;
-                            display: flex;
-                            align-items: center;
-                            justify-content: center;
-                            min-height: 100vh;
-                            margin: 0;
-                            background: linear-gradient(135deg, #2774AE 0%, #FFD100 100%);
-                            padding: 20px;
-                        }
-                        .error-container {
-                            background: white;
-                            padding: 40px;
-                            border-radius: 20px;
-                            text-align: center;
-                            box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-                            max-width: 600px;
-                        }
-                        h1 { color: #2774AE; margin-bottom: 20px; }
-                        p { color: #4a5568; line-height: 1.6; margin-bottom: 20px; }
-                        a {
-                            display: inline-block;
-                            background: #2774AE;
-                            color: white;
-                            padding: 12px 24px;
-                            border-radius: 8px;
-                            text-decoration: none;
-                            transition: all 0.3s ease;
-                        }
-                        a:hover {
-                            transform: translateY(-2px);
-                            box-shadow: 0 5px 15px rgba(39, 116, 174, 0.4);
-                        }
-                    </style>
-                </head>
-                <body>
-                    <div class="error-container">
-                        <h1>Oops! Something went wrong</h1>
-                        <p>We couldn't load the club data. Please try again later.</p>
-                        <a href="/">Back to Home</a>
-                    </div>
-                </body>
-            </html>
-            '''
+        required_tags = request.form.getlist('tag')
+        sources = request.form.getlist('source')
+        engine = get_engine().name
+        print('Received query:', user_query, f"(engine: {engine})")
+
+        catalogs = corpora.catalogs(sources)
+        if not catalogs:
+            return render_message(
+                'Error',
+                'Oops! Something went wrong',
+                "We couldn't load the club data. Please try again later.",
+                'Back to Home',
+            )
 
         # Get recommendations
-        results = get_recommendations(club_descriptions, clubs, user_query, top_k=5)
+        results = recommend(
+            catalogs, user_query, top_k=5, required_tags=required_tags, engine=engine, budget=budget
+        )
+        print('Ranking latency:', budget.report())
         
         if not results:
-            return '''
-            <html>
-                <head>
-                    <title>No Results</title>
-                    <style>
-                        body { 
-                            font-family: 'Inter', sans-serif;
-                            display: flex;
-                            align-items: center;
-                            justify-content: center;
-                            min-height: 100vh;
-                            margin: 0;
-                            background: linear-gradient(135deg, #2774AE 0%, #FFD100 100%);
-                            padding: 20px;
-                        }
-                        .error-container {
-                            background: white;
-                            padding: 40px;
-                            border-radius: 20px;
-                            text-align: center;
-                            box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-                            max-width: 600px;
-                        }
-                        h1 { color: #2774AE; margin-bottom: 20px; }
-                        p { color: #4a5568; line-height: 1.6; margin-bottom: 20px; }
-                        a {
-                            display: inline-block;
-                            background: #2774AE;
-                            color: white;
-                            padding: 12px 24px;
-                            border-radius: 8px;
-                            text-decoration: none;
-                            transition: all 0.3s ease;
-                        }
-                        a:hover {
-                            transform: translateY(-2px);
-                            box-shadow: 0 5px 15px rgba(39, 116, 174, 0.4);
-                        }
-                    </style>
-                </head>
-                <body>
-                    <div class="error-container">
-                        <h1>No Matching Clubs Found</h1>
-                        <p>We couldn't find any clubs matching your interests. Try broadening your search or using different keywords.</p>
-                        <a href="/">Try Again</a>
-                    </div>
-                </body>
-            </html>
-            '''
-        
-        # Create HTML response
-        html_response = '''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Sleuth - Club Recommendations</title>
-            <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-            <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                * { 
-                    margin: 0; 
-                    padding: 0; 
-                    box-sizing: border-box;
-                    font-family: 'Inter', sans-serif;
-                }
-                
-                body { 
-                    background: linear-gradient(135deg, #2774AE 0%, #FFD100 100%);
-                    min-height: 100vh;
-                    padding: 40px 20px;
-                }
-                
-                .container {
-                    max-width: 1200px;
-                    margin: 0 auto;
-                }
-                
-                .back-button { 
-                    margin-bottom: 20px;
-                }
-                
-                .back-button a { 
-                    color: white;
-                    text-decoration: none;
-                    display: inline-flex;
-                    align-items: center;
-                    font-weight: 500;
-                    font-size: 1.1em;
-                    transition: all 0.3s ease;
-                    background: rgba(39, 116, 174, 0.2);
-                    padding: 10px 20px;
-                    border-radius: 8px;
-                    backdrop-filter: blur(5px);
-                }
-                
-                .back-button a:hover { 
-                    transform: translateX(-5px);
-                    background: rgba(39, 116, 174, 0.3);
-                }
-                
-                h1 { 
-                    text-align: center; 
-                    color: white;
-                    margin-bottom: 30px;
-                    font-size: 2.5em;
-                    font-weight: 700;
-                    text-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }
-                
-                .club { 
-                    background: rgba(255, 255, 255, 0.95);
-                    margin-bottom: 30px;
-                    padding: 30px;
-                    border-radius: 20px;
-                    position: relative;
-                    box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-                    backdrop-filter: blur(10px);
-                    border: 2px solid rgba(255, 255, 255, 0.1);
-                }
-                
-                .club h3 {
-                    color: #2774AE;
-                    font-size: 1.5em;
-                    margin-bottom: 15px;
-                    font-weight: 700;
-                }
-                
-                .club-content {
-                    display: grid;
-                    grid-template-columns: 200px 2fr 1fr;
-                    gap: 30px;
-                    align-items: start;
-                }
-                
-                .club-image {
-                    width: 200px;
-                    height: 200px;
-                    border-radius: 10px;
-                    overflow: hidden;
-                    position: relative;
-                    background-size: cover;
-                    background-position: center;
-                    margin-right: 20px;
-                    flex-shrink: 0;
-                }
-                
-                .club-image-overlay {
-                    position: absolute;
-                    top: 0;
-                    left: 0;
-                    right: 0;
-                    bottom: 0;
-                    background: rgba(39, 116, 174, 0.7);
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                    opacity: 0;
-                    transition: opacity 0.3s ease;
-                }
-                
-                .club-image:hover .club-image-overlay {
-                    opacity: 1;
-                }
-                
-                .club-image-overlay i {
-                    color: white;
-                    font-size: 3rem;
-                    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
-                }
-                
-                .club-main p {
-                    color: #4a5568;
-                    line-height: 1.6;
-                    margin-bottom: 20px;
-                    font-size: 1.1em;
-                }
-                
-                .contact {
-                    background: #f8fafc;
-                    padding: 20px;
-                    border-radius: 12px;
-                    margin-top: 20px;
-                    border: 1px solid #e2e8f0;
-                }
-                
-                .contact p { 
-                    margin: 10px 0;
-                    display: flex;
-                    align-items: center;
-                }
-                
-                .contact-label {
-                    color: #64748b;
-                    width: 100px;
-                    font-weight: 600;
-                }
-                
-                .contact a {
-                    color: #2774AE;
-                    text-decoration: none;
-                    transition: all 0.3s ease;
-                }
-                
-                .contact a:hover {
-                    color: #1e5b8c;
-                }
-                
-                .club-match {
-                    background: #f8fafc;
-                    padding: 25px;
-                    border-radius: 12px;
-                    border: 1px solid #e2e8f0;
-                }
-                
-                .match-title {
-                    font-weight: 700;
-                    margin-bottom: 20px;
-                    color: #2774AE;
-                    font-size: 1.2em;
-                }
-                
-                .match-section {
-                    margin-bottom: 25px;
-                }
-                
-                .match-section h4 {
-                    color: #4a5568;
-                    margin-bottom: 12px;
-                    font-weight: 600;
-                }
-                
-                .tag-list {
-                    display: flex;
-                    flex-wrap: wrap;
-                    gap: 8px;
-                }
-                
-                .tag {
-                    background: white;
-                    padding: 6px 12px;
-                    border-radius: 8px;
-                    font-size: 0.9em;
-                    color: #2774AE;
-                    font-weight: 500;
-                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.05);
-                    border: 1px solid #e2e8f0;
-                }
-                
-                @media (max-width: 1024px) {
-                    .club-content {
-                        grid-template-columns: 1fr 1fr;
-                    }
-                    
-                    .club-image {
-                        display: none;
-                    }
-                }
-                
-                @media (max-width: 768px) {
-                    .club-content {
-                        grid-template-columns: 1fr;
-                    }
-                    
-                    .club {
-                        padding: 20px;
-                    }
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="back-button">
-                    <a href="/">← Back to Search</a>
-                </div>
-                <h1>Recommended Clubs</h1>
-            '''
+            return render_message(
+                'No Results',
+                'No Matching Clubs Found',
+                "We couldn't find any clubs matching your interests. Try broadening your search or using different keywords.",
+                'Try Again',
+            )
         
-        # Add clubs to the response
-        for idx, (club, score, activities, skills) in enumerate(results, 1):
-            # Extract Instagram handle from URL
-            instagram = club.get('instagram', '')
-            if instagram and 'instagram.com/' in instagram.lower():
-                parts = instagram.split('instagram.com/')[1].split('?')[0].split('/')[0]
-                instagram_handle = f"@{parts}"
-                instagram_link = f"https://www.instagram.com/{parts}"
-            else:
-                instagram_handle = 'N/A'
-                instagram_link = '#'
-
-            # Clean email format
-            email = club.get('email', 'N/A')
-            if isinstance(email, list):
-                email = email[0] if email else 'N/A'
-            email = email.strip('[]<> ')
-
-            # Generate club image and add to response
-            club_text = (club['name'] + ' ' + club['description']).lower()
-            
-            # Map categories to icons and images
-            category_map = {
-                'engineering': {
-                    'icon': 'fa-microchip',
-                    'image': 'https://images.unsplash.com/photo-1517077304055-6e89abbf09b0'
-                },
-                'business': {
-                    'icon': 'fa-briefcase',
-                    'image': 'https://images.unsplash.com/photo-1454165804606-c3d57bc86b40'
-                },
-                'tech': {
-                    'icon': 'fa-laptop-code',
-                    'image': 'https://images.unsplash.com/photo-1517077304055-6e89abbf09b0'
-                },
-                'science': {
-                    'icon': 'fa-flask',
-                    'image': 'https://images.unsplash.com/photo-1532094349884-543bc11b234d'
-                },
-                'art': {
-                    'icon': 'fa-palette',
-                    'image': 'https://images.unsplash.com/photo-1452860606245-08befc0ff44b'
-                },
-                'music': {
-                    'icon': 'fa-music',
-                    'image': 'https://images.unsplash.com/photo-1511379938547-c1f69419868d'
-                },
-                'health': {
-                    'icon': 'fa-heart',
-                    'image': 'https://images.unsplash.com/photo-1505751172876-fa1923c5c528'
-                },
-                'culture': {
-                    'icon': 'fa-globe',
-                    'image': 'https://images.unsplash.com/photo-1523240795612-9a054b0db644'
-                },
-                'service': {
-                    'icon': 'fa-hands-helping',
-                    'image': 'https://images.unsplash.com/photo-1559027615-cd4628902d4a'
-                }
-            }
-            
-            # Find matching category and add club HTML
-            matched_category = None
-            for category, info in category_map.items():
-                if category in club_text:
-                    matched_category = info
-                    break
-            
-            if not matched_category:
-                matched_category = {
-                    'icon': 'fa-users',
-                    'image': 'https://images.unsplash.com/photo-1523580494863-6f3031224c94'
-                }
-
-            html_response += f'''
-            <div class="club">
-                <div class="club-content">
-                    <div class="club-image" style="background-image: url('{matched_category["image"]}?auto=format&fit=crop&w=400&q=80');">
-                        <div class="club-image-overlay">
-                            <i class="fas {matched_category["icon"]}"></i>
-                        </div>
-                    </div>
-                    <div class="club-main">
-                        <h3>{club['name']}</h3>
-                        <p>{club['description']}</p>
-                        <div class="contact">
-                            <p><strong>Contact & Links</strong></p>
-                            <p>
-                                <span class="contact-label">Email:</span>
-                                <a href="mailto:{email}">{email}</a>
-                            </p>
-                            <p>
-                                <span class="contact-label">Instagram:</span>
-                                <a href="{instagram_link}" target="_blank">{instagram_handle}</a>
-                            </p>
-                        </div>
-                    </div>
-                    <div class="club-match">
-                        <div class="match-title">Club Insights</div>
-                        
-                        <div class="match-section">
-                            <h4>Key Activities</h4>
-                            <div class="tag-list">
-                                {" ".join(f'<span class="tag">{activity}</span>' for activity in activities)}
-                            </div>
-                        </div>
-                        
-                        <div class="match-section">
-                            <h4>Skills You'll Gain</h4>
-                            <div class="tag-list">
-                                {" ".join(f'<span class="tag">{skill}</span>' for skill in skills)}
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            '''
-        
-        html_response += '''
-            </div>
-        </body>
-        </html>
-        '''
-        
-        return html_response
+        # Stream the results page card by card
+        return Response(
+            timed_iter('render', stream_results(results)), mimetype='text/html',
+            headers={'X-Search-Engine': engine}
+        )
         
     except Exception as e:
         print(f"Error in submit: {str(e)}")
-        return '''
-        <html>
-            <head>
-                <title>Error</title>
-                <style>
-                    body { 
-                        font-family: 'Inter', sans-serif;
-                        display: flex;
-                        align-items: center;
-                        justify-content: center;
-                        min-height: 100vh;
-                        margin: 0;
-                        background: linear-gradient(135deg, #2774AE 0%, #FFD100 100%);
-                        padding: 20px;
-                    }
-                    .error-container {
-                        background: white;
-                        padding: 40px;
-                        border-radius: 20px;
-                        text-align: center;
-                        box-shadow: 0 10px 30px rgba(0, 0, 0, 0.1);
-                        max-width: 600px;
-                    }
-                    h1 { color: #2774AE; margin-bottom: 20px; }
-                    p { color: #4a5568; line-height: 1.6; margin-bottom: 20px; }
-                    a {
-                        display: inline-block;
-                        background: #2774AE;
-                        color: white;
-                        padding: 12px 24px;
-                        border-radius: 8px;
-                        text-decoration: none;
-                        transition: all 0.3s ease;
-                    }
-                    a:hover {
-                        transform: translateY(-2px);
-                        box-shadow: 0 5px 15px rgba(39, 116, 174, 0.4);
-                    }
-                </style>
-            </head>
-            <body>
-                <div class="error-container">
-                    <h1>Oops! Something went wrong</h1>
-                    <p>An error occurred while processing your request. Please try again later.</p>
-                    <a href="/">Back to Home</a>
-                </div>
-            </body>
-        </html>
-        '''
+        return render_message(
+            'Error',
+            'Oops! Something went wrong',
+            'An error occurred while processing your request. Please try again later.',
+            'Back to Home',
+        )
+
+# JSON recommendations: {"query": "..."} for one query, or
+# {"queries": ["...", ...]} to score a batch in one pass
+@app.route('/api/recommend', methods=['POST'])
+def api_recommend():
+    budget = LatencyBudget()
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        options, sources = parse_recommend_options(payload)
+        catalogs = corpora.catalogs(sources)
+        if not catalogs:
+            return jsonify({'error': "Club data is not loaded"}), 503
+        versions = {catalog.name: catalog.version for catalog in catalogs}
+        want_facets = payload.get('facets', False)
+        if not isinstance(want_facets, bool):
+            raise ValueError("facets must be true or false")
+
+        if 'queries' in payload:
+            queries = payload['queries']
+            if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                raise ValueError("queries must be a list of strings")
+            if len(queries) > MAX_BATCH_QUERIES:
+                raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per request")
+            budget.budget_ms *= max(1, len(queries))
+            corrections = [{} for _ in queries]
+            facet_counts = [{} for _ in queries] if want_facets else None
+            batch = recommend_batch(
+                catalogs, queries, budget=budget, corrections=corrections,
+                facet_counts=facet_counts, **options
+            )
+            results = [
+                {
+                    'query': query,
+                    'corrections': fixed,
+                    'clubs': [view_to_dict(view, score) for view, score in ranked],
+                }
+                for query, fixed, ranked in zip(queries, corrections, batch)
+            ]
+            if want_facets:
+                for result, counts in zip(results, facet_counts):
+                    result['facets'] = counts
+            return jsonify({
+                'versions': versions,
+                'engine': options['engine'],
+                'latency': budget.report(),
+                'results': results,
+            })
+
+        query = payload.get('query')
+        if not isinstance(query, str):
+            raise ValueError("query must be a string")
+        corrections = {}
+        facet_counts = {} if want_facets else None
+        results = recommend(
+            catalogs, query, budget=budget, corrections=corrections, facet_counts=facet_counts,
+            **options
+        )
+        response = {
+            'versions': versions,
+            'engine': options['engine'],
+            'latency': budget.report(),
+            'query': query,
+            'corrections': corrections,
+            'clubs': [view_to_dict(view, score) for view, score in results],
+        }
+        if want_facets:
+            response['facets'] = facet_counts
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# Clubs most similar to one club, read from its source's precomputed
+# neighbor graph. Ids are looked up in every source (or the `source`
+# parameters) and the first source that has the club answers.
+@app.route('/api/clubs/<club_id>/similar', methods=['GET'])
+def api_similar(club_id):
+    try:
+        top_k = int(request.args.get('top_k', 5))
+        if not 1 <= top_k <= SIMILAR_K:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f"top_k must be an integer between 1 and {SIMILAR_K}"}), 400
+    try:
+        catalogs = corpora.catalogs(request.args.getlist('source'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not catalogs:
+        return jsonify({'error': "Club data is not loaded"}), 503
+
+    # Ids are numbers in most sources
+    keys = [int(club_id), club_id] if re.fullmatch(r'-?[0-9]+', club_id) else [club_id]
+    for catalog in catalogs:
+        row = next((catalog.rows_by_id[key] for key in keys if key in catalog.rows_by_id), None)
+        if row is None:
+            continue
+        return jsonify({
+            'version': catalog.version,
+            'club': view_to_dict(catalog.views[row]),
+            'similar': [
+                view_to_dict(catalog.views[neighbor], score)
+                for neighbor, score in catalog.neighbors.similar(row, top_k)
+            ],
+        })
+    return jsonify({'error': f"Unknown club: {club_id}"}), 404
+
+# Autocomplete for the search box: club names with a word starting with
+# `prefix`, and popular vocabulary terms starting with it, from every
+# source (or the `source` parameters). Responses are cached per data
+# version and may be reused by the browser for SUGGEST_MAX_AGE seconds.
+@app.route('/api/suggest', methods=['GET'])
+def api_suggest():
+    prefix = normalize(request.args.get('prefix', ''))
+    try:
+        limit = int(request.args.get('limit', SUGGEST_LIMIT))
+        if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f"limit must be an integer between 1 and {MAX_SUGGEST_LIMIT}"}), 400
+    try:
+        catalogs = corpora.catalogs(request.args.getlist('source'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not catalogs:
+        return jsonify({'error': "Club data is not loaded"}), 503
+
+    versions = tuple((catalog.name, catalog.version) for catalog in catalogs)
+    key = (versions, prefix, limit)
+    body = suggest_cache.get(key)
+    if body is None:
+        body = {'prefix': prefix, 'clubs': [], 'terms': []}
+        if prefix:
+            clubs = []
+            term_df = {}
+            for catalog in catalogs:
+                for row in catalog.suggester.club_rows(prefix, limit):
+                    view = catalog.views[row]
+                    clubs.append({'source': catalog.name, 'id': view.id, 'name': view.name})
+                for term, df in catalog.suggester.terms(catalog.index, prefix, limit):
+                    term_df[term] = term_df.get(term, 0) + df
+            # Sources are merged the way each one is ranked
+            clubs.sort(key=lambda club: (
+                not normalize(club['name']).startswith(prefix), len(club['name']), club['name'].lower()
+            ))
+            body['clubs'] = clubs[:limit]
+            body['terms'] = sorted(term_df, key=lambda term: (-term_df[term], term))[:limit]
+        suggest_cache.put(key, body)
+
+    response = jsonify(body)
+    response.set_etag('-'.join(f"{name}:{version}" for name, version in versions))
+    response.cache_control.public = True
+    response.cache_control.max_age = SUGGEST_MAX_AGE
+    return response.make_conditional(request)
+
+# Readiness probe: 200 once club data is resident and warmed, 503 before
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    status = corpora.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+# Prometheus metrics: per-stage and per-endpoint latency histograms,
+# cache counters, index sizes and reload counters
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    caches = {'results': result_cache, 'cards': card_cache, 'suggest': suggest_cache}
+    return Response(
+        render_metrics(corpora, caches), mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+# Result cache counters
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    return jsonify(result_cache.stats())
 
 # Start the server
 if __name__ == '__main__':
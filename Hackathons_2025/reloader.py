@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+from catalog import Catalog, CatalogError, diff_clubs, read_source, source_version
+from club_data import data_path
+import query_cache
+
+# Seconds between checks of the source file; 0 disables polling
+RELOAD_INTERVAL = float(os.environ.get('CLUB_RELOAD_INTERVAL', '30'))
+
+# Above this share of changed clubs a reload rebuilds the index from
+# scratch, which also refreshes the vocabulary and IDF weights
+FULL_REBUILD_FRACTION = 0.2
+
+# Only serve prebuilt index artifacts (python club_index.py); a worker
+# never builds an index itself, so it never imports scikit-learn
+PREBUILT_ONLY = os.environ.get('CLUB_PREBUILT_ONLY', '0') == '1'
+
+
+class ClubReloader:
+    # Owns the live catalog for one club source. Requests read `current`
+    # without locking; reloads and incremental updates build a complete new
+    # catalog off to the side, validate it and then swap the reference, so
+    # in-flight requests are never dropped and a bad file never replaces
+    # good data.
+    def __init__(self, source, interval=RELOAD_INTERVAL, build=not PREBUILT_ONLY):
+        self.source = source
+        self.file_path = source.file_path
+        self.interval = interval
+        self.build = build
+        self.reloads = 0
+        self.failed_reloads = 0
+        # Milliseconds spent on the last load and warm-up
+        self.load_ms = None
+        self.warm_ms = None
+        self._catalog = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self):
+        return self._catalog
+
+    # Cheap change check: (mtime, size) of the source file
+    def _file_signature(self):
+        stat = os.stat(data_path(self.file_path))
+        return stat.st_mtime_ns, stat.st_size
+
+    # Warm a new catalog, then make it the one requests see
+    def _swap(self, catalog, how):
+        started = time.perf_counter()
+        catalog.warm()
+        self.warm_ms = (time.perf_counter() - started) * 1000
+        self._catalog = catalog
+        query_cache.invalidate()
+        self.reloads += 1
+        print(f"Serving {len(catalog)} clubs from {self.file_path} ({how}, version {catalog.version})")
+
+    # Load the source file now. Returns True if a new catalog was swapped in.
+    def load(self):
+        with self._lock:
+            try:
+                started = time.perf_counter()
+                self._signature = self._file_signature()
+                catalog = Catalog.load(self.source, build=self.build)
+                self.load_ms = (time.perf_counter() - started) * 1000
+                self._swap(catalog, 'full load')
+                return True
+            except (OSError, CatalogError) as e:
+                self.failed_reloads += 1
+                print(f"Error loading clubs: {str(e)}")
+                return False
+
+    # Reload if the source file changed since the last check. Small edits
+    # are applied incrementally; large ones trigger a full rebuild.
+    def check(self):
+        with self._lock:
+            try:
+                signature = self._file_signature()
+            except OSError as e:
+                print(f"Error checking {self.file_path}: {str(e)}")
+                return False
+            if signature == self._signature:
+                return False
+            # Whatever the outcome, this state of the file is not retried;
+            # a half-written file is picked up again once the write ends
+            self._signature = signature
+
+            try:
+                version = source_version(self.source)
+                current = self._catalog
+                if current is not None and version == current.version:
+                    return False
+
+                if current is None:
+                    catalog, how = Catalog.load(self.source, build=self.build), 'full load'
+                else:
+                    upserts, removed = diff_clubs(current, read_source(self.source, version))
+                    if len(upserts) + len(removed) > FULL_REBUILD_FRACTION * len(current):
+                        catalog, how = Catalog.load(self.source, build=self.build), 'full rebuild'
+                    else:
+                        catalog = current.apply_changes(upserts, removed, version)
+                        how = f"{len(upserts)} updated, {len(removed)} removed"
+                self._swap(catalog, how)
+                return True
+            except (OSError, ValueError, CatalogError) as e:
+                # Keep serving the current catalog
+                self.failed_reloads += 1
+                print(f"Error reloading clubs, keeping current data: {str(e)}")
+                return False
+
+    # Add or replace clubs (common club records with an 'id', validated as a
+    # load validates them) and remove clubs by id without rebuilding the index
+    def update_clubs(self, upserts=(), removed_ids=()):
+        with self._lock:
+            current = self._catalog
+            if current is None:
+                raise CatalogError("No catalog loaded")
+            version = f"{current.version}+{self.reloads}"
+            self._swap(current.apply_changes(list(upserts), list(removed_ids), version), 'update')
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    # Poll the source file in a daemon thread
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._poll, name='club-reloader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
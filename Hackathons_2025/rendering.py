@@ -0,0 +1,74 @@
+import hashlib
+import os
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from lru import LRUCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+# Static assets are requested with their content hash in the query string,
+# so browsers may cache them for a year and still see every change
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+CARD_CACHE_SIZE = 2048
+
+_asset_versions = {}
+
+
+# URL of a static asset, versioned by its content
+def asset_url(filename):
+    version = _asset_versions.get(filename)
+    if version is None:
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        _asset_versions[filename] = version
+    return f"/static/{filename}?v={version}"
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False,
+)
+env.globals['asset_url'] = asset_url
+
+# Compiled once at import; requests only execute them
+home_template = env.get_template('home.html')
+message_template = env.get_template('message.html')
+results_head_template = env.get_template('results_head.html')
+results_foot_template = env.get_template('results_foot.html')
+club_card_template = env.get_template('club_card.html')
+
+# Rendered club cards keyed by the club's view. A card only depends on its
+# view, and a view compares equal only while the club's data (source, id
+# and every displayed field) is unchanged, so an edited club is re-rendered
+# while unchanged clubs keep their cards across reloads of any source.
+card_cache = LRUCache(CARD_CACHE_SIZE)
+
+
+def render_home():
+    return home_template.render()
+
+
+def render_message(title, heading, message, link_text):
+    return message_template.render(title=title, heading=heading, message=message, link_text=link_text)
+
+
+def render_club_card(club):
+    card = card_cache.get(club)
+    if card is None:
+        card = club_card_template.render(club=club)
+        card_cache.put(club, card)
+    return card
+
+
+# Results page as a generator so the page head and first card are sent
+# before the remaining cards are rendered
+def stream_results(results):
+    yield results_head_template.render()
+    for club, _ in results:
+        yield render_club_card(club)
+    yield results_foot_template.render()
@@ -0,0 +1,126 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from metrics import observe_stage
+
+_NO_ROWS = np.empty(0, dtype=np.int32)
+_NO_SCORES = np.empty(0, dtype=np.float64)
+
+# Rows of the selected clubs, their scores, and how many clubs cleared the
+# score threshold in total (for pagination), or None for an engine that
+# stopped early and cannot tell
+Hits = namedtuple('Hits', ['rows', 'scores', 'total'])
+
+
+# Sparse dot product of one query row against the term-major postings.
+# Only the postings of the query's non-zero terms are read, so the cost is
+# proportional to their length rather than to the number of clubs.
+def score_candidates(postings, query_vector):
+    cols = query_vector.indices
+    weights = query_vector.data
+    if not len(cols):
+        return _NO_ROWS, _NO_SCORES
+
+    starts = postings.indptr[cols]
+    ends = postings.indptr[cols + 1]
+    if len(cols) == 1:
+        return postings.indices[starts[0]:ends[0]], postings.data[starts[0]:ends[0]] * weights[0]
+
+    rows = np.concatenate([postings.indices[s:e] for s, e in zip(starts, ends)])
+    contributions = np.concatenate([
+        postings.data[s:e] * w for s, e, w in zip(starts, ends, weights)
+    ])
+    candidates, inverse = np.unique(rows, return_inverse=True)
+    return candidates, np.bincount(inverse, weights=contributions, minlength=len(candidates))
+
+
+# Pick hits [offset, offset + top_k) by descending score without sorting
+# every candidate: argpartition finds the leading block, and only that
+# block is sorted. Ties are broken by row so pages are stable. `allowed`
+# is an optional boolean mask over all rows applied before selection.
+def select_top_k(candidates, scores, top_k=5, min_score=0.0, offset=0, allowed=None):
+    started = time.perf_counter()
+    hits = _select_top_k(candidates, scores, top_k, min_score, offset, allowed)
+    observe_stage('select', started)
+    return hits
+
+
+def _select_top_k(candidates, scores, top_k, min_score, offset, allowed):
+    keep = scores > min_score
+    if allowed is not None:
+        keep &= allowed[candidates]
+    candidates = candidates[keep]
+    scores = scores[keep]
+    total = len(scores)
+
+    end = min(offset + top_k, total)
+    if end <= offset:
+        return Hits(_NO_ROWS, _NO_SCORES, total)
+
+    if end < total:
+        leading = np.argpartition(-scores, end - 1)[:end]
+        # argpartition keeps any of the clubs tied at the last place; if it
+        # left some out, keep the lowest rows among them, so pages split
+        # ties the same way whatever their size
+        last = scores[leading[-1]]
+        if np.count_nonzero(scores == last) > np.count_nonzero(scores[leading] == last):
+            above = np.flatnonzero(scores > last)
+            tied = np.flatnonzero(scores == last)
+            tied = tied[np.argsort(candidates[tied], kind='stable')]
+            leading = np.concatenate([above, tied[:end - len(above)]])
+    else:
+        leading = np.arange(total)
+    order = leading[np.lexsort((candidates[leading], -scores[leading]))][offset:end]
+    return Hits(candidates[order], scores[order], total)
+
+
+# Weighted sum of a query's dot products with every indexed field of an
+# index (ClubIndex.weighted_fields): (candidate rows, scores)
+def score_fields(index, query_vector):
+    parts = [
+        score_candidates(postings, query_vector) + (boost,)
+        for _, postings, boost in index.weighted_fields()
+    ]
+    if len(parts) == 1:
+        candidates, scores, boost = parts[0]
+        return candidates, scores * boost
+    rows = np.concatenate([candidates for candidates, _, _ in parts])
+    contributions = np.concatenate([scores * boost for _, scores, boost in parts])
+    candidates, inverse = np.unique(rows, return_inverse=True)
+    return candidates, np.bincount(inverse, weights=contributions, minlength=len(candidates))
+
+
+# Field-weighted scores of some club rows for a vectorized query
+def score_rows(index, query_vector, rows):
+    scores = np.zeros(len(rows), dtype=np.float64)
+    for matrix, _, boost in index.weighted_fields():
+        scores += boost * (matrix[rows] @ query_vector.T).toarray().ravel()
+    return scores
+
+
+# Score a vectorized query against an index and return one page of hits.
+# Only clubs scoring strictly above min_score are returned.
+def search(index, query_vector, top_k=5, min_score=0.0, offset=0, allowed=None):
+    candidates, scores = score_fields(index, query_vector)
+    return select_top_k(
+        candidates, scores, top_k=top_k, min_score=min_score, offset=offset, allowed=allowed
+    )
+
+
+# Score a batch of vectorized queries (one per row) with a single sparse
+# product against each field's postings, then select a page of hits per
+# query
+def search_batch(index, query_matrix, top_k=5, min_score=0.0, offset=0, allowed=None):
+    scores = sum(
+        boost * (query_matrix @ postings) for _, postings, boost in index.weighted_fields()
+    ).tocsr()
+    hits = []
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        hits.append(select_top_k(
+            scores.indices[start:end], scores.data[start:end],
+            top_k=top_k, min_score=min_score, offset=offset, allowed=allowed
+        ))
+    return hits
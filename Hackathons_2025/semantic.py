@@ -0,0 +1,174 @@
+import numpy as np
+from scipy import sparse
+
+from scoring import Hits, select_top_k
+
+# Latent dimensions kept from the SVD of the TF-IDF matrix
+SEMANTIC_DIMS = 64
+
+# Inverted-file lists probed per query, at least
+SEMANTIC_PROBES = 8
+
+KMEANS_ITERATIONS = 15
+
+VECTOR_DTYPE = np.float32
+
+_NO_ROWS = np.empty(0, dtype=np.int32)
+_NO_SCORES = np.empty(0, dtype=np.float64)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(VECTOR_DTYPE)
+
+
+# Spherical k-means: unit vectors are assigned to the centroid with the
+# largest dot product. Deterministic for a given seed.
+def _kmeans(vectors, n_lists, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class SemanticIndex:
+    # Latent semantic index: clubs and queries are projected from TF-IDF
+    # space onto the top singular vectors of the club matrix, where clubs
+    # that use related vocabulary end up close, so a club can match a query
+    # it shares no word with. Club vectors
+    # are unit float32 rows grouped into inverted-file lists by k-means; a
+    # query is one small sparse-dense product, a scan of the centroids and
+    # exact scoring of the clubs in the few nearest lists. Only the columns
+    # the club descriptions use have a (non-zero) projection row, so the
+    # projection grows with the columns in use rather than with every
+    # column of the index (most of a hashed index's are empty).
+    def __init__(self, component_rows, components, vectors, centroids, assignments,
+                 list_rows=None, list_offsets=None):
+        # Projection row of each TF-IDF column, or -1 for unused columns
+        self.component_rows = component_rows
+        # used columns x dims projection, applied to L2-normalized TF-IDF
+        # rows
+        self.components = components
+        self.vectors = vectors
+        self.centroids = centroids
+        # List of each club, aligned with vectors
+        self.assignments = assignments
+        if list_rows is None:
+            list_rows = np.argsort(assignments, kind='stable').astype(np.int32)
+            list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+            list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=len(centroids)))
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+
+    def __len__(self):
+        return len(self.vectors)
+
+    # Build from the TF-IDF matrix of a ClubIndex
+    @classmethod
+    def build(cls, matrix, dims=SEMANTIC_DIMS):
+        from sklearn.utils.extmath import randomized_svd
+
+        n_clubs, n_terms = matrix.shape
+        dims = max(1, min(dims, n_clubs - 1, n_terms - 1))
+        _, _, vt = randomized_svd(matrix, dims, random_state=0)
+        # Unused columns project to zero, so their rows are left out
+        used = np.unique(matrix.indices)
+        component_rows = np.full(n_terms, -1, dtype=np.int32)
+        component_rows[used] = np.arange(len(used))
+        components = np.ascontiguousarray(vt.T[used], dtype=VECTOR_DTYPE)
+        used_matrix = sparse.csr_matrix(
+            (matrix.data, component_rows[matrix.indices], matrix.indptr), shape=(n_clubs, len(used))
+        )
+        vectors = _normalize(used_matrix @ components)
+        centroids = _kmeans(vectors, max(1, int(np.sqrt(n_clubs))))
+        print(f"Built semantic index: {dims} dimensions, {len(centroids)} lists")
+        return cls(component_rows, components, vectors, centroids, cls._assign(centroids, vectors))
+
+    @staticmethod
+    def _assign(centroids, vectors):
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    # Unit latent vectors of TF-IDF rows (sparse, one per text). Only the
+    # projection rows of each text's own terms are read, so a query costs
+    # a (terms x dims) product however large the vocabulary is.
+    def project(self, tfidf_rows):
+        vectors = np.zeros((tfidf_rows.shape[0], self.components.shape[1]), dtype=VECTOR_DTYPE)
+        component_rows = self.component_rows[tfidf_rows.indices]
+        for row in range(tfidf_rows.shape[0]):
+            start, end = tfidf_rows.indptr[row], tfidf_rows.indptr[row + 1]
+            rows = component_rows[start:end]
+            used = rows >= 0
+            vectors[row] = tfidf_rows.data[start:end][used] @ self.components[rows[used]]
+        return _normalize(vectors)
+
+    # Copy of this index over different club vectors, sharing the
+    # projection and centroids (used for incremental updates)
+    def with_vectors(self, vectors):
+        vectors = np.asarray(vectors, dtype=VECTOR_DTYPE)
+        return SemanticIndex(
+            self.component_rows, self.components, vectors, self.centroids,
+            self._assign(self.centroids, vectors),
+        )
+
+    def to_arrays(self, prefix='semantic'):
+        return {
+            f"{prefix}_component_rows": self.component_rows,
+            f"{prefix}_components": self.components,
+            f"{prefix}_vectors": self.vectors,
+            f"{prefix}_centroids": self.centroids,
+            f"{prefix}_assignments": self.assignments,
+            f"{prefix}_list_rows": self.list_rows,
+            f"{prefix}_list_offsets": self.list_offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='semantic'):
+        return cls(
+            arrays[f"{prefix}_component_rows"],
+            arrays[f"{prefix}_components"],
+            arrays[f"{prefix}_vectors"],
+            arrays[f"{prefix}_centroids"],
+            arrays[f"{prefix}_assignments"],
+            list_rows=arrays[f"{prefix}_list_rows"],
+            list_offsets=arrays[f"{prefix}_list_offsets"],
+        )
+
+    # Exact latent cosine similarities of the given club rows for a query
+    def score_rows(self, tfidf_row, rows):
+        if not tfidf_row.nnz:
+            return np.zeros(len(rows), dtype=np.float64)
+        return (self.vectors[rows] @ self.project(tfidf_row)[0]).astype(np.float64)
+
+    # One page of hits by cosine similarity in latent space. Lists are
+    # probed nearest first: at least `probes` of them, and more until
+    # enough allowed clubs were seen to fill the page. Scores are exact
+    # for the clubs seen; clubs in unprobed lists are missed, so results
+    # are approximate and `total` only counts the probed clubs.
+    def search(self, tfidf_row, top_k=5, min_score=0.0, offset=0, allowed=None,
+               probes=SEMANTIC_PROBES):
+        if not tfidf_row.nnz:
+            return Hits(_NO_ROWS, _NO_SCORES, 0)
+        query = self.project(tfidf_row)[0]
+        list_order = np.argsort(-(self.centroids @ query))
+
+        page_end = offset + top_k
+        seen = []
+        n_seen = 0
+        for n_probed, lst in enumerate(list_order, 1):
+            rows = self.list_rows[self.list_offsets[lst]:self.list_offsets[lst + 1]]
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            seen.append(rows)
+            n_seen += len(rows)
+            if n_probed >= probes and n_seen >= page_end:
+                break
+        candidates = np.concatenate(seen)
+        scores = (self.vectors[candidates] @ query).astype(np.float64)
+        return select_top_k(candidates, scores, top_k=top_k, min_score=min_score, offset=offset)
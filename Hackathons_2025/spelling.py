@@ -0,0 +1,182 @@
+import bisect
+import os
+from itertools import combinations
+
+import numpy as np
+
+from artifacts import StringTable, string_key
+from lru import LRUCache
+
+# Correct unknown query words to indexed words ("hackaton" -> "hackathon")
+SPELL_CORRECTION = os.environ.get('CLUB_SPELL_CORRECTION', '1') == '1'
+
+# Longest edit distance corrected; words shorter than SPELL_LONG_WORD
+# letters only get one edit, and words shorter than SPELL_MIN_LENGTH none
+SPELL_MAX_DISTANCE = 2
+SPELL_LONG_WORD = 6
+SPELL_MIN_LENGTH = 4
+
+# Only this many leading letters are indexed (the SymSpell prefix trick);
+# candidates are verified on the whole word
+SPELL_PREFIX_LENGTH = 7
+
+KEY_DTYPE = np.uint64
+
+
+# The word itself and every string left by deleting up to max_distance
+# letters from it
+def _deletes(word, max_distance=SPELL_MAX_DISTANCE):
+    variants = {word}
+    for n in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), n):
+            variants.add(''.join(ch for i, ch in enumerate(word) if i not in positions))
+    return variants
+
+
+# Optimal string alignment distance (Levenshtein plus adjacent swaps),
+# giving up once it exceeds max_distance
+def edit_distance(a, b, max_distance=SPELL_MAX_DISTANCE):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # Typos are local: only the part between the common prefix and the
+    # common suffix needs the quadratic table
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    if not a or not b:
+        return len(a) + len(b)
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+# One word is the other plus a suffix (a plural, "-ing", ...), which makes
+# it a likelier fix than an unrelated word as many edits away
+def _shares_stem(word, term):
+    return term.startswith(word) or word.startswith(term)
+
+
+class SpellingIndex:
+    # Symmetric-delete spelling index over the single-word terms of a
+    # ClubIndex vocabulary (descriptions and club names). Every string
+    # obtained by deleting up to two letters from an indexed word's prefix
+    # is stored as a 64-bit key next to the word's column, in one sorted
+    # array; an unknown query word generates its own deletes and finds
+    # candidates with one vectorized binary search, so the cost depends on
+    # the word's length, not on the vocabulary size. Words seen in the
+    # corpus but not indexed (too common to keep) are never corrected. A
+    # hashed index has no vocabulary, so its spelling index is empty.
+    def __init__(self, keys, cols, known):
+        self.keys = keys
+        self.cols = cols
+        self.known = known
+        self._corrections = LRUCache(maxsize=4096)
+
+    @classmethod
+    def build(cls, index, corpus_words=()):
+        keys = []
+        cols = []
+        for col, term in enumerate(index.terms or ()):
+            if ' ' in term:
+                continue
+            for variant in _deletes(term[:SPELL_PREFIX_LENGTH]):
+                keys.append(string_key(variant))
+                cols.append(col)
+        keys = np.array(keys, dtype=KEY_DTYPE)
+        cols = np.array(cols, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        known = sorted({word for word in corpus_words if index.lookup(word) is None})
+        return cls(keys[order], cols[order], StringTable.from_strings(known))
+
+    def to_arrays(self, prefix='spelling'):
+        return dict(
+            self.known.to_arrays(f"{prefix}_known"),
+            **{f"{prefix}_keys": self.keys, f"{prefix}_cols": self.cols},
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='spelling'):
+        return cls(
+            arrays[f"{prefix}_keys"],
+            arrays[f"{prefix}_cols"],
+            StringTable.from_arrays(arrays, f"{prefix}_known"),
+        )
+
+    def _is_known(self, word):
+        row = bisect.bisect_left(self.known, word)
+        return row < len(self.known) and self.known[row] == word
+
+    # Is the word in the index, or in the corpus behind it
+    def knows(self, word, index):
+        return index.lookup(word) is not None or self._is_known(word)
+
+    # Rank of the closest indexed word to an unknown word, as (edits,
+    # stem, IDF, word), or None: fewest edits, then words sharing its stem
+    # ("robot" -> "robots" rather than "root"), then the most common word
+    # (lowest IDF), then alphabetical. Ranks from different indexes
+    # compare.
+    def best(self, word, index):
+        if len(word) < SPELL_MIN_LENGTH or self._is_known(word):
+            return None
+        cached = self._corrections.get((index.version, word))
+        if cached is not None:
+            return cached or None
+        max_distance = SPELL_MAX_DISTANCE if len(word) >= SPELL_LONG_WORD else 1
+        variants = np.array(
+            [string_key(v) for v in _deletes(word[:SPELL_PREFIX_LENGTH], max_distance)], dtype=KEY_DTYPE
+        )
+        starts = np.searchsorted(self.keys, variants, side='left')
+        ends = np.searchsorted(self.keys, variants, side='right')
+        candidates = np.unique(np.concatenate(
+            [self.cols[start:end] for start, end in zip(starts, ends)]
+        ))
+        best = None
+        for col in candidates.tolist():
+            term = index.terms[col]
+            distance = edit_distance(word, term, max_distance)
+            if distance <= max_distance:
+                rank = (distance, not _shares_stem(word, term), float(index.idf[col]), term)
+                if best is None or rank < best:
+                    best = rank
+        self._corrections.put((index.version, word), best or ())
+        return best
+
+    # Closest indexed word to an unknown word, or None
+    def suggest(self, word, index):
+        best = self.best(word, index)
+        return best[-1] if best is not None else None
+
+
+# Correct the tokens of a query searched across several indexes, given as
+# (SpellingIndex, index) pairs: a token is kept as typed if any index
+# knows it, and otherwise replaced by the best correction any of them
+# offers, so every index ranks the same tokens. Returns
+# (tokens, {typo: fix}).
+def correct_tokens(tokens, spellers):
+    corrections = {}
+    corrected = []
+    for token in tokens:
+        if token not in corrections and not any(
+            speller.knows(token, index) for speller, index in spellers
+        ):
+            ranks = [speller.best(token, index) for speller, index in spellers]
+            ranks = [rank for rank in ranks if rank is not None]
+            if ranks:
+                corrections[token] = min(ranks)[-1]
+        corrected.append(corrections.get(token, token))
+    return corrected, corrections
@@ -0,0 +1,128 @@
+import bisect
+import re
+
+import numpy as np
+
+from artifacts import StringTable
+from lru import LRUCache
+
+# Suggestions returned per kind (club names, terms), by default and at most
+SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+
+# Vocabulary terms used by fewer clubs than this are not suggested (mostly
+# one-off words and typos)
+SUGGEST_MIN_DF = 2
+
+# Seconds browsers and proxies may reuse a suggestion response; responses
+# also carry an ETag of the data versions, so stale ones revalidate cheaply
+SUGGEST_MAX_AGE = 300
+
+SUGGEST_CACHE_SIZE = 4096
+
+# Responses per (data versions, prefix, limit); the versions keep entries
+# from outliving a reload
+suggest_cache = LRUCache(SUGGEST_CACHE_SIZE)
+
+_WORD = re.compile(r'\w+')
+
+
+# Lowercase words separated by single spaces; club names and typed
+# prefixes are compared in this form
+def normalize(text):
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+# Rows of a sorted StringTable whose strings start with prefix
+def _prefix_range(table, prefix):
+    lo = bisect.bisect_left(table, prefix)
+    hi = bisect.bisect_left(table, prefix + '\U0010ffff', lo)
+    return lo, hi
+
+
+class SuggestIndex:
+    # Prefix index for autocomplete, built with the main index. Club names
+    # are stored once per word they contain ("ai robotics ethics society",
+    # "robotics ethics society", ...), so typing any word of a name finds
+    # it; vocabulary terms (single words and phrases, already stripped of
+    # stop words and of words too common to rank) are stored as they are.
+    # Both are sorted arrays searched by binary search, so a lookup is two
+    # bisections and a sort of the matching range, never a corpus scan.
+    def __init__(self, name_keys, name_rows, name_ranks, term_keys, term_cols, term_df):
+        self.name_keys = name_keys
+        self.name_rows = name_rows
+        # Order of each entry when ranking: names that start with the
+        # prefix first, then shorter names, then alphabetical
+        self.name_ranks = name_ranks
+        self.term_keys = term_keys
+        self.term_cols = term_cols
+        # Number of club texts using each term, its popularity
+        self.term_df = term_df
+
+    # Build from the club names (aligned with the catalog rows) and the
+    # ClubIndex whose vocabulary is suggested
+    @classmethod
+    def build(cls, names, index):
+        entries = []
+        for row, name in enumerate(names):
+            words = normalize(name).split()
+            for start in range(len(words)):
+                entries.append((' '.join(words[start:]), row, (start > 0, len(name), name.lower())))
+        entries.sort()
+        ranks = np.empty(len(entries), dtype=np.int32)
+        ranks[sorted(range(len(entries)), key=lambda i: entries[i][2])] = np.arange(len(entries))
+
+        matrices = [index.matrix, *index.fields.values()]
+        df = sum(np.bincount(matrix.indices, minlength=len(index.idf)) for matrix in matrices)
+        # A hashed index has no vocabulary terms to suggest
+        cols = [] if index.terms is None else sorted(
+            np.flatnonzero(df >= SUGGEST_MIN_DF).tolist(), key=lambda col: index.terms[col]
+        )
+        return cls(
+            StringTable.from_strings([key for key, _, _ in entries]),
+            np.array([row for _, row, _ in entries], dtype=np.int32),
+            ranks,
+            StringTable.from_strings([index.terms[col] for col in cols]),
+            np.array(cols, dtype=np.int32),
+            df[cols].astype(np.int32),
+        )
+
+    def to_arrays(self, prefix='suggest'):
+        return dict(
+            self.name_keys.to_arrays(f"{prefix}_name_keys"),
+            **self.term_keys.to_arrays(f"{prefix}_term_keys"),
+            **{
+                f"{prefix}_name_rows": self.name_rows,
+                f"{prefix}_name_ranks": self.name_ranks,
+                f"{prefix}_term_cols": self.term_cols,
+                f"{prefix}_term_df": self.term_df,
+            },
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='suggest'):
+        return cls(
+            StringTable.from_arrays(arrays, f"{prefix}_name_keys"),
+            arrays[f"{prefix}_name_rows"],
+            arrays[f"{prefix}_name_ranks"],
+            StringTable.from_arrays(arrays, f"{prefix}_term_keys"),
+            arrays[f"{prefix}_term_cols"],
+            arrays[f"{prefix}_term_df"],
+        )
+
+    # Rows of the best clubs whose name has a word starting with the
+    # (normalized) prefix, best first
+    def club_rows(self, prefix, limit=SUGGEST_LIMIT):
+        lo, hi = _prefix_range(self.name_keys, prefix)
+        rows = self.name_rows[lo:hi][np.argsort(self.name_ranks[lo:hi], kind='stable')]
+        # A name matching through several of its words counts once
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)[:limit]].tolist()
+
+    # Most popular vocabulary terms starting with the (normalized) prefix,
+    # as (term, clubs using it)
+    def terms(self, index, prefix, limit=SUGGEST_LIMIT):
+        lo, hi = _prefix_range(self.term_keys, prefix)
+        df = self.term_df[lo:hi]
+        top = np.argsort(-df, kind='stable')[:limit]
+        return [(index.terms[int(self.term_cols[lo + i])], int(df[i])) for i in top]
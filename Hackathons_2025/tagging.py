@@ -0,0 +1,189 @@
+import json
+import os
+import re
+from collections import deque
+
+import numpy as np
+
+TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taxonomy.json')
+
+ACTIVITY = 'activity'
+SKILL = 'skill'
+
+TAG_DTYPE = np.uint64
+MAX_TAGS = 64
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class Tagger:
+    # Multi-pattern tagger: every keyword of every activity, skill and
+    # category in the taxonomy is compiled into one Aho-Corasick automaton,
+    # so a description is tagged in a single pass whatever the number of
+    # keywords. Keywords only match on word boundaries ("ai" does not match
+    # "maintain"); a trailing "*" allows any word ending ("mentor*" matches
+    # "mentorship").
+    def __init__(self, taxonomy):
+        # (kind, label) per tag; a tag's position is its bit in the mask
+        self.tags = []
+        self.categories = taxonomy['categories']
+        self.default_category = taxonomy['default_category']
+        self._decoded = {}
+
+        patterns = []
+        for kind, section in ((ACTIVITY, 'activities'), (SKILL, 'skills')):
+            for label, keywords in taxonomy[section].items():
+                bit = len(self.tags)
+                self.tags.append((kind, label))
+                patterns.extend((keyword, 1 << bit, -1) for keyword in keywords)
+        if len(self.tags) > MAX_TAGS:
+            raise ValueError(f"Taxonomy defines {len(self.tags)} tags, at most {MAX_TAGS} are supported")
+        # Bits of each label, by lowercased label
+        self._label_masks = {}
+        for bit, (_, label) in enumerate(self.tags):
+            self._label_masks[label.lower()] = self._label_masks.get(label.lower(), 0) | (1 << bit)
+        for category_index, category in enumerate(self.categories):
+            patterns.extend((keyword, 0, category_index) for keyword in category['keywords'])
+
+        self._compile(patterns)
+
+    @classmethod
+    def from_file(cls, path=TAXONOMY_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _compile(self, patterns):
+        goto = [{}]
+        outputs = [[]]
+        # Per pattern: (length, prefix_only, tag_bits, category_index)
+        self._patterns = []
+        for keyword, bits, category_index in patterns:
+            keyword = keyword.lower()
+            prefix_only = keyword.endswith('*')
+            keyword = keyword.rstrip('*')
+            node = 0
+            for ch in keyword:
+                if ch not in goto[node]:
+                    goto[node][ch] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                node = goto[node][ch]
+            outputs[node].append(len(self._patterns))
+            self._patterns.append((len(keyword), prefix_only, bits, category_index))
+
+        # Breadth-first failure links; each node also inherits the outputs
+        # of its failure node so suffix matches are reported
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(ch, 0) if goto[state].get(ch) != child else 0
+                outputs[child] = outputs[child] + outputs[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    # One pass over the text: returns (tag mask, category index or -1).
+    # When several categories match, the first in taxonomy order wins. A
+    # title (the club name) is scanned in the same pass but only counts
+    # towards the category, not the activity/skill tags.
+    def scan(self, text, title=''):
+        text = _WHITESPACE.sub(' ', text.lower())
+        tags_from = 0
+        if title:
+            title = _WHITESPACE.sub(' ', title.lower())
+            tags_from = len(title) + 1
+            text = title + ' ' + text
+        goto, fail, outputs, patterns = self._goto, self._fail, self._outputs, self._patterns
+        mask = 0
+        category = len(self.categories)
+        node = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in outputs[node]:
+                length, prefix_only, bits, category_index = patterns[pattern_id]
+                start = i - length + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if not prefix_only and i < last and _is_word_char(text[i + 1]):
+                    continue
+                if start >= tags_from:
+                    mask |= bits
+                if 0 <= category_index < category:
+                    category = category_index
+        return mask, (category if category < len(self.categories) else -1)
+
+    # Display info ({'name', 'icon', 'image'}) for a category index
+    def category_info(self, category_index):
+        if category_index < 0:
+            return self.default_category
+        return self.categories[category_index]
+
+    # Decode a mask into (activities, skills) label tuples. There are only
+    # a handful of distinct masks, so decoded tuples are memoized.
+    def decode(self, mask):
+        decoded = self._decoded.get(mask)
+        if decoded is None:
+            activities = []
+            skills = []
+            for bit, (kind, label) in enumerate(self.tags):
+                if mask & (1 << bit):
+                    (activities if kind == ACTIVITY else skills).append(label)
+            decoded = self._decoded[mask] = (tuple(activities), tuple(skills))
+        return decoded
+
+    # Mask of every bit carrying this label (e.g. 'Research' is both an
+    # activity and a skill)
+    def label_mask(self, label):
+        mask = self._label_masks.get(label.lower())
+        if not mask:
+            raise ValueError(f"Unknown tag: {label}")
+        return mask
+
+
+_tagger = None
+
+
+# Tagger for the shipped taxonomy file, compiled on first use
+def get_tagger():
+    global _tagger
+    if _tagger is None:
+        _tagger = Tagger.from_file()
+    return _tagger
+
+
+# Tag bitmask and category index per club, aligned with the inputs. Tags
+# come from the description only; the category also considers the name.
+def compute_tags(names, descriptions, tagger=None):
+    tagger = tagger or get_tagger()
+    tag_bits = np.zeros(len(descriptions), dtype=TAG_DTYPE)
+    categories = np.full(len(descriptions), -1, dtype=np.int16)
+    for row, (name, desc) in enumerate(zip(names, descriptions)):
+        tag_bits[row], categories[row] = tagger.scan(desc, title=name)
+    return tag_bits, categories
+
+
+def decode_tags(mask):
+    return get_tagger().decode(mask)
+
+
+# Boolean row mask of clubs carrying every one of the given labels
+def require_tags(tag_bits, labels):
+    tagger = get_tagger()
+    allowed = np.ones(len(tag_bits), dtype=bool)
+    for label in labels:
+        allowed &= (tag_bits & TAG_DTYPE(tagger.label_mask(label))) != 0
+    return allowed
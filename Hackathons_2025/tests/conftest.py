@@ -0,0 +1,81 @@
+import os
+
+# recommend.py loads every source when it is imported. Tests hand it their
+# own catalogs, so it only opens artifacts that were already built and
+# never polls the data files.
+os.environ.setdefault('CLUB_PREBUILT_ONLY', '1')
+os.environ.setdefault('CLUB_RELOAD_INTERVAL', '0')
+
+import json
+
+import numpy as np
+import pytest
+
+import club_data
+import club_index
+from adapters import adapt_org
+from catalog import Catalog
+from corpora import CorpusSource, get_source
+
+
+# The shipped sources, built into index_cache on first use
+@pytest.fixture(scope='session')
+def orgs_catalog():
+    return Catalog.load(get_source('orgs'))
+
+
+@pytest.fixture(scope='session')
+def sports_catalog():
+    return Catalog.load(get_source('sports'))
+
+
+WORDS = (
+    'chess robotics soccer dance coding hackathon research volunteer tutoring music film '
+    'debate hiking cooking photography poetry startup finance design mentorship'
+).split()
+
+
+# Org-format club records with short descriptions drawn from WORDS
+def _make_clubs(ids, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'id': club_id,
+            'name': f"Club {club_id} {WORDS[club_id % len(WORDS)].title()}",
+            'description': ' '.join(rng.choice(WORDS, size=8)) + ' every week.',
+            'email': [f"club{club_id}@example.com"],
+            'instagram': '',
+        }
+        for club_id in ids
+    ]
+
+
+@pytest.fixture
+def make_clubs():
+    return _make_clubs
+
+
+# A club source whose JSON file lives in a temporary data directory, with
+# index artifacts built into a temporary cache
+@pytest.fixture
+def club_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(club_data, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(club_index, 'INDEX_DIR', str(tmp_path / 'index_cache'))
+    return CorpusSource('orgs', 'clubs.json', adapt_org)
+
+
+# Replace club_source's file with club records (or raw text), moving its
+# mtime forward so that every write is seen as a change
+@pytest.fixture
+def write_clubs(club_source):
+    path = club_data.data_path(club_source.file_path)
+    writes = []
+
+    def write(clubs):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(clubs if isinstance(clubs, str) else json.dumps(clubs))
+        writes.append(path)
+        stamp = (1_700_000_000 + len(writes)) * 10 ** 9
+        os.utime(path, ns=(stamp, stamp))
+
+    return write
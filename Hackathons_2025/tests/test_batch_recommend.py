@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import batch_recommend
+from engines import MAX_TOP_K
+
+OPTIONS = {'engine': 'tfidf', 'top_k': 5, 'min_score': 0.0, 'tags': []}
+
+
+@pytest.mark.parametrize('args', [
+    ['--top-k', '-3'],
+    ['--top-k', '0'],
+    ['--top-k', str(MAX_TOP_K + 1)],
+    ['--top-k', 'five'],
+    ['--chunk-size', '0'],
+])
+def test_counts_that_are_not_positive_are_rejected(tmp_path, capsys, args):
+    with pytest.raises(SystemExit) as exit:
+        batch_recommend.main([str(tmp_path / 'in.jsonl'), str(tmp_path / 'out.jsonl'), *args])
+    assert exit.value.code == 2
+    assert args[0] in capsys.readouterr().err
+
+
+def write_checkpoint(tmp_path, **fields):
+    input_path = tmp_path / 'in.jsonl'
+    input_path.write_text('"chess"\n', encoding='utf-8')
+    output_path = tmp_path / 'out.jsonl'
+    output_path.write_bytes(b'')
+    checkpoint = dict(
+        input=str(input_path.resolve()), sources=['orgs'], options=OPTIONS, done=0,
+        output_bytes=0,
+    )
+    checkpoint.update(fields)
+    (tmp_path / 'out.jsonl.checkpoint').write_text(json.dumps(checkpoint), encoding='utf-8')
+    return str(input_path), str(output_path)
+
+
+@pytest.mark.parametrize('sources, options', [
+    (['orgs', 'sports'], OPTIONS),
+    (['orgs'], dict(OPTIONS, engine='bm25')),
+    (['orgs'], dict(OPTIONS, top_k=10)),
+    (['orgs'], dict(OPTIONS, tags=['Hackathons'])),
+    (['orgs'], dict(OPTIONS, min_score=0.1)),
+])
+def test_resume_refuses_other_ranking_options(tmp_path, sources, options):
+    input_path, output_path = write_checkpoint(tmp_path)
+    with pytest.raises(ValueError, match='other sources or ranking options'):
+        batch_recommend.run(input_path, output_path, sources, options, 1, resume=True)
+
+
+def test_resume_refuses_a_checkpoint_without_options(tmp_path):
+    input_path, output_path = write_checkpoint(tmp_path, sources=None, options=None)
+    with pytest.raises(ValueError, match='other sources or ranking options'):
+        batch_recommend.run(input_path, output_path, ['orgs'], OPTIONS, 1, resume=True)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from bm25 import BM25Index
+from scoring import select_top_k
+
+
+def random_counts(seed, n_clubs=400, n_terms=60, density=0.08):
+    rng = np.random.default_rng(seed)
+    counts = sparse.random(n_clubs, n_terms, density=density, format='csr', random_state=rng)
+    counts.data = np.ceil(counts.data * 4)
+    return counts
+
+
+def random_query(rng, n_terms):
+    cols = rng.choice(n_terms, size=rng.integers(1, 6), replace=False)
+    return tuple(sorted((int(col), int(rng.integers(1, 3))) for col in cols))
+
+
+def exact_scores(index, term_counts):
+    weights = np.zeros(index.impacts.shape[1])
+    for col, count in term_counts:
+        weights[col] += count
+    return index.impacts @ weights
+
+
+# Every club scored from the club-major impacts, then one page selected
+def brute_force(index, term_counts, top_k, min_score, offset, allowed):
+    scores = exact_scores(index, term_counts)
+    rows = np.arange(len(scores))
+    return select_top_k(rows, scores, top_k=top_k, min_score=min_score, offset=offset,
+                        allowed=allowed)
+
+
+# Same page up to the order of clubs with equal scores (sums taken in a
+# different order may differ in the last bit): same scores at every
+# position, and each club carries its own exact score
+def assert_same_page(hits, expected, scores):
+    np.testing.assert_allclose(hits.scores, expected.scores)
+    np.testing.assert_allclose(scores[hits.rows], hits.scores)
+    assert len(set(hits.rows.tolist())) == len(hits.rows)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_maxscore_search_matches_brute_force(seed):
+    index = BM25Index.build(random_counts(seed))
+    rng = np.random.default_rng(100 + seed)
+    allowed_masks = [None, rng.random(len(index)) < 0.5, rng.random(len(index)) < 0.05]
+    totals = set()
+    for _ in range(40):
+        term_counts = random_query(rng, index.impacts.shape[1])
+        for allowed in allowed_masks:
+            for top_k, offset in [(1, 0), (5, 0), (5, 10), (20, 3), (500, 0)]:
+                for min_score in [0.0, 2.0]:
+                    hits = index.search(term_counts, top_k=top_k, min_score=min_score,
+                                        offset=offset, allowed=allowed)
+                    expected = brute_force(index, term_counts, top_k, min_score, offset, allowed)
+                    assert_same_page(hits, expected, exact_scores(index, term_counts))
+                    if allowed is not None:
+                        assert allowed[hits.rows].all()
+                    # A total is only given when it is exact
+                    assert hits.total in (None, expected.total)
+                    totals.add(hits.total is None)
+    # Both pruned and unpruned searches were checked
+    assert totals == {False, True}
+
+
+def test_search_without_terms_finds_nothing():
+    index = BM25Index.build(random_counts(0))
+    hits = index.search((), top_k=5)
+    assert len(hits.rows) == 0 and hits.total == 0
+
+
+def test_single_term_search_counts_every_match():
+    counts = random_counts(2)
+    index = BM25Index.build(counts)
+    col = int(np.argmax(np.bincount(counts.indices, minlength=counts.shape[1])))
+    hits = index.search(((col, 1),), top_k=3)
+    assert hits.total == counts[:, col].nnz
+
+
+def test_score_rows_matches_brute_force():
+    index = BM25Index.build(random_counts(1))
+    term_counts = ((3, 1), (7, 2), (11, 1))
+    rows = np.array([0, 5, 17, 42, 399])
+    np.testing.assert_allclose(
+        index.score_rows(term_counts, rows), exact_scores(index, term_counts)[rows]
+    )
+
+
+def test_with_impacts_rebuilds_postings_and_bounds():
+    counts = random_counts(2)
+    index = BM25Index.build(counts)
+    order = np.arange(counts.shape[0])[::-1]
+    reordered = index.with_impacts(index.impacts[order])
+    term_counts = ((4, 1), (9, 1))
+    hits = reordered.search(term_counts, top_k=10)
+    expected = brute_force(reordered, term_counts, 10, 0.0, 0, None)
+    assert_same_page(hits, expected, exact_scores(reordered, term_counts))
+    np.testing.assert_allclose(reordered.max_impacts, index.max_impacts)
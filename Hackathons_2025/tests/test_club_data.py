@@ -0,0 +1,154 @@
+import json
+import re
+from collections import namedtuple
+
+import pytest
+
+import catalog
+import club_data
+from adapters import adapt_sport
+from club_data import READ_SIZE, collect_clubs, iter_records, load_clubs
+
+Source = namedtuple('Source', ['name', 'file_path', 'adapter'])
+
+
+def club(club_id, **fields):
+    return dict({'id': club_id, 'name': f"Club {club_id}", 'description': 'We meet weekly.'}, **fields)
+
+
+def write(tmp_path, text, name='clubs.json'):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+# (line, column) reported by the streaming reader for a malformed file
+def error_position(path):
+    with pytest.raises(ValueError) as error:
+        list(iter_records(path))
+    match = re.search(r'line (\d+) column (\d+)$', str(error.value))
+    assert match, str(error.value)
+    return int(match.group(1)), int(match.group(2))
+
+
+def json_position(text):
+    with pytest.raises(json.JSONDecodeError) as error:
+        json.loads(text)
+    return error.value.lineno, error.value.colno
+
+
+def test_records_match_json_loads_across_read_windows(tmp_path):
+    # Descriptions long enough that records straddle several reads
+    clubs = [club(i, description='word ' * (i * 997 % 20000)) for i in range(40)]
+    text = json.dumps(clubs, indent=2)
+    assert len(text) > 4 * READ_SIZE
+    path = write(tmp_path, text)
+    records = list(iter_records(path))
+    assert [record for _, _, record in records] == clubs
+    assert [number for number, _, _ in records] == list(range(1, 41))
+    lines = text.split('\n')
+    for _, line, record in records:
+        assert lines[line - 1].strip() == '{'
+        assert lines[line].strip() == f'"id": {record["id"]},'
+
+
+def test_empty_list_has_no_records(tmp_path):
+    assert list(iter_records(write(tmp_path, ' [ \n ] \n'))) == []
+
+
+@pytest.mark.parametrize('text', [
+    '[{"id": 1}, {"id": 2} {"id": 3}]',
+    '[{"id": 1},\n {"id": 2,\n  "name": }]',
+    '[{"id": 1}, {"id": 2}',
+    '[{"id": 1}] trailing',
+    '[{"id": 1}, ]',
+])
+def test_malformed_json_is_reported_where_json_reports_it(tmp_path, text):
+    assert error_position(write(tmp_path, text)) == json_position(text)
+
+
+def test_a_file_that_is_not_a_list_is_refused(tmp_path):
+    path = write(tmp_path, '\n  {"id": 1}')
+    with pytest.raises(ValueError, match=r'^Expecting a JSON list of clubs: line 2 column 3$'):
+        list(iter_records(path))
+
+
+def test_malformed_json_past_the_first_windows(tmp_path):
+    clubs = [club(i, description='x' * 5000) for i in range(60)]
+    text = json.dumps(clubs, indent=1)
+    # Break a record near the end: drop the comma after its id
+    cut = text.index('"id": 55,') + len('"id": 55')
+    text = text[:cut] + text[cut + 1:]
+    assert cut > 4 * READ_SIZE
+    assert error_position(write(tmp_path, text)) == json_position(text)
+
+
+def test_invalid_records_are_set_aside_with_their_reason(tmp_path):
+    records = [
+        club(1, email=['a@x.edu', 'b@x.edu'], instagram='  @one  '),
+        'not a club',
+        club(2, name='   '),
+        club(1),
+        club('three'),
+        club(4, email=7),
+        {'name': 'No id', 'description': 'x'},
+        club(5, description=None),
+        club(6, division='Coed'),
+    ]
+    path = write(tmp_path, json.dumps(records, indent=2))
+    clubs, rejected = load_clubs(path)
+
+    assert clubs.club_ids() == [1, 6]
+    assert clubs[0]['email'] == 'a@x.edu'
+    assert clubs[0]['instagram'] == '@one'
+    assert clubs[1]['division'] == 'Coed'
+    assert [item.record for item in rejected] == [2, 3, 4, 5, 6, 7, 8]
+    reasons = [item.error for item in rejected]
+    assert reasons[0] == 'record is not an object'
+    assert reasons[1] == 'name is missing or empty'
+    assert reasons[2] == 'duplicate id 1'
+    assert 'same type' in reasons[3]
+    assert reasons[4] == 'email must be a string, not int'
+    assert reasons[5] == 'id is missing'
+    assert reasons[6] == 'description is missing or empty'
+    # Lines point at the start of each record in the file
+    lines = open(path, encoding='utf-8').read().split('\n')
+    assert lines[rejected[0].line - 1].strip() == '"not a club",'
+    assert rejected[1].raw == records[2]
+
+
+def test_adapter_errors_are_rejections():
+    records = [
+        (1, 1, {'url': 'https://x/sports/rowing', 'name': 'Rowing', 'description': 'Row.'}),
+        (2, 5, {'url': 'https://x/sports/chess', 'name': 'Chess', 'description': 'x',
+                'contact': 'not an object'}),
+        (3, 9, ['not', 'an', 'object']),
+    ]
+    clubs, rejected = collect_clubs(records, adapt_sport)
+    assert clubs.club_ids() == ['rowing']
+    assert [(item.record, item.line) for item in rejected] == [(2, 5), (3, 9)]
+    assert rejected[0].error.startswith('record does not fit the source format')
+    assert rejected[1].error == 'record is not an object'
+
+
+def test_rejected_records_are_quarantined(tmp_path, monkeypatch):
+    quarantine = tmp_path / 'quarantine' / 'test-v1.jsonl'
+    monkeypatch.setattr(catalog, 'quarantine_path', lambda name, version: str(quarantine))
+    path = write(tmp_path, json.dumps([club(1), club(1), {'id': 2}], indent=2))
+    source = Source('test', path, None)
+    clubs = catalog.read_source(source, 'v1')
+
+    assert clubs.club_ids() == [1]
+    quarantined = [json.loads(line) for line in quarantine.read_text(encoding='utf-8').splitlines()]
+    assert [(item['record'], item['line'], item['error']) for item in quarantined] == [
+        (2, 7, 'duplicate id 1'),
+        (3, 12, 'name is missing or empty'),
+    ]
+    assert quarantined[1]['raw'] == {'id': 2}
+
+
+def test_data_files_resolve_against_the_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(club_data, 'DATA_DIR', str(tmp_path))
+    write(tmp_path, json.dumps([club(1)]), name='relative.json')
+    clubs, rejected = load_clubs('relative.json')
+    assert clubs.club_ids() == [1] and rejected == []
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from engines import ENGINES
+from facets import add_facet_counts, allowed_rows, filter_mask
+from recommend import get_recommendations
+
+QUERIES = ['soccer team', 'machine learning hackathon', 'dance', 'volunteer tutoring kids']
+
+
+def facet_counts(catalog, query, top_k, engine, **options):
+    counts = {}
+    get_recommendations(
+        catalog, catalog.index.tokens(query), top_k=top_k, engine=engine, facet_counts=counts,
+        **options
+    )
+    return counts
+
+
+# Rows with a posting for any query term in any indexed field
+def rows_with_a_query_term(catalog, query, allowed=None):
+    cols = [col for col, _ in catalog.index.term_counts(query)]
+    found = np.zeros(len(catalog), dtype=bool)
+    for matrix, _, _ in catalog.index.weighted_fields():
+        found |= np.asarray((matrix[:, cols] != 0).sum(axis=1)).ravel() > 0
+    if allowed is not None:
+        found &= allowed
+    return np.flatnonzero(found)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_counts_do_not_depend_on_engine_or_page_size(orgs_catalog, query):
+    expected = {}
+    add_facet_counts(expected, orgs_catalog, rows_with_a_query_term(orgs_catalog, query))
+    assert expected['source']['orgs'] > 1
+    for engine in ENGINES:
+        for top_k in (1, 5, 50):
+            assert facet_counts(orgs_catalog, query, top_k, engine) == expected, (engine, top_k)
+
+
+def test_counts_follow_the_filter_and_tags(orgs_catalog):
+    query = 'machine learning hackathon'
+    filters = {'has': 'instagram'}
+    tags = ['Hackathons']
+    allowed = allowed_rows(orgs_catalog, tags, filters)
+    expected = {}
+    add_facet_counts(expected, orgs_catalog, rows_with_a_query_term(orgs_catalog, query, allowed))
+    for engine in ENGINES:
+        for top_k in (1, 20):
+            counts = facet_counts(
+                orgs_catalog, query, top_k, engine, required_tags=tags, filters=filters
+            )
+            assert counts == expected, (engine, top_k)
+    assert expected['has']['instagram'] == expected['source']['orgs']
+    assert expected['tag']['Hackathons'] == expected['source']['orgs']
+
+
+def division_counts(catalog, rows):
+    counts = {}
+    add_facet_counts(counts, catalog, rows)
+    return counts.get('division', {})
+
+
+def test_divisions_are_read_from_the_club_table(sports_catalog):
+    divisions = sports_catalog.clubs.column('division')
+    assert 'Coed' in divisions
+    mask = filter_mask(sports_catalog, {'division': ['Coed', 'Womens']})
+    assert mask.tolist() == [division in ('Coed', 'Womens') for division in divisions]
+    rows = np.arange(len(sports_catalog))
+    expected = {d: divisions.count(d) for d in set(divisions) if d}
+    assert division_counts(sports_catalog, rows) == expected
+
+
+def test_divisions_follow_incremental_changes(sports_catalog):
+    club = sports_catalog.clubs[0]
+    assert club['division'] != 'Esports'
+    changed = sports_catalog.apply_changes(
+        [dict(club, division='Esports'), dict(club, id='new-club', division='Paralympic')],
+        [], 'changed',
+    )
+    row = changed.rows_by_id[club['id']]
+    assert filter_mask(changed, {'division': 'Esports'})[row]
+    new_row = changed.rows_by_id['new-club']
+    assert np.flatnonzero(filter_mask(changed, {'division': 'Paralympic'})).tolist() == [new_row]
+    counts = division_counts(changed, np.arange(len(changed)))
+    before = division_counts(sports_catalog, np.arange(len(sports_catalog)))
+    assert counts['Esports'] == before['Esports'] + 1
+    assert counts[club['division']] == before[club['division']] - 1
+    assert counts['Paralympic'] == 1
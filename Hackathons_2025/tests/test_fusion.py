@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+import engines
+from engines import Engine
+from fusion import RRF_K, LatencyBudget, fuse, parse_settings
+from scoring import select_top_k
+
+
+def test_rrf_sums_reciprocal_ranks_of_positive_scores():
+    candidates = np.array([10, 20, 30])
+    columns = np.array([[3.0, 0.0], [2.0, 5.0], [1.0, 4.0]])
+    fused = fuse(candidates, columns, 'rrf')
+    expected = [
+        1 / (RRF_K + 1),
+        1 / (RRF_K + 2) + 1 / (RRF_K + 1),
+        1 / (RRF_K + 3) + 1 / (RRF_K + 2),
+    ]
+    np.testing.assert_allclose(fused, expected)
+    assert select_top_k(candidates, fused, top_k=3).rows.tolist() == [20, 30, 10]
+
+
+def test_rrf_breaks_score_ties_by_row_and_applies_weights():
+    candidates = np.array([7, 3, 5])
+    columns = np.array([[1.0], [1.0], [2.0]])
+    # Ranks: 5 first, then the tie 3 before 7
+    np.testing.assert_allclose(
+        fuse(candidates, columns, 'rrf', weights=[2.0]),
+        [2 / (RRF_K + 3), 2 / (RRF_K + 2), 2 / (RRF_K + 1)],
+    )
+
+
+def test_weighted_fusion_scales_each_engine_to_its_best_candidate():
+    candidates = np.array([10, 20, 30])
+    columns = np.array([[3.0, 0.0], [2.0, 5.0], [1.0, 4.0]])
+    np.testing.assert_allclose(
+        fuse(candidates, columns, 'weighted', weights=[2.0, 1.0]),
+        [2.0, 2 * 2 / 3 + 1.0, 2 * 1 / 3 + 0.8],
+    )
+
+
+def test_weighted_fusion_ignores_negative_and_empty_columns():
+    candidates = np.array([1, 2])
+    columns = np.array([[-1.0, 0.0, 2.0], [-3.0, 0.0, 1.0]])
+    np.testing.assert_allclose(fuse(candidates, columns, 'weighted'), [1.0, 0.5])
+    assert len(fuse(np.array([], dtype=int), np.zeros((0, 2)), 'weighted')) == 0
+
+
+def test_parse_settings():
+    assert parse_settings('bm25:50, semantic:20,', int) == {'bm25': 50, 'semantic': 20}
+    assert parse_settings('', float) == {}
+
+
+class StepClock:
+    # Clock (in seconds) that only moves when a test advances it
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms / 1000
+
+
+def test_budget_expires_on_the_injected_clock():
+    clock = StepClock()
+    budget = LatencyBudget(budget_ms=50, clock=clock)
+    assert not budget.expired()
+    clock.advance(49)
+    assert not budget.expired()
+    clock.advance(2)
+    assert budget.expired()
+    budget.skip('semantic')
+    budget.skip('semantic')
+    report = budget.report()
+    assert report['elapsed_ms'] == pytest.approx(51)
+    assert not report['within_budget']
+    assert report['skipped'] == ['semantic']
+
+
+# Engine over fixed per-club scores that takes `cost_ms` of the clock to run
+def fixed_engine(name, scores, clock=None, cost_ms=0.0, calls=None):
+    scores = np.asarray(scores, dtype=np.float64)
+
+    def search(catalog, term_counts, top_k=5, min_score=0.0, offset=0, allowed=None, budget=None):
+        if clock is not None:
+            clock.advance(cost_ms)
+        if calls is not None:
+            calls.append(name)
+        return select_top_k(np.arange(len(scores)), scores, top_k=top_k, min_score=min_score,
+                            offset=offset, allowed=allowed)
+
+    def score_rows(catalog, term_counts, rows):
+        return scores[rows]
+
+    return Engine(name, search, None, score_rows)
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    clock = StepClock()
+    calls = []
+    fakes = {
+        'first': fixed_engine('first', [0.0, 0.9, 0.8, 0.1, 0.0], clock, 30, calls),
+        'second': fixed_engine('second', [0.7, 0.0, 0.2, 0.6, 0.0], clock, 30, calls),
+        'third': fixed_engine('third', [0.0, 0.0, 0.0, 0.0, 0.5], clock, 30, calls),
+    }
+    monkeypatch.setattr(engines, 'ENGINES', fakes)
+    monkeypatch.setattr(engines, 'FUSION_DEPTHS', {'first': 2, 'second': 2, 'third': 2})
+    monkeypatch.setattr(engines, 'FUSION_WEIGHTS', {})
+    monkeypatch.setattr(engines, 'FUSION_METHOD', 'rrf')
+    return clock, calls
+
+
+def test_hybrid_fuses_the_union_of_every_engine_candidates(hybrid):
+    _, calls = hybrid
+    hits = engines._hybrid_search(None, (), top_k=5)
+    assert calls == ['first', 'second', 'third']
+    # Every club some engine scored above zero is a candidate, re-scored by
+    # all three. first ranks 1, 2, 3; second 0, 3, 2; third 4.
+    scores = {
+        0: 1 / (RRF_K + 1),
+        1: 1 / (RRF_K + 1),
+        2: 1 / (RRF_K + 2) + 1 / (RRF_K + 3),
+        3: 1 / (RRF_K + 3) + 1 / (RRF_K + 2),
+        4: 1 / (RRF_K + 1),
+    }
+    order = sorted(scores, key=lambda row: (-scores[row], row))
+    assert hits.rows.tolist() == order == [2, 3, 0, 1, 4]
+    np.testing.assert_allclose(hits.scores, [scores[row] for row in order])
+
+
+def test_hybrid_skips_engines_once_the_budget_is_spent(hybrid):
+    clock, calls = hybrid
+    budget = LatencyBudget(budget_ms=50, clock=clock)
+    hits = engines._hybrid_search(None, (), top_k=5, budget=budget)
+    # first (30 ms) and second (60 ms) ran; third would start over budget
+    assert calls == ['first', 'second']
+    assert budget.skipped == ['third']
+    assert 4 not in hits.rows.tolist()
+
+
+def test_hybrid_always_runs_the_first_engine(hybrid):
+    clock, calls = hybrid
+    budget = LatencyBudget(budget_ms=10, clock=clock)
+    clock.advance(20)
+    hits = engines._hybrid_search(None, (), top_k=5, budget=budget)
+    assert calls == ['first']
+    assert budget.skipped == ['second', 'third']
+    assert hits.rows.tolist() == [1, 2, 3]
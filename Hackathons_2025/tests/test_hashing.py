@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+import club_index
+from artifacts import string_key
+from club_index import VECTORIZER_PARAMS, ClubIndex
+from hashing import HashingIndex
+from scoring import search
+
+# Enough columns that the test vocabulary has no collisions
+N_FEATURES = 1 << 20
+
+DESCRIPTIONS = [
+    'Chess club with weekly chess tournaments',
+    'Robotics club building robots for competitions',
+    'Soccer club pickup games on weekends',
+    'Film club screenings and film discussions',
+    'Debate club practice rounds and tournaments',
+    'Club hiking trips every weekend',
+    'Coding club hackathons and coding interviews',
+    'Cooking club recipes and potlucks',
+    'Dance club hip hop and salsa',
+    'Poetry club open mic nights',
+]
+FIELDS = {'name': [f"Club {i} Society" for i in range(len(DESCRIPTIONS))]}
+
+
+def hashed(descriptions=DESCRIPTIONS, n_features=N_FEATURES, workers=1, fields=FIELDS):
+    return HashingIndex.build(descriptions, 'test', fields, n_features, workers)
+
+
+def col(term, n_features=N_FEATURES):
+    return string_key(term) % n_features
+
+
+def test_idf_matches_the_fitted_vocabulary():
+    index, _ = hashed()
+    fitted = ClubIndex.build(DESCRIPTIONS, 'test')
+    for term in ['chess', 'tournaments', 'hip hop', 'weekly chess', 'robots']:
+        assert index.idf[col(term)] == pytest.approx(fitted.idf[fitted.lookup(term)])
+        assert index.lookup(term) == col(term)
+
+
+def test_columns_over_max_df_weigh_nothing():
+    # "club" is in every description, over the max_df share
+    assert VECTORIZER_PARAMS['max_df'] < 1
+    index, counts = hashed()
+    assert index.idf[col('club')] == 0
+    assert index.lookup('club') is None
+    assert ClubIndex.build(DESCRIPTIONS, 'test').lookup('club') is None
+    assert index.matrix[:, col('club')].nnz == 0
+    # The counts shared with BM25 drop it too
+    assert counts[:, col('club')].nnz == 0
+
+    # The cut-off is inclusive: a term in exactly max_df of the clubs stays
+    n = len(DESCRIPTIONS)
+    at_limit = int(VECTORIZER_PARAMS['max_df'] * n)
+    for used, kept in [(at_limit, True), (at_limit + 1, False)]:
+        descriptions = [
+            f"{description} brunch" if row < used else description
+            for row, description in enumerate(DESCRIPTIONS)
+        ]
+        assert (hashed(descriptions)[0].lookup('brunch') is not None) == kept
+        assert (ClubIndex.build(descriptions, 'test').lookup('brunch') is not None) == kept
+
+
+def test_rows_match_the_fitted_index_up_to_column_order():
+    index, _ = hashed(fields=None)
+    fitted = ClubIndex.build(DESCRIPTIONS, 'test')
+    for row, description in enumerate(DESCRIPTIONS):
+        terms = set(fitted.analyze(description)) - {'club'}
+        hashed_row = index.matrix[row]
+        fitted_row = fitted.matrix[row]
+        assert sorted(hashed_row.indices.tolist()) == sorted(col(term) for term in terms)
+        for term in terms:
+            assert hashed_row[0, col(term)] == pytest.approx(fitted_row[0, fitted.lookup(term)])
+
+
+def test_queries_look_up_the_hashed_columns():
+    index, _ = hashed()
+    assert index.term_counts('Chess chess TOURNAMENTS, the unknownword') == tuple(sorted([
+        (col('chess'), 2), (col('tournaments'), 1), (col('chess chess'), 1),
+        (col('chess tournaments'), 1), (col('tournaments unknownword'), 1),
+        (col('unknownword'), 1),
+    ]))
+    # A description vectorizes to its own row
+    for row, description in enumerate(DESCRIPTIONS):
+        np.testing.assert_allclose(
+            index.transform(description).toarray(), index.matrix[row].toarray()
+        )
+    # A query finds the club whose words it uses
+    hits = search(index, index.transform('salsa dance'), top_k=1)
+    assert hits.rows.tolist() == [8]
+
+
+def test_colliding_terms_share_a_column_and_its_idf():
+    n_features = 64
+    index, _ = hashed(n_features=n_features)
+    terms = sorted({term for description in DESCRIPTIONS for term in index.analyze(description)})
+    shared = {}
+    for term in terms:
+        shared.setdefault(col(term, n_features), []).append(term)
+    column, (a, b) = next(
+        (c, group[:2]) for c, group in shared.items() if len(group) > 1 and index.idf[c] > 0
+    )
+    assert index.lookup(a) == index.lookup(b) == column
+    # The column's document frequency counts the clubs using any n-gram
+    # that hashes to it
+    df = sum(
+        any(col(gram, n_features) == column for gram in index.analyze(description))
+        for description in DESCRIPTIONS
+    )
+    n = len(DESCRIPTIONS)
+    assert index.idf[column] == pytest.approx(np.log((1 + n) / (1 + df)) + 1)
+
+
+def test_parallel_counting_matches_serial(monkeypatch):
+    monkeypatch.setattr(club_index, 'COUNT_CHUNK_SIZE', 3)
+    descriptions = DESCRIPTIONS * 4
+    fields = {'name': FIELDS['name'] * 4}
+    serial, serial_counts = hashed(descriptions, workers=1, fields=fields)
+    parallel, parallel_counts = hashed(descriptions, workers=3, fields=fields)
+    assert (serial_counts != parallel_counts).nnz == 0
+    assert (serial.matrix != parallel.matrix).nnz == 0
+    assert (serial.fields['name'] != parallel.fields['name']).nnz == 0
+    np.testing.assert_array_equal(serial.idf, parallel.idf)
+    counter = serial.counter()
+    assert (serial.count_texts(descriptions, 3) != counter.count_texts(descriptions, 1)).nnz == 0
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from neighbors import NeighborGraph
+
+
+def random_rows(rng, n_rows, n_terms=40, density=0.08):
+    matrix = sparse.random(n_rows, n_terms, density=density, format='csr', random_state=rng)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def brute_force_neighbors(matrix, row, k):
+    scores = (matrix @ matrix[row].T).toarray().ravel().astype(np.float32)
+    scores[row] = 0
+    ranked = sorted((-score, other) for other, score in enumerate(scores) if score > 0)
+    return [other for _, other in ranked[:k]]
+
+
+def test_build_matches_brute_force():
+    matrix = random_rows(np.random.default_rng(0), 120)
+    graph = NeighborGraph.build(matrix, k=6)
+    for row in range(matrix.shape[0]):
+        expected = brute_force_neighbors(matrix, row, 6)
+        assert [n for n, _ in graph.similar(row)] == expected
+    # Clubs with fewer positive neighbors than k are padded with -1
+    assert (graph.neighbors == -1).any()
+
+
+def test_build_in_blocks_matches_one_block(monkeypatch):
+    import neighbors
+
+    matrix = random_rows(np.random.default_rng(1), 90)
+    whole = NeighborGraph.build(matrix, k=5)
+    monkeypatch.setattr(neighbors, 'SIMILAR_BLOCK_SCORES', 7 * matrix.shape[0])
+    blocked = NeighborGraph.build(matrix, k=5)
+    np.testing.assert_array_equal(blocked.neighbors, whole.neighbors)
+    np.testing.assert_array_equal(blocked.scores, whole.scores)
+
+
+# Old rows kept (in a new order), some replaced or removed, and new ones
+# appended, as Catalog.apply_changes does
+@pytest.mark.parametrize('seed', range(6))
+def test_incremental_update_matches_full_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    n_old = 150
+    old_matrix = random_rows(rng, n_old)
+    graph = NeighborGraph.build(old_matrix, k=8)
+
+    removed = set(rng.choice(n_old, size=10, replace=False).tolist())
+    replaced = set(rng.choice(n_old, size=8, replace=False).tolist()) - removed
+    order = []
+    for row in range(n_old):
+        if row in removed:
+            continue
+        order.append(-1 if row in replaced else row)
+    order.extend([-1] * int(rng.integers(0, 6)))
+    order = np.array(order, dtype=np.int64)
+
+    new_rows = random_rows(rng, int((order < 0).sum()))
+    parts = []
+    next_new = 0
+    for old_row in order:
+        if old_row >= 0:
+            parts.append(old_matrix[old_row])
+        else:
+            parts.append(new_rows[next_new])
+            next_new += 1
+    matrix = sparse.vstack(parts, format='csr')
+
+    updated = graph.with_changes(matrix, order)
+    rebuilt = NeighborGraph.build(matrix, k=8)
+    np.testing.assert_array_equal(updated.neighbors, rebuilt.neighbors)
+    np.testing.assert_array_equal(updated.scores, rebuilt.scores)
+
+
+def test_update_without_changes_keeps_the_graph():
+    matrix = random_rows(np.random.default_rng(7), 60)
+    graph = NeighborGraph.build(matrix, k=5)
+    updated = graph.with_changes(matrix, np.arange(60))
+    np.testing.assert_array_equal(updated.neighbors, graph.neighbors)
+    np.testing.assert_array_equal(updated.scores, graph.scores)
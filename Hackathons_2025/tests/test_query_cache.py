@@ -0,0 +1,113 @@
+import pytest
+
+import query_cache
+from club_index import ClubIndex
+from query_cache import result_cache, result_key
+from recommend import get_recommendations
+from reloader import ClubReloader
+
+DESCRIPTIONS = [
+    'chess club for beginners',
+    'competitive chess tournaments',
+    'robotics team building robots',
+    'soccer team pickup games',
+    'film club screenings',
+]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return ClubIndex.build(DESCRIPTIONS, 'v1')
+
+
+def key(index, query, engine='tfidf', **options):
+    options = dict(dict(top_k=5, offset=0, min_score=0.0, required_tags=()), **options)
+    return result_key(
+        index, engine, index.term_counts(query), options['top_k'], options['offset'],
+        options['min_score'], options['required_tags'], options.get('filters'),
+        options.get('facets', False),
+    )
+
+
+def test_key_ignores_case_spacing_and_unknown_words(index):
+    assert key(index, 'Chess') == key(index, '  chess ') == key(index, 'chess zzzqx')
+    assert key(index, 'chess') == key(index, 'chess, please!')
+    assert key(index, 'chess') != key(index, 'soccer')
+
+
+def test_key_ignores_word_order(index):
+    # Neither order forms a bigram of the vocabulary
+    assert index.lookup('soccer robotics') is None and index.lookup('robotics soccer') is None
+    assert key(index, 'robotics soccer') == key(index, 'soccer robotics')
+    assert key(index, 'film chess robotics') == key(index, 'robotics film chess')
+
+
+def test_key_keeps_known_phrases_apart(index):
+    # "chess club" is a vocabulary bigram, so it scores differently from
+    # "club chess" and needs its own entry
+    assert index.lookup('chess club') is not None
+    assert key(index, 'chess club') != key(index, 'club chess')
+
+
+def test_key_separates_ranking_options(index):
+    base = key(index, 'chess')
+    assert base != key(index, 'chess', engine='bm25')
+    assert base != key(index, 'chess', top_k=10)
+    assert base != key(index, 'chess', offset=5)
+    assert base != key(index, 'chess', min_score=0.1)
+    assert base != key(index, 'chess', facets=True)
+    assert base != key(index, 'chess', filters={'has': 'email'})
+    assert key(index, 'chess', required_tags=['Research', 'hackathons']) == key(
+        index, 'chess', required_tags=['Hackathons', 'research', 'Research']
+    )
+    assert key(index, 'chess', filters={'and': [{'has': 'email'}, {'tag': 'Research'}]}) != key(
+        index, 'chess', filters={'and': [{'tag': 'Research'}, {'has': 'email'}]}
+    )
+
+
+def test_key_changes_with_the_index_version(index):
+    bumped = index.with_matrix(index.matrix, 'v2', index.fields)
+    assert key(index, 'chess') != key(bumped, 'chess')
+
+
+def test_reload_invalidates_cached_results(club_source, write_clubs, make_clubs):
+    clubs = make_clubs(range(1, 41))
+    clubs[0]['description'] = 'Chess openings and chess endgames.'
+    write_clubs(clubs)
+    reloader = ClubReloader(club_source, interval=0, build=True)
+    assert reloader.load()
+
+    def top_ids(catalog):
+        results = get_recommendations(catalog, catalog.index.tokens('chess endgames'), top_k=1)
+        return [view.id for view, _ in results]
+
+    old = reloader.current
+    assert top_ids(old) == [1]
+    hits = result_cache.hits
+    assert top_ids(old) == [1]
+    assert result_cache.hits == hits + 1
+
+    clubs[0]['description'] = 'Poetry readings.'
+    clubs[1]['description'] = 'Chess endgames every week.'
+    write_clubs(clubs)
+    assert reloader.check()
+    new = reloader.current
+    assert new.version != old.version
+    assert len(result_cache) == 0
+    assert top_ids(new) == [2]
+
+    # Entries of the old version are not served for the new one, even if
+    # they were put back after the swap
+    assert top_ids(old) == [1]
+    assert top_ids(new) == [2]
+
+    # An update through the API bumps the version too
+    reloader.update_clubs([dict(clubs[1], description='Film nights.')])
+    assert reloader.current.version != new.version
+    assert top_ids(reloader.current) != [2]
+
+
+def test_invalidate_empties_the_cache():
+    result_cache.put(('some', 'key'), ((), None))
+    query_cache.invalidate()
+    assert len(result_cache) == 0
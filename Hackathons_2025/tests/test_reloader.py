@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from catalog import Catalog, CatalogError
+from reloader import FULL_REBUILD_FRACTION, ClubReloader
+from scoring import search
+from tagging import compute_tags
+
+N_CLUBS = 60
+
+
+@pytest.fixture
+def reloader(club_source, write_clubs, make_clubs):
+    write_clubs(make_clubs(range(1, N_CLUBS + 1)))
+    reloader = ClubReloader(club_source, interval=0, build=True)
+    assert reloader.load()
+    return reloader
+
+
+def descriptions(catalog):
+    return {club_id: catalog.clubs[row]['description'] for club_id, row in catalog.rows_by_id.items()}
+
+
+def test_unchanged_file_is_not_reloaded(reloader, write_clubs, make_clubs):
+    catalog = reloader.current
+    assert not reloader.check()
+    # Rewritten with the same content: the new mtime is checked, the hash matches
+    write_clubs(make_clubs(range(1, N_CLUBS + 1)))
+    assert not reloader.check()
+    assert reloader.current is catalog
+    assert reloader.reloads == 1
+
+
+def test_small_edit_is_applied_incrementally(reloader, write_clubs, make_clubs):
+    old = reloader.current
+    clubs = make_clubs(range(1, N_CLUBS + 1))
+    clubs[4]['description'] = 'Competitive chess ladder and chess puzzles.'
+    del clubs[10]
+    clubs.append(dict(make_clubs([500])[0], description='Robotics builds with soccer drills.'))
+    write_clubs(clubs)
+
+    assert reloader.check()
+    new = reloader.current
+    assert new is not old and new.version != old.version
+    # Incremental: the vocabulary and IDF weights are the old ones
+    assert new.index.idf is old.index.idf
+    assert set(new.rows_by_id) == {club['id'] for club in clubs}
+    assert descriptions(new) == {club['id']: club['description'] for club in clubs}
+    assert 11 not in new.rows_by_id
+
+    # Every part of the catalog follows the new rows
+    new.validate()
+    hits = search(new.index, new.index.transform('chess ladder puzzles'), top_k=1)
+    assert new.views[hits.rows[0]].id == 5
+    hits = new.bm25.search(new.index.term_counts('robotics soccer drills'), top_k=len(new))
+    assert new.rows_by_id[500] in hits.rows
+    assert np.all(new.neighbors.neighbors < len(new))
+
+
+def test_incremental_rows_match_the_old_index(reloader, write_clubs, make_clubs):
+    clubs = make_clubs(range(1, N_CLUBS + 1))
+    clubs[0]['description'] = 'Poetry slam and film nights.'
+    del clubs[5]
+    clubs.append(make_clubs([900], seed=2)[0])
+    write_clubs(clubs)
+    assert reloader.check()
+    catalog = reloader.current
+    tag_bits, categories = compute_tags(
+        catalog.clubs.texts['name'], catalog.clubs.texts['description']
+    )
+    assert (catalog.tag_bits == tag_bits).all()
+    assert (catalog.categories == categories).all()
+    # Each row holds what the old index makes of its description
+    index = catalog.index
+    for row in range(len(catalog)):
+        description = catalog.clubs[row]['description']
+        expected = index.transform(description)
+        np.testing.assert_allclose(index.matrix[row].toarray(), expected.toarray())
+        impacts = catalog.bm25.impact_rows(index.count_matrix([index.term_counts(description)]))
+        np.testing.assert_allclose(catalog.bm25.impacts[row].toarray(), impacts.toarray())
+        np.testing.assert_allclose(
+            catalog.semantic.vectors[row], catalog.semantic.project(expected)[0], atol=1e-6
+        )
+
+
+def test_large_edit_rebuilds_the_index(reloader, write_clubs, club_source, make_clubs):
+    old = reloader.current
+    changed = int(FULL_REBUILD_FRACTION * N_CLUBS) + 1
+    clubs = make_clubs(range(1, N_CLUBS + 1))
+    clubs[:changed] = make_clubs(range(1000, 1000 + changed), seed=1)
+    write_clubs(clubs)
+
+    assert reloader.check()
+    new = reloader.current
+    assert new.index.idf is not old.index.idf
+    assert set(new.rows_by_id) == {club['id'] for club in clubs}
+    # A full rebuild is saved as an artifact, like a startup load
+    reopened = Catalog.load(club_source, build=False)
+    assert reopened.version == new.version
+
+
+@pytest.mark.parametrize('text', [
+    '[{"id": 1, "name": "Chess", "description": "Chess"',
+    '[]',
+    '',
+    '{"id": 1}',
+])
+def test_malformed_or_empty_file_keeps_the_current_data(reloader, write_clubs, text, make_clubs):
+    catalog = reloader.current
+    write_clubs(text)
+    assert not reloader.check()
+    assert reloader.current is catalog
+    assert reloader.failed_reloads == 1
+
+    # The file is picked up again once it is fixed
+    clubs = make_clubs(range(1, N_CLUBS + 1))
+    clubs[0]['description'] = 'Photography walks.'
+    write_clubs(clubs)
+    assert reloader.check()
+    assert descriptions(reloader.current)[1] == 'Photography walks.'
+
+
+def test_file_of_invalid_records_keeps_the_current_data(reloader, write_clubs):
+    catalog = reloader.current
+    write_clubs([{'id': club_id} for club_id in range(1, N_CLUBS + 1)])
+    assert not reloader.check()
+    assert reloader.current is catalog
+
+
+def test_update_clubs_adds_replaces_and_removes(reloader, make_clubs):
+    old = reloader.current
+    added = dict(make_clubs([700])[0], description='Debate tournaments.')
+    replaced = dict(make_clubs([3])[0], description='Cooking classes.')
+    reloader.update_clubs(
+        [added, replaced, {'id': 8, 'description': ''}], removed_ids=[2]
+    )
+    new = reloader.current
+    assert new.index.idf is old.index.idf
+    ids = set(new.rows_by_id)
+    assert 700 in ids and 2 not in ids
+    # An upsert that fails validation drops the club, as a full load would
+    assert 8 not in ids
+    assert len(new) == N_CLUBS - 1
+    assert descriptions(new)[3] == 'Cooking classes.'
+
+
+def test_update_without_a_catalog_is_refused(club_source):
+    with pytest.raises(CatalogError):
+        ClubReloader(club_source, interval=0).update_clubs([], [1])
@@ -0,0 +1,34 @@
+import numpy as np
+
+from scoring import select_top_k
+
+
+def test_select_top_k_orders_by_score_then_row():
+    candidates = np.array([7, 3, 9, 1, 5])
+    scores = np.array([0.5, 0.9, 0.5, 0.1, 0.7])
+    hits = select_top_k(candidates, scores, top_k=4)
+    assert hits.rows.tolist() == [3, 5, 7, 9]
+    assert hits.total == 5
+
+
+def test_select_top_k_applies_min_score_and_allowed():
+    candidates = np.arange(6)
+    scores = np.array([0.0, 0.2, 0.4, 0.6, 0.8, 1.0])
+    allowed = np.array([True, True, False, True, True, False])
+    hits = select_top_k(candidates, scores, top_k=10, min_score=0.2, allowed=allowed)
+    assert hits.rows.tolist() == [4, 3]
+    assert hits.total == 2
+
+
+def test_pages_split_ties_like_one_long_page():
+    rng = np.random.default_rng(0)
+    candidates = rng.permutation(500)
+    # Few distinct scores, so most page boundaries fall inside a tie
+    scores = rng.integers(1, 6, size=500) / 5
+    whole = select_top_k(candidates, scores, top_k=500)
+    for top_k in [1, 3, 7, 50]:
+        pages = [
+            select_top_k(candidates, scores, top_k=top_k, offset=offset).rows
+            for offset in range(0, 500, top_k)
+        ]
+        np.testing.assert_array_equal(np.concatenate(pages), whole.rows)
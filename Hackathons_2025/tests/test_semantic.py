@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from scoring import select_top_k
+from semantic import SemanticIndex
+
+
+# Random L2-normalized TF-IDF-like rows; the last columns are never used
+def random_matrix(seed, n_clubs=300, n_terms=80, unused=10):
+    rng = np.random.default_rng(seed)
+    matrix = sparse.random(
+        n_clubs, n_terms - unused, density=0.1, format='csr', random_state=rng
+    )
+    matrix = sparse.hstack([matrix, sparse.csr_matrix((n_clubs, unused))], format='csr')
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def query_row(rng, n_terms, cols=None):
+    cols = cols if cols is not None else rng.choice(n_terms, size=3, replace=False)
+    row = sparse.csr_matrix((rng.random(len(cols)), (np.zeros(len(cols)), cols)), shape=(1, n_terms))
+    return row / np.sqrt(row.multiply(row).sum())
+
+
+def test_build_vectors_are_the_projected_rows():
+    matrix = random_matrix(0)
+    index = SemanticIndex.build(matrix, dims=16)
+    np.testing.assert_allclose(index.vectors, index.project(matrix), atol=1e-6)
+    norms = np.linalg.norm(index.vectors, axis=1)
+    np.testing.assert_allclose(norms[norms > 0], 1, rtol=1e-5)
+
+
+def test_unused_columns_have_no_projection_rows():
+    matrix = random_matrix(1)
+    index = SemanticIndex.build(matrix, dims=16)
+    used = np.unique(matrix.indices)
+    assert len(index.components) == len(used)
+    assert (index.component_rows[used] >= 0).all()
+    assert (np.delete(index.component_rows, used) == -1).all()
+    # A query of unused columns only projects to nothing
+    rng = np.random.default_rng(1)
+    query = query_row(rng, matrix.shape[1], cols=np.array([matrix.shape[1] - 1]))
+    assert not index.project(query).any()
+    assert len(index.search(query, top_k=5).rows) == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_search_probing_every_list_is_exact(seed):
+    matrix = random_matrix(seed)
+    index = SemanticIndex.build(matrix, dims=16)
+    rng = np.random.default_rng(50 + seed)
+    all_rows = np.arange(matrix.shape[0])
+    for _ in range(20):
+        query = query_row(rng, matrix.shape[1])
+        scores = (index.vectors @ index.project(query)[0]).astype(np.float64)
+        for allowed in [None, rng.random(matrix.shape[0]) < 0.3]:
+            for top_k, offset, min_score in [(5, 0, 0.0), (10, 5, 0.0), (5, 0, 0.3)]:
+                hits = index.search(query, top_k=top_k, min_score=min_score, offset=offset,
+                                    allowed=allowed, probes=len(index.centroids))
+                expected = select_top_k(all_rows, scores, top_k=top_k, min_score=min_score,
+                                        offset=offset, allowed=allowed)
+                np.testing.assert_array_equal(hits.rows, expected.rows)
+                np.testing.assert_allclose(hits.scores, expected.scores, rtol=1e-5)
+                np.testing.assert_allclose(index.score_rows(query, hits.rows), hits.scores, rtol=1e-5)
+
+
+def test_search_probes_nearest_lists_until_the_page_fills():
+    matrix = random_matrix(3)
+    index = SemanticIndex.build(matrix, dims=16)
+    rng = np.random.default_rng(3)
+    query = query_row(rng, matrix.shape[1])
+    allowed = np.zeros(matrix.shape[0], dtype=bool)
+    allowed[rng.choice(matrix.shape[0], size=12, replace=False)] = True
+    hits = index.search(query, top_k=10, min_score=-1.0, allowed=allowed, probes=1)
+    # Lists are probed past `probes` until ten allowed clubs were seen
+    assert len(hits.rows) == 10
+    assert allowed[hits.rows].all()
+
+
+def test_with_vectors_rebuilds_the_inverted_lists():
+    matrix = random_matrix(4)
+    index = SemanticIndex.build(matrix, dims=16)
+    order = np.random.default_rng(4).permutation(matrix.shape[0])[:250]
+    updated = index.with_vectors(index.vectors[order])
+    np.testing.assert_array_equal(np.sort(updated.list_rows), np.arange(250))
+    for lst in range(len(updated.centroids)):
+        rows = updated.list_rows[updated.list_offsets[lst]:updated.list_offsets[lst + 1]]
+        assert (updated.assignments[rows] == lst).all()
@@ -0,0 +1,69 @@
+from club_index import ClubIndex
+from spelling import SpellingIndex, correct_tokens, edit_distance
+
+
+def build(descriptions, version='test'):
+    index = ClubIndex.build(descriptions, version)
+    corpus_words = {word for text in descriptions for word in index.tokens(text)}
+    return SpellingIndex.build(index, corpus_words), index
+
+
+def test_edit_distance_counts_adjacent_swaps_once():
+    assert edit_distance('hackaton', 'hackathon') == 1
+    assert edit_distance('robtoics', 'robotics') == 1
+    assert edit_distance('phsyics', 'physics') == 1
+    assert edit_distance('abc', 'xyz') == 3
+
+
+def test_suggest_prefers_the_same_stem_over_a_more_common_word():
+    # "root" is as close to "robot" as "robots", and more common
+    speller, index = build([
+        'root vegetables garden',
+        'root cellar storage',
+        'root beer tasting',
+        'robots building league',
+        'chess strategy night',
+    ])
+    assert index.idf[index.lookup('root')] < index.idf[index.lookup('robots')]
+    assert speller.suggest('robot', index) == 'robots'
+
+
+def test_suggest_prefers_the_most_common_word_between_unrelated_ones():
+    speller, index = build([
+        'boxing gym sparring',
+        'boxing fitness training',
+        'coxing crew rowing',
+        'chess strategy night',
+    ])
+    assert speller.suggest('foxing', index) == 'boxing'
+
+
+def test_suggest_leaves_short_and_known_words_alone():
+    speller, index = build([
+        'club chess night',
+        'club boxing gym',
+        'club rowing crew',
+        'robots league',
+    ])
+    # "club" is in every description, so it was left out of the index
+    assert index.lookup('club') is None
+    assert speller.suggest('club', index) is None
+    assert speller.suggest('gum', index) is None
+
+
+def test_correct_tokens_keeps_words_known_to_any_index():
+    orgs = build(['coding bootcamp web', 'coding interview prep', 'hackathon team projects'], 'orgs')
+    sports = build(['boxing gym sparring', 'rowing crew regatta', 'ballet dance'], 'sports')
+    tokens, corrections = correct_tokens(['coding', 'hackaton'], [sports, orgs])
+    assert tokens == ['coding', 'hackathon']
+    assert corrections == {'hackaton': 'hackathon'}
+    # On its own, the sports index would have rewritten "coding"
+    assert correct_tokens(['coding'], [sports]) == (['boxing'], {'coding': 'boxing'})
+
+
+def test_correct_tokens_picks_the_closest_fix_of_all_indexes():
+    first = build(['volleyball team', 'volunteers needed'], 'first')
+    second = build(['volunteer tutoring', 'soccer team'], 'second')
+    tokens, corrections = correct_tokens(['volunter', 'team'], [first, second])
+    assert tokens == ['volunteer', 'team']
+    assert corrections == {'volunter': 'volunteer'}
@@ -0,0 +1,174 @@
+import json
+import random
+import re
+
+import numpy as np
+import pytest
+
+from tagging import (
+    MAX_TAGS, TAXONOMY_PATH, Tagger, compute_tags, get_tagger, require_tags
+)
+
+TAXONOMY = {
+    'activities': {
+        'Mentorship': ['mentor*'],
+        'Hackathons': ['hackathon*'],
+        'Research': ['research*'],
+    },
+    'skills': {
+        'AI/ML': ['ai', 'machine learning'],
+        'Research': ['research*'],
+        'Teamwork': ['team*'],
+    },
+    'categories': [
+        {'name': 'engineering', 'keywords': ['engineer*']},
+        {'name': 'tech', 'keywords': ['tech', 'machine learning']},
+        {'name': 'art', 'keywords': ['art', 'arts']},
+    ],
+    'default_category': {'name': 'other'},
+}
+
+
+@pytest.fixture
+def tagger():
+    return Tagger(TAXONOMY)
+
+
+def labels(tagger, mask):
+    activities, skills = tagger.decode(mask)
+    return set(activities) | set(skills)
+
+
+def test_keywords_only_match_whole_words(tagger):
+    assert tagger.scan('we maintain the club room') == (0, -1)
+    assert tagger.scan('a party with a pizza') == (0, -1)
+    assert tagger.scan('said the chair') == (0, -1)
+    assert labels(tagger, tagger.scan('learn about AI, together')[0]) == {'AI/ML'}
+    assert tagger.scan('art') == (0, 2)
+    assert tagger.scan('(art)') == (0, 2)
+    assert tagger.scan('art_club') == (0, -1)
+
+
+def test_shipped_taxonomy_keeps_word_boundaries():
+    tagger = get_tagger()
+    assert 'AI/ML' not in labels(tagger, tagger.scan('we maintain campus trails')[0])
+    assert tagger.category_info(tagger.scan('a party for everyone')[1])['name'] != 'art'
+
+
+def test_wildcard_keywords_allow_any_word_ending(tagger):
+    assert labels(tagger, tagger.scan('free mentorship for freshmen')[0]) == {'Mentorship'}
+    assert labels(tagger, tagger.scan('our mentors')[0]) == {'Mentorship'}
+    assert labels(tagger, tagger.scan('a mentor')[0]) == {'Mentorship'}
+    # ... but only at the start of a word
+    assert tagger.scan('tormentors') == (0, -1)
+    # Keywords without a wildcard need the whole word
+    assert tagger.scan('arts and artsy things') == (0, 2)
+    assert tagger.scan('artsy things') == (0, -1)
+
+
+def test_multi_word_keywords_match_across_whitespace(tagger):
+    mask, category = tagger.scan('Machine\n  Learning reading group')
+    assert labels(tagger, mask) == {'AI/ML'}
+    assert category == 1
+
+
+def test_label_shared_by_an_activity_and_a_skill_sets_both_bits(tagger):
+    mask, _ = tagger.scan('undergraduate research')
+    assert tagger.decode(mask) == (('Research',), ('Research',))
+    assert tagger.label_mask('research') == mask
+
+
+def test_title_only_counts_toward_the_category(tagger):
+    mask, category = tagger.scan('we meet weekly', title='Hackathon Engineers')
+    assert mask == 0
+    assert category == 0
+    mask, category = tagger.scan('we run a hackathon', title='Engineers')
+    assert labels(tagger, mask) == {'Hackathons'}
+    # A keyword spanning the title and the description is not a tag
+    mask, _ = tagger.scan('learning group', title='Machine')
+    assert mask == 0
+
+
+def test_first_category_in_taxonomy_order_wins(tagger):
+    assert tagger.scan('art and tech for engineers')[1] == 0
+    assert tagger.scan('tech art')[1] == 1
+    assert tagger.scan('art tech')[1] == 1
+    assert tagger.scan('art', title='Engineering Club')[1] == 0
+    assert tagger.category_info(-1) == {'name': 'other'}
+
+
+def test_too_many_tags_are_refused():
+    taxonomy = dict(TAXONOMY, activities={f"tag{i}": [f"word{i}"] for i in range(MAX_TAGS)})
+    with pytest.raises(ValueError, match=f"at most {MAX_TAGS}"):
+        Tagger(taxonomy)
+    taxonomy['activities'] = {f"tag{i}": [f"word{i}"] for i in range(MAX_TAGS - 3)}
+    tagger = Tagger(taxonomy)
+    assert len(tagger.tags) == MAX_TAGS
+    mask, _ = tagger.scan('word0 and team')
+    assert mask == 1 | (1 << (MAX_TAGS - 1))
+    assert tagger.decode(mask) == (('tag0',), ('Teamwork',))
+
+
+def test_unknown_labels_are_refused(tagger):
+    with pytest.raises(ValueError, match='Unknown tag'):
+        tagger.label_mask('Knitting')
+
+
+# Tagging of a text with one regular expression per keyword: the rule the
+# automaton implements
+def reference_scan(taxonomy, text, title=''):
+    def matches(keyword, text):
+        keyword = keyword.lower()
+        end = r'' if keyword.endswith('*') else r'(?!\w)'
+        pattern = r'(?<!\w)' + re.escape(keyword.rstrip('*')) + end
+        return re.search(pattern, ' '.join(text.lower().split())) is not None
+
+    tagger = Tagger(taxonomy)
+    mask = 0
+    for bit, (kind, label) in enumerate(tagger.tags):
+        section = taxonomy['activities' if kind == 'activity' else 'skills']
+        if any(matches(keyword, text) for keyword in section[label]):
+            mask |= 1 << bit
+    # The title is read together with the text for the category
+    both = f"{title} {text}" if title else text
+    category = next((
+        i for i, category in enumerate(taxonomy['categories'])
+        if any(matches(keyword, both) for keyword in category['keywords'])
+    ), -1)
+    return mask, category
+
+
+def test_scan_matches_a_regular_expression_reference():
+    tagger = get_tagger()
+    with open(TAXONOMY_PATH, encoding='utf-8') as f:
+        taxonomy = json.load(f)
+    words = sorted({
+        word.rstrip('*')
+        for section in ('activities', 'skills')
+        for keywords in taxonomy[section].values()
+        for keyword in keywords
+        for word in keyword.split()
+    } | {
+        keyword.rstrip('*') for category in taxonomy['categories'] for keyword in category['keywords']
+    })
+    rng = random.Random(0)
+    fillers = ['the', 'club', 'main', 'party', 'ing', 's', 'ship', '-', ',', 'x']
+    for _ in range(500):
+        parts = [rng.choice(words + fillers) for _ in range(rng.randint(1, 12))]
+        text = ''.join(part + rng.choice([' ', '', '  ', '\n', '.']) for part in parts)
+        title = ' '.join(rng.choice(words + fillers) for _ in range(rng.randint(0, 3)))
+        assert tagger.scan(text, title=title) == reference_scan(taxonomy, text, title), (text, title)
+
+
+def test_compute_tags_and_require_tags():
+    tagger = get_tagger()
+    tag_bits, categories = compute_tags(
+        ['Hack Club', 'Art Society', 'Chess'],
+        ['A yearly hackathon with mentors', 'Painting and drawing', 'We play chess'],
+    )
+    assert tag_bits.dtype == np.uint64
+    assert {'Hackathons', 'Mentorship'} <= labels(tagger, int(tag_bits[0]))
+    assert tagger.category_info(int(categories[1]))['name'] == 'art'
+    assert categories[2] == -1
+    assert require_tags(tag_bits, ['Hackathons', 'mentorship']).tolist() == [True, False, False]
+    assert require_tags(tag_bits, []).all()